@@ -1,22 +1,16 @@
-import sqlite3
-import os
-from datetime import datetime, timedelta
+from database import DEFAULT_ACCOUNT_ID
+from repository import get_repository
 
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "candidates.db")
-
-def get_dynamic_daily_limit(default_max=30, start_limit=5, increment=2):
+def get_dynamic_daily_limit(default_max=30, start_limit=5, increment=2, account_id=None, repo=None):
     """
     Calculates the daily limit based on account warm-up status.
     Rule: Start at 5. If yesterday's usage was near the limit, increase by 2.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        
-        # Get all dates with activity
-        c.execute("SELECT DISTINCT substr(updated_at, 1, 10) FROM campaign_candidates WHERE status='connection_sent' ORDER BY 1 DESC")
-        active_days = [row[0] for row in c.fetchall()]
-        conn.close()
+        # Active days come from the activity ledger summary (single indexed read)
+        repo = repo or get_repository()
+        summary = repo.get_activity_summary("connection_sent", account_id or DEFAULT_ACCOUNT_ID)
+        active_days = summary["active_days"]
 
         if not active_days:
             return start_limit
@@ -29,11 +23,11 @@ def get_dynamic_daily_limit(default_max=30, start_limit=5, increment=2):
         # Check strict consecutive days? No, that's too punishing for a user who skips a weekend.
         # Let's just use 'total active days' as a proxy for trust.
         
-        calculated = start_limit + (len(active_days) * increment)
+        calculated = start_limit + (active_days * increment)
         
         final_limit = min(calculated, default_max)
         
-        # print(f"DEBUG: Warmup Calculation: {len(active_days)} active days. Limit: {final_limit}")
+        # print(f"DEBUG: Warmup Calculation: {active_days} active days. Limit: {final_limit}")
         return final_limit
 
     except Exception as e:
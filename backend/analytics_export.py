@@ -0,0 +1,200 @@
+"""
+analytics_export.py — Columnar export of campaign candidates and automation
+events for offline analysis.
+
+Each export is a versioned snapshot of partitioned Parquet datasets (via pyarrow):
+    ANALYTICS_DIR/snapshots/<stamp>/candidates/   one row per campaign membership, by campaign_id
+    ANALYTICS_DIR/snapshots/<stamp>/events/       partitioned by day
+    ANALYTICS_DIR/CURRENT                         name of the published snapshot
+
+A snapshot is written in full, then published by replacing CURRENT with a
+single rename; readers resolve it with current_snapshot() and always see a
+complete export. The previous snapshot is kept for readers still using it.
+
+The /api/analytics endpoints in main.py query these files with DuckDB, so
+analytical reads never touch the OLTP store.
+
+Usage:
+    python analytics_export.py                      # STORAGE_BACKEND (default sqlite)
+    python analytics_export.py --backend supabase
+"""
+
+import argparse
+import os
+import shutil
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from repository import get_repository
+
+ANALYTICS_DIR = os.environ.get("ANALYTICS_DIR",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "analytics"))
+
+KEEP_SNAPSHOTS = 2  # Published snapshot + the one before it
+DATASETS = ("candidates", "events")
+
+# Status groups used by the funnel / acceptance-rate queries
+CONTACTED_STATUSES = ("connection_sent", "accepted", "message_sent", "replied", "declined")
+ACCEPTED_STATUSES = ("accepted", "message_sent", "replied")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        return pyarrow
+    except ImportError:
+        raise RuntimeError("pyarrow is required for analytics export (pip install pyarrow)")
+
+
+def _schemas(pa):
+    """Explicit schemas so every page/partition agrees even when a column is all-null."""
+    return {
+        "candidates": pa.schema([
+            ("candidate_id", pa.string()), ("campaign_id", pa.string()), ("organization_id", pa.string()),
+            ("name", pa.string()), ("linkedin_url", pa.string()), ("company", pa.string()),
+            ("location", pa.string()), ("ai_score", pa.int32()), ("years_experience", pa.float64()),
+            ("relevant_experience", pa.float64()), ("campaign_status", pa.string()),
+            ("message_status", pa.string()), ("has_note", pa.bool_()), ("has_message", pa.bool_()),
+            ("updated_at", pa.string()),
+        ]),
+        "events": pa.schema([
+            ("event_id", pa.int64()), ("account_id", pa.string()), ("organization_id", pa.string()),
+            ("action", pa.string()), ("day", pa.string()), ("campaign_id", pa.string()),
+            ("candidate_id", pa.string()), ("created_at", pa.string()),
+        ]),
+    }
+
+
+def _number(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value):
+    return str(value) if value is not None else None
+
+
+def _candidate_record(row):
+    """Flatten a repository candidate row; the JSON blob is only read here, once."""
+    data = row.get("data") or {}
+    score = _number(data.get("ai_score"))
+    return {
+        "candidate_id": _text(row.get("id")),
+        "campaign_id": _text(row.get("campaign_id")) or "none",
+        "organization_id": _text(row.get("organization_id")),
+        "name": row.get("name"),
+        "linkedin_url": row.get("linkedin_url"),
+        "company": data.get("company"),
+        "location": data.get("location"),
+        "ai_score": int(score) if score is not None else None,
+        "years_experience": _number(data.get("years_experience")),
+        "relevant_experience": _number(data.get("relevant_experience")),
+        "campaign_status": row.get("campaign_status"),
+        "message_status": row.get("message_status"),
+        "has_note": bool(row.get("connection_note")),
+        "has_message": bool(row.get("initial_message")),
+        "updated_at": _text(row.get("updated_at")),
+    }
+
+
+def _event_record(row):
+    return {
+        "event_id": row.get("id"),
+        "account_id": row.get("account_id"),
+        "organization_id": _text(row.get("organization_id")),
+        "action": row.get("action"),
+        "day": _text(row.get("day")),
+        "campaign_id": _text(row.get("campaign_id")),
+        "candidate_id": _text(row.get("candidate_id")),
+        "created_at": _text(row.get("created_at")),
+    }
+
+
+def _write_page(pa, records, schema, path, partition_col, page_no):
+    """Append one page of records to a hive-partitioned Parquet dataset."""
+    if not records:
+        return 0
+    table = pa.Table.from_pylist(records, schema=schema)
+    pa.dataset.write_dataset(
+        table, path, format="parquet",
+        partitioning=pa.dataset.partitioning(pa.schema([(partition_col, pa.string())]), flavor="hive"),
+        basename_template=f"part-{page_no:05d}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return len(records)
+
+
+def current_snapshot(out_dir=None):
+    """Directory of the published snapshot, or None if nothing has been exported yet."""
+    out_dir = out_dir or ANALYTICS_DIR
+    try:
+        with open(os.path.join(out_dir, "CURRENT"), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    path = os.path.join(out_dir, "snapshots", name)
+    return path if name and os.path.isdir(path) else None
+
+
+def _publish(out_dir, name):
+    """Point CURRENT at snapshots/<name> in one rename, then prune old snapshots."""
+    pointer = os.path.join(out_dir, "CURRENT")
+    tmp = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp, pointer)
+
+    snapshots_dir = os.path.join(out_dir, "snapshots")
+    for old in sorted(os.listdir(snapshots_dir))[:-KEEP_SNAPSHOTS]:
+        if old != name:
+            shutil.rmtree(os.path.join(snapshots_dir, old), ignore_errors=True)
+    # Pre-snapshot layout (datasets directly under out_dir)
+    for legacy in ("candidates", "memberships", "events"):
+        shutil.rmtree(os.path.join(out_dir, legacy), ignore_errors=True)
+
+
+def export_all(repo, out_dir=None):
+    """Export candidates and events as a new snapshot and publish it. Returns row counts per dataset."""
+    pa = _require_pyarrow()
+    schemas = _schemas(pa)
+    out_dir = out_dir or ANALYTICS_DIR
+    name = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    snapshot = os.path.join(out_dir, "snapshots", name)
+    os.makedirs(snapshot)
+
+    counts = {dataset: 0 for dataset in DATASETS}
+    missing_org = 0
+    try:
+        for page_no, page in enumerate(repo.iter_candidates()):
+            records = [_candidate_record(r) for r in page]
+            missing_org += sum(1 for r in records if not r["organization_id"])
+            counts["candidates"] += _write_page(pa, records, schemas["candidates"],
+                                                os.path.join(snapshot, "candidates"), "campaign_id", page_no)
+        for page_no, page in enumerate(repo.iter_activity_events()):
+            counts["events"] += _write_page(pa, [_event_record(r) for r in page], schemas["events"],
+                                            os.path.join(snapshot, "events"), "day", page_no)
+        for dataset in DATASETS:
+            os.makedirs(os.path.join(snapshot, dataset), exist_ok=True)
+    except Exception:
+        shutil.rmtree(snapshot, ignore_errors=True)
+        raise
+
+    _publish(out_dir, name)
+    if missing_org:
+        # Org-scoped analytics queries can't see these (set ORGANIZATION_ID for a local SQLite export)
+        print(f"Warning: {missing_org} candidate rows exported without organization_id")
+    print(f"Analytics export complete: {counts} -> {snapshot}")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export candidates/campaigns/events to Parquet")
+    parser.add_argument("--backend", default=None, help="sqlite or supabase (default: STORAGE_BACKEND)")
+    parser.add_argument("--out", default=None, help=f"Output directory (default: {ANALYTICS_DIR})")
+    args = parser.parse_args()
+
+    export_all(get_repository(args.backend), args.out)
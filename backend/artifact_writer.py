@@ -0,0 +1,140 @@
+"""
+artifact_writer.py — Background writer for audit records, screenshots and DOM
+snapshots produced by the automation scripts.
+
+The automation thread only captures (page.screenshot() bytes, page.content())
+and enqueues; file I/O happens on one writer thread:
+- Audit records are buffered per file and appended in batches (every
+  AUDIT_BATCH records or AUDIT_FLUSH_SEC). They are never dropped: when the
+  queue is full, enqueueing blocks until the writer catches up.
+- Screenshots and DOM snapshots are best-effort. When the queue is full they
+  are dropped (and counted) instead of stalling the run. DOM snapshots are
+  gzip-compressed (.html.gz).
+
+flush() blocks until everything enqueued so far is on disk (call it before
+reading an audit file back); close() flushes and stops the thread.
+"""
+
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+QUEUE_SIZE = int(os.environ.get("ARTIFACT_QUEUE_SIZE", "200"))
+AUDIT_BATCH = 50
+AUDIT_FLUSH_SEC = 1.0
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [artifacts] {msg}", flush=True)
+
+
+class ArtifactWriter:
+    """Bounded queue + writer thread; audit lines are batched, binary artifacts are droppable."""
+
+    def __init__(self, maxsize=QUEUE_SIZE, log=log):
+        self.log = log
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._pending = {}  # audit path -> [json lines]
+        self._pending_count = 0
+        self._last_flush = time.time()
+        self.written = {"audit": 0, "screenshot": 0, "dom": 0}
+        self.dropped = {"screenshot": 0, "dom": 0}
+        self.bytes_written = 0
+        self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+        self._thread.start()
+
+    # --- Producer side (automation thread) ---
+
+    def audit(self, path, record):
+        """Queue one JSONL record for path (blocks if the queue is full; audit is never dropped)."""
+        self._queue.put(("audit", path, json.dumps(record, ensure_ascii=False)))
+
+    def _offer(self, kind, path, data):
+        try:
+            self._queue.put_nowait((kind, path, data))
+            return True
+        except queue.Full:
+            self.dropped[kind] += 1
+            self.log(f"Queue full, dropped {kind} {os.path.basename(path)}")
+            return False
+
+    def screenshot(self, page, path):
+        """Capture page to PNG bytes now, write later. True if queued."""
+        return self._offer("screenshot", path, page.screenshot())
+
+    def dom_snapshot(self, page, path):
+        """Capture page HTML now; written gzip-compressed (path gets .gz if missing). The path, or ""."""
+        if not path.endswith(".gz"):
+            path += ".gz"
+        return path if self._offer("dom", path, page.content()) else ""
+
+    def flush(self):
+        """Block until everything queued so far (including buffered audit lines) is written."""
+        self._queue.put(("flush", None, None))
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+        self._queue.put(("stop", None, None))
+        self._thread.join(timeout=10)
+
+    def stats(self):
+        return {"written": dict(self.written), "dropped": dict(self.dropped), "bytes_written": self.bytes_written}
+
+    # --- Writer thread ---
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=AUDIT_FLUSH_SEC)
+            except queue.Empty:
+                self._flush_audit()
+                continue
+            kind, path, data = item
+            try:
+                if kind == "stop":
+                    self._flush_audit()
+                    return
+                if kind == "flush":
+                    self._flush_audit()
+                elif kind == "audit":
+                    self._pending.setdefault(path, []).append(data)
+                    self._pending_count += 1
+                    if self._pending_count >= AUDIT_BATCH or time.time() - self._last_flush >= AUDIT_FLUSH_SEC:
+                        self._flush_audit()
+                else:
+                    self._write_file(kind, path, data)
+            except Exception as e:
+                self.log(f"Write failed for {kind} {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _flush_audit(self):
+        pending, self._pending = self._pending, {}
+        self._pending_count = 0
+        self._last_flush = time.time()
+        for path, lines in pending.items():
+            try:
+                payload = "\n".join(lines) + "\n"
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(payload)
+                self.written["audit"] += len(lines)
+                self.bytes_written += len(payload)
+            except Exception as e:
+                self.log(f"Audit write failed for {path}: {e}")
+
+    def _write_file(self, kind, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if kind == "dom":
+            data = gzip.compress(data.encode("utf-8"), compresslevel=6)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.written[kind] += 1
+        self.bytes_written += len(data)
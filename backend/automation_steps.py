@@ -0,0 +1,860 @@
+"""
+automation_steps.py — Shared step library for the LinkedIn connect/message flows.
+
+connect_linkedin.py, send_messages.py and the Ghost scripts (connect.py,
+message.py) used to carry their own copies of log/random_sleep/human_scroll/
+close_all_overlays and of the per-candidate browser logic, which had drifted
+apart (e.g. only the local connect flow handled "email required" and the
+weekly limit). The per-candidate logic now lives here as small steps run by a
+state machine; the entry points are thin wrappers that pick candidates, map
+outcomes to their own storage (repository, checkpoint, audit) and pace.
+
+- Flow runs named steps over a StepContext. A step returns the name of the
+  next step or Done(outcome); each step is timed in the context's StepTimer.
+- StepContext carries the page, selectors, navigator (ResourceFilter or
+  BrowserManager — both expose goto()) and the wrapper's hooks: audit,
+  screenshot, dom_snapshot, debug_screenshot. Hooks default to no-ops.
+- SideEffects runs repository writes on one background thread, in order, so
+  DB round trips overlap with the next browser step instead of blocking it.
+
+Everything is sync Playwright: BrowserManager hands pages to single-thread
+lanes (ghost-engine/runtime.py), so the browser side stays on one thread and
+only non-browser I/O is moved off it.
+"""
+
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+
+import waits
+from waits import Waiter
+from profile_state import profile_state, describe
+
+OVERLAY_CLOSE_SELECTORS = [
+    "button[aria-label='Close your conversation']",
+    "button[aria-label='Dismiss']",
+    "button.msg-overlay-bubble-header__control--close",
+]
+NOTE_MAX_CHARS = 300  # LinkedIn's limit for invitation notes
+COMPOSE_MODE = os.environ.get("COMPOSE_MODE", "fill")  # fill | insert | type (see compose_text)
+COMPOSE_KEY_DELAY_MS = int(os.environ.get("COMPOSE_KEY_DELAY_MS", "40"))
+
+
+# =====================================================================
+# UTILITIES
+# =====================================================================
+
+def make_logger(path=None, prefix=""):
+    """
+    Timestamped print logger. path also appends every line to a file; prefix may
+    be a string or a callable (evaluated per line, e.g. a DRY RUN marker).
+    """
+    def log(msg):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        pre = prefix() if callable(prefix) else prefix
+        print(f"[{timestamp}] {pre}{msg}", flush=True)
+        if path:
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(f"[{timestamp}] {pre}{msg}\n")
+            except Exception:
+                pass
+    return log
+
+
+log = make_logger()
+
+
+def pause(min_seconds=2, max_seconds=5):
+    """
+    Random human-like delay, scaled by PACING_SCALE (0 in replay benchmarks).
+    Pacing only: waiting for the page to be ready goes through Waiter.
+    """
+    seconds = random.uniform(min_seconds, max_seconds) * waits.PACING_SCALE
+    if seconds > 0:
+        time.sleep(seconds)
+    return seconds
+
+
+def human_scroll(page, passes=(3, 7), scroll_back=0.3):
+    """Scroll the page like a human reading, occasionally scrolling back up."""
+    try:
+        for _ in range(random.randint(*passes)):
+            page.mouse.wheel(0, random.randint(300, 700))
+            pause(0.5, 1.5)
+        if random.random() < scroll_back:
+            page.mouse.wheel(0, -300)
+    except Exception:
+        pass
+
+
+def close_all_overlays(page):
+    """Ensure no message overlays are left open from previous interactions."""
+    for selector in OVERLAY_CLOSE_SELECTORS:
+        try:
+            for btn in page.locator(selector).all():
+                if btn.is_visible(timeout=500):
+                    btn.click()
+                    btn.wait_for(state="hidden", timeout=2000)
+        except Exception:
+            pass
+
+
+def first_visible_locator(page, selectors, timeout=2000):
+    """First of selectors whose first match becomes visible within timeout (tried in order), or None."""
+    for selector in selectors:
+        try:
+            loc = page.locator(selector).first
+            if loc.is_visible(timeout=timeout):
+                return loc
+        except Exception:
+            continue
+    return None
+
+
+def _editor_text(locator):
+    """Current content of an input/textarea or a contenteditable editor."""
+    try:
+        return locator.input_value(timeout=1000)
+    except Exception:
+        return locator.inner_text(timeout=1000)
+
+
+def _normalized(text):
+    return " ".join((text or "").split())
+
+
+def _clear(page, locator):
+    try:
+        locator.fill("")
+    except Exception:
+        locator.click()
+        page.keyboard.press("ControlOrMeta+A")
+        page.keyboard.press("Delete")
+
+
+def compose_text(page, locator, text, mode=None):
+    """
+    Put text into an editor in one operation and verify it landed. Returns
+    (ok, mode used). mode (default COMPOSE_MODE):
+      fill    locator.fill() — one call, fires input events (default)
+      insert  focus + keyboard.insert_text() — one synthetic insertText, for
+              editors that ignore fill()
+      type    press_sequentially() with COMPOSE_KEY_DELAY_MS between keys —
+              real keystrokes, but driven by Playwright in one call rather
+              than one Python round trip per character
+    If the editor content doesn't match afterwards, it is cleared and the text
+    inserted once more with insert_text().
+    """
+    mode = mode or COMPOSE_MODE
+    if mode == "type":
+        locator.click()
+        locator.press_sequentially(text, delay=COMPOSE_KEY_DELAY_MS)
+    elif mode == "insert":
+        locator.click()
+        page.keyboard.insert_text(text)
+    else:
+        locator.fill(text)
+    if _normalized(_editor_text(locator)) == _normalized(text):
+        return True, mode
+
+    log(f"Composed text did not match after {mode}; retrying with insert_text")
+    _clear(page, locator)
+    locator.click()
+    page.keyboard.insert_text(text)
+    return _normalized(_editor_text(locator)) == _normalized(text), "insert"
+
+
+# =====================================================================
+# BACKGROUND SIDE EFFECTS
+# =====================================================================
+
+class SideEffects:
+    """
+    Ordered background lane for non-browser I/O (status updates, activity
+    ledger). submit() returns immediately; drain() blocks until everything
+    submitted so far has run, e.g. before reading counters that depend on it.
+    """
+
+    def __init__(self, log=log, maxsize=1000):
+        self.log = log
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name="side-effects", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                fn, args, kwargs = item
+                try:
+                    fn(*args, **kwargs)
+                except Exception as e:
+                    self.log(f"Background write failed ({getattr(fn, '__name__', fn)}): {e}")
+            finally:
+                self._queue.task_done()
+
+    def submit(self, fn, *args, **kwargs):
+        self._queue.put((fn, args, kwargs))  # Blocks only if the lane is maxsize behind
+
+    def drain(self):
+        self._queue.join()
+
+    def close(self):
+        self.drain()
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# =====================================================================
+# STATE MACHINE
+# =====================================================================
+
+class Done:
+    """Final outcome of a flow, with optional details (e.g. which selector matched)."""
+
+    def __init__(self, outcome, **info):
+        self.outcome = outcome
+        self.info = info
+
+    def __repr__(self):
+        return f"Done({self.outcome!r})"
+
+
+class StepContext:
+    """Per-candidate state shared by a flow's steps, plus the wrapper's hooks."""
+
+    def __init__(self, page, sel, nav, wait=None, log=log, audit=None, screenshot=None,
+                 dom_snapshot=None, debug_screenshot=None, **fields):
+        self.page = page
+        self.sel = sel
+        self.nav = nav
+        self.wait = wait or Waiter(page, registry=sel)
+        self.log = log
+        self._audit = audit
+        self._screenshot = screenshot
+        self._dom_snapshot = dom_snapshot
+        self._debug_screenshot = debug_screenshot
+        self.url = ""
+        self.name = ""
+        self.note = None
+        self.message = ""
+        self.dry_run = False
+        self.__dict__.update(fields)
+
+    @property
+    def timer(self):
+        return self.wait.timer
+
+    def audit(self, step, result, **kwargs):
+        if self._audit:
+            self._audit(step, result, **kwargs)
+
+    def screenshot(self, label):
+        return self._screenshot(label) if self._screenshot else ""
+
+    def dom_snapshot(self, label):
+        return self._dom_snapshot(label) if self._dom_snapshot else ""
+
+    def debug_screenshot(self, label):
+        return self._debug_screenshot(label) if self._debug_screenshot else ""
+
+    def failure(self, label):
+        """Screenshot + DOM snapshot for a failed step."""
+        self.screenshot(label)
+        self.dom_snapshot(label)
+
+
+class Flow:
+    """Named steps run as a state machine; run() returns the Done the last step produced."""
+
+    def __init__(self, name, steps, start):
+        self.name = name
+        self.steps = steps
+        self.start = start
+
+    def run(self, ctx, start=None):
+        step = start or self.start
+        while True:
+            ctx.timer.begin(step)
+            result = self.steps[step](ctx)
+            if isinstance(result, Done):
+                return result
+            if result not in self.steps:
+                raise ValueError(f"{self.name}: step '{step}' returned unknown step {result!r}")
+            step = result
+
+
+# =====================================================================
+# CONNECT FLOW
+# =====================================================================
+# Outcomes: sent, already_pending, already_connected, no_connect_option,
+# how_do_you_know_blocked, email_required, weekly_limit, failed, nav_failed,
+# compose_failed (the note didn't verify; nothing was sent)
+
+# What can follow a Connect click: the invitation modal, one of its interstitials, or a direct send
+INVITE_READY_SELECTORS = [
+    "div[role='dialog']",
+    "button[aria-label='Send without a note']",
+    "button[aria-label='Add a note']",
+    "input[name='email']",
+    "main section button:has-text('Pending')",
+]
+NOTE_TEXTAREA_SELECTORS = ["textarea[name='message']", "textarea#custom-message", "textarea"]
+
+
+def wait_for_invite_ui(ctx, timeout_ms=5000):
+    """Readiness after clicking Connect. The matched selector, or None on timeout."""
+    _, matched = ctx.wait.first_visible(INVITE_READY_SELECTORS, timeout_ms=timeout_ms)
+    return matched
+
+
+def connect_navigate(ctx):
+    try:
+        ctx.nav.goto(ctx.page, ctx.url, timeout=60000, wait_until="domcontentloaded")
+    except Exception as e:
+        ctx.log(f"Navigation failed: {e}")
+        ctx.screenshot("nav_error")
+        return Done("nav_failed", error=str(e))
+    ctx.wait.profile_ready()
+    human_scroll(ctx.page)
+    ctx.wait.pace("read_profile")
+    return "status"
+
+
+def connect_status(ctx):
+    # All top-card signals in one round trip (profile_state.py)
+    state = profile_state(ctx.page)
+    ctx.signals = state["signals"]
+    ctx.log(f"Profile state: {state['status']} ({describe(state)})")
+    if state["status"] == "PENDING":
+        ctx.log(f"Skipping {ctx.url}: Connection already pending.")
+        return Done("already_pending")
+    # Only a parsed 1st-degree badge is conclusive. CONNECTED from an unlocked Message
+    # button alone is also the creator/open-profile layout, where Connect sits under More.
+    if ctx.signals.get("degree") == "1st" and not ctx.signals.get("connect"):
+        ctx.log(f"Skipping {ctx.url}: Already connected.")
+        return Done("already_connected")
+    return "open_connect"
+
+
+def connect_open(ctx):
+    """Click Connect in the top card, or in the More menu when it isn't a primary action."""
+    page, sel = ctx.page, ctx.sel
+    has_message_btn = bool(ctx.signals.get("message"))
+    connect_btn = None
+    if ctx.signals.get("connect"):
+        # Top card only; the sidebar has other people's Connect buttons
+        connect_btn = page.query_selector(f"main section {sel['connect_btn_primary']}") \
+            or page.query_selector(f"main section {sel['connect_btn_aria']}")
+
+    if connect_btn:
+        ctx.log("Found primary Connect button. Clicking...")
+        page.evaluate("el => el.click()", connect_btn)
+        wait_for_invite_ui(ctx)
+        return "confirm"
+
+    ctx.log("Connect button not found in primary actions. Checking 'More' menu...")
+    more_btn, ms = sel.first_match(page, "more_btn_selectors", suffix=":visible")
+    if not more_btn:
+        ctx.log(f"Skipping {ctx.url}: 'More' button not found.")
+        return Done("already_connected" if has_message_btn else "no_connect_option")
+
+    ctx.log(f"Clicking 'More' button ({ms})...")
+    try:
+        more_btn.scroll_into_view_if_needed()
+        page.evaluate("el => el.click()", more_btn)
+    except Exception:
+        pass
+
+    dropdown_item = f"text={sel['dropdown_connect_text']}"
+    if not ctx.wait.visible(dropdown_item, timeout_ms=4000):
+        ctx.log("Menu didn't open. Retrying with standard click...")
+        try:
+            more_btn.click()
+        except Exception:
+            pass
+        ctx.wait.visible(dropdown_item, timeout_ms=3000)
+
+    connect_in_dropdown = page.get_by_text(sel["dropdown_connect_text"], exact=True).first
+    if not connect_in_dropdown.is_visible():
+        connect_in_dropdown = page.locator(sel["dropdown_connect_span"]).first
+    if not connect_in_dropdown.is_visible():
+        ctx.log(f"Skipping {ctx.url}: Connect option not found in dropdown.")
+        if has_message_btn:
+            ctx.log("Assuming already connected (Message button present).")
+        return Done("already_connected" if has_message_btn else "no_connect_option")
+
+    ctx.log("Found Connect in dropdown. Clicking...")
+    try:
+        connect_in_dropdown.click()
+    except Exception:
+        page.evaluate("el => el.click()", connect_in_dropdown)
+    wait_for_invite_ui(ctx)
+    return "confirm"
+
+
+def connect_confirm(ctx):
+    """Interstitials LinkedIn may show after Connect: relation picker, email gate, weekly limit."""
+    page, sel = ctx.page, ctx.sel
+    try:
+        if page.get_by_text("How do you know", exact=False).is_visible(timeout=2000):
+            ctx.log("Detected 'How do you know' modal.")
+            other_btn = page.locator("button", has_text="Other")
+            if not other_btn.is_visible():
+                ctx.log("Unknown contact relation options. Cancelling for safety.")
+                ctx.screenshot("unknown_relation")
+                return Done("how_do_you_know_blocked")
+            other_btn.click()
+            ctx.wait.pace("before_click")
+            page.locator("button", has_text="Connect").click()  # Auto-waits for the button
+    except Exception:
+        pass
+
+    try:
+        if page.locator(sel["email_input"]).is_visible(timeout=1000):
+            ctx.log("Email required for connection. Skipping.")
+            ctx.screenshot("email_required")
+            try:
+                page.locator(sel["dismiss_modal"]).click()
+            except Exception:
+                pass
+            return Done("email_required")
+    except Exception:
+        pass
+
+    try:
+        if page.get_by_text("weekly limit", exact=False).is_visible(timeout=1000):
+            ctx.log("CRITICAL: WEEKLY LIMIT REACHED. Stopping automation.")
+            ctx.screenshot("weekly_limit")
+            return Done("weekly_limit")
+    except Exception:
+        pass
+
+    # The invitation modal after an interstitial (or a direct send)
+    wait_for_invite_ui(ctx, timeout_ms=3000)
+    return "add_note" if ctx.note else "send_invite"
+
+
+def connect_add_note(ctx):
+    page, sel = ctx.page, ctx.sel
+    try:
+        add_note_btn = first_visible_locator(page, [
+            sel.get("add_note_btn", "button[aria-label='Add a note']"),
+            "button:has-text('Add a note')",
+        ])
+        if not add_note_btn:
+            ctx.log("'Add a note' button not found. Looking for 'Send without note'...")
+            return "send_invite"
+        add_note_btn.click()
+
+        textarea, _ = ctx.wait.first_visible([sel.get("note_textarea", NOTE_TEXTAREA_SELECTORS[0])]
+                                             + NOTE_TEXTAREA_SELECTORS, timeout_ms=5000)
+        if not textarea:
+            ctx.log("Warning: Note textarea not found. Will try sending without note.")
+            try:
+                page.locator(sel["dismiss_modal"]).click()
+            except Exception:
+                pass
+            return "send_invite"
+
+        ok, how = compose_text(page, textarea, ctx.note[:NOTE_MAX_CHARS])
+        if not ok:
+            # Never send a partial/garbled note; leave the candidate for a later run
+            ctx.log(f"ERROR: Note text did not verify after {how}. Dismissing without sending.")
+            ctx.failure("note_compose_failed")
+            try:
+                page.locator(sel["dismiss_modal"]).first.click()
+            except Exception:
+                pass
+            return Done("compose_failed")
+        ctx.wait.pace("after_typing")
+
+        send_btn = first_visible_locator(page, [
+            sel.get("send_btn", "button[aria-label='Send invitation']"),
+            "button[aria-label='Send now']",
+            "button:has-text('Send')",
+        ])
+        if send_btn:
+            send_btn.click()
+            ctx.log(f"SUCCESS: Connection request WITH NOTE sent to {ctx.url}")
+            return Done("sent", note=True)
+        ctx.log("Warning: Send button not found after typing note.")
+        ctx.screenshot("send_btn_missing")
+    except Exception as e:
+        ctx.log(f"Error during note flow: {e}. Will try sending without note.")
+        ctx.screenshot("note_error")
+    return "send_invite"
+
+
+def connect_send_invite(ctx):
+    send_now_btn = first_visible_locator(ctx.page, [
+        ctx.sel.get("send_without_note_aria", "button[aria-label='Send without a note']"),
+        "button[aria-label='Send now']",
+        "button:has-text('Send without a note')",
+        "button:has-text('Send now')",
+    ])
+    if not send_now_btn:
+        return "verify"
+    ctx.log("Clicking 'Send without note'...")
+    send_now_btn.click()
+    ctx.log(f"SUCCESS: Connection request sent to {ctx.url}")
+    return Done("sent", note=False)
+
+
+def connect_verify(ctx):
+    """No modal handled: LinkedIn may have sent the invite directly."""
+    page = ctx.page
+    # Settled once the Pending badge shows or the Connect button is gone
+    ctx.wait.until(lambda: page.locator("button", has_text="Pending").first.is_visible()
+                   or not page.locator(ctx.sel["connect_btn_primary"]).first.is_visible(), timeout_ms=3000)
+    connect_still_visible = False
+    try:
+        connect_still_visible = page.locator(ctx.sel["connect_btn_primary"]).is_visible(timeout=1000)
+    except Exception:
+        pass
+    if connect_still_visible:
+        ctx.log(f"FAILED: Connect button still visible. Connection may NOT have been sent to {ctx.url}")
+        ctx.screenshot("connect_failed")
+        return Done("failed")
+
+    pending_visible = False
+    try:
+        pending_visible = page.locator("button", has_text="Pending").first.is_visible(timeout=1500)
+    except Exception:
+        pass
+    if pending_visible:
+        ctx.log(f"SUCCESS: Connection sent directly (Pending badge confirmed) to {ctx.url}")
+    else:
+        ctx.log(f"Connection likely sent (Connect button gone) to {ctx.url}")
+    return Done("sent", note=False, confirmed=pending_visible)
+
+
+CONNECT_FLOW = Flow("connect", {
+    "navigate": connect_navigate,
+    "status": connect_status,
+    "open_connect": connect_open,
+    "confirm": connect_confirm,
+    "add_note": connect_add_note,
+    "send_invite": connect_send_invite,
+    "verify": connect_verify,
+}, start="navigate")
+
+
+# =====================================================================
+# MESSAGE FLOW
+# =====================================================================
+# Outcomes: sent, dry_run, pending, not_connected, unknown, page_load_failed,
+# no_message_button, click_failed, no_textarea, inmail, already_sent, compose_failed,
+# no_send_button
+
+def verify_profile_loaded(page, name, url):
+    """
+    Verify the profile page actually loaded: no login/error redirect, still on
+    the expected profile, and the candidate's first name appears in <main>.
+    Returns (success, reason).
+    """
+    current_url = page.url.lower()
+    if "login" in current_url or "checkpoint" in current_url:
+        return False, "Redirected to login page (session expired?)"
+    if "404" in current_url or "/error/" in current_url:
+        return False, "Profile not found (404)"
+
+    expected_slug = url.rstrip("/").split("/in/")[-1].lower() if "/in/" in url else ""
+    if expected_slug and expected_slug not in current_url:
+        return False, f"URL redirected away from expected profile (now at {page.url})"
+
+    try:
+        first_name = name.split()[0] if name else ""
+        if first_name and len(first_name) > 2:
+            page_text = page.locator("main").first.inner_text(timeout=5000)
+            if first_name.lower() not in page_text.lower():
+                return False, f"Name '{first_name}' not found on page"
+    except Exception:
+        return False, "Could not read page content"
+    return True, "Profile loaded successfully"
+
+
+def check_dedup(page):
+    """True if the open conversation already has an outgoing message from us."""
+    for selector in [
+        ".msg-s-event-listitem--other .msg-s-message-group__meta",
+        ".msg-s-event-listitem__message-bubble--outgoing",
+        ".msg-s-message-list-content .msg-s-event-listitem--other",
+    ]:
+        try:
+            if page.locator(selector).count() > 0:
+                return True
+        except Exception:
+            continue
+    return False
+
+
+def check_inmail(page):
+    """True if the compose window is an InMail (requires credits)."""
+    return first_visible_locator(page, [
+        "text=InMail",
+        "text=inmail",
+        "text=Free InMail",
+        ".premium-attribute",
+        "text=InMail credit",
+    ], timeout=1000) is not None
+
+
+def click_strategies(locator):
+    """JS click first (a normal click can be blocked by overlapping SVGs), then forced clicks. (ok, error)."""
+    error = ""
+    for attempt in (
+        lambda: locator.evaluate("el => el.click()"),
+        lambda: locator.click(force=True, timeout=5000),
+        lambda: locator.locator("span, svg, li-icon").first.click(force=True),
+    ):
+        try:
+            attempt()
+            return True, ""
+        except Exception as e:
+            error = str(e)
+    return False, error
+
+
+def message_navigate(ctx):
+    wait = ctx.wait
+    ctx.nav.goto(ctx.page, ctx.url, wait_until="domcontentloaded", timeout=30000)
+    wait.profile_ready()
+    ctx.page.evaluate(f"window.scrollBy(0, {random.randint(200, 400)})")
+    wait.pace("read_profile")
+
+    loaded, reason = verify_profile_loaded(ctx.page, ctx.name, ctx.url)
+    if not loaded:
+        ctx.log(f"PAGE LOAD FAIL: {reason}")
+        ctx.audit("page_load", "FAIL", error=reason)
+        ctx.log("Retrying page load after a short backoff...")
+        wait.pace("retry_backoff")
+        ctx.nav.goto(ctx.page, ctx.url, wait_until="domcontentloaded", timeout=30000)
+        wait.profile_ready()
+        loaded, reason = verify_profile_loaded(ctx.page, ctx.name, ctx.url)
+        if not loaded:
+            ctx.log(f"PAGE LOAD FAIL (retry): {reason}")
+            ctx.failure("page_load_fail")
+            ctx.audit("page_load_retry", "FAIL", error=reason)
+            return Done("page_load_failed", error=reason)
+
+    ctx.log(f"Profile loaded: {ctx.name}")
+    ss = ctx.debug_screenshot("01_profile_loaded")
+    ctx.audit("page_load", "OK", screenshot_path=ss)
+    return "status"
+
+
+def message_status(ctx):
+    """Disqualifier-first connection check from one page.evaluate (profile_state.py)."""
+    state = profile_state(ctx.page, ctx.name)
+    status = state["status"]
+    if state.get("error"):
+        ctx.log(f"WARN: Profile state script failed: {state['error']}")
+    ctx.log(f"CONNECTION: {ctx.name} → {status} ({describe(state)})")
+    ctx.debug_screenshot("02_connection_status")
+
+    if status == "PENDING" and not state["can_message"]:
+        ctx.log(f"PENDING: {ctx.name} has pending request. Skipping.")
+        ctx.debug_screenshot("status_pending")
+        ctx.audit("connection_status", "PENDING")
+        return Done("pending")
+    if status == "NOT_CONNECTED":
+        ctx.log(f"DECLINED: {ctx.name} -- Not connected.")
+        ctx.audit("connection_status", "NOT_CONNECTED")
+        return Done("not_connected")
+    if status == "UNKNOWN":
+        ctx.log(f"UNKNOWN: {ctx.name} -- No clear connection signals found.")
+        ctx.failure("status_unknown")
+        ctx.audit("connection_status", "UNKNOWN")
+        return Done("unknown")
+    return "open_chat"
+
+
+def find_message_button(ctx, scope, timeout=2000, stats_scope="profile_card"):
+    """
+    Unlocked Message CTA in scope via the registry chain (match recorded under
+    stats_scope, apart from page-wide lookups). (locator, selector) or (None, "").
+    """
+    lookup_start = time.time()
+    chain = ctx.sel.candidates("msg_button_selectors", scope=stats_scope)
+    for i, selector in enumerate(chain):
+        try:
+            btn = scope.locator(selector).first
+            if btn.is_visible(timeout=timeout) and btn.locator("svg[data-test-icon='lock-small']").count() == 0:
+                ctx.sel.record("msg_button_selectors", selector, (time.time() - lookup_start) * 1000,
+                               tried=chain[:i], scope=stats_scope)
+                return btn, selector
+        except Exception:
+            continue
+    ctx.sel.record("msg_button_selectors", None, (time.time() - lookup_start) * 1000, tried=chain, scope=stats_scope)
+    return None, ""
+
+
+def message_open_chat(ctx):
+    page, wait = ctx.page, ctx.wait
+    # Profile card first (the sidebar has other people's buttons), then the page-wide compose URL
+    ctx.profile_card = page.locator("main").first.locator("section").first
+    message_btn, matched_selector = find_message_button(ctx, ctx.profile_card)
+    if not message_btn:
+        try:
+            btn = page.locator("a[href*='/messaging/compose']").first
+            if btn.is_visible(timeout=2000):
+                message_btn = btn
+                matched_selector = "a[href*='/messaging/compose'] (page-wide)"
+        except Exception:
+            pass
+
+    if not message_btn:
+        ctx.log(f"WARN: {ctx.name} is CONNECTED but no Message button found. Skipping.")
+        ctx.screenshot("connected_no_btn")
+        ctx.audit("find_message_btn", "FAIL", error="Connected but no button")
+        return Done("no_message_button")
+
+    ctx.log(f"ACCEPTED: {ctx.name} -- Message button found via '{matched_selector}'.")
+    ss = ctx.debug_screenshot("02_message_btn_found")
+    ctx.audit("find_message_btn", "OK", selector=matched_selector, screenshot_path=ss)
+
+    msg_href = None
+    try:
+        msg_href = message_btn.get_attribute("href")
+    except Exception:
+        pass
+
+    if msg_href and "/messaging/compose" in msg_href:
+        # Navigate directly via the profileUrn compose URL
+        if msg_href.startswith("/"):
+            msg_href = "https://www.linkedin.com" + msg_href
+        ctx.log("PRIMARY: Navigating to compose URL...")
+        ctx.nav.goto(page, msg_href)
+        # Sometimes this lands on the inbox without opening a conversation
+        quick_textarea, _ = wait.first_visible("msg_textarea_selectors", timeout_ms=8000)
+        if quick_textarea:
+            ctx.open_method = "direct_url"
+        else:
+            ctx.log("COMPOSE URL REDIRECT: No chat opened. Falling back to button click...")
+            ctx.audit("compose_url_redirect", "FALLBACK")
+            ctx.nav.goto(page, ctx.url, wait_until="domcontentloaded", timeout=30000)
+            wait.profile_ready()
+            message_btn, _ = wait.first_visible("msg_button_selectors", timeout_ms=5000, scope=ctx.profile_card,
+                                                stats_scope="profile_card")
+            if not message_btn:
+                ctx.log("ERROR: Could not re-find Message button on return to profile.")
+                ctx.screenshot("refind_btn_fail")
+                ctx.audit("refind_message_btn", "FAIL")
+                return Done("no_message_button")
+            try:
+                message_btn.scroll_into_view_if_needed()
+                wait.pace("before_click")
+            except Exception:
+                pass
+            ok, error = click_strategies(message_btn)
+            if not ok:
+                ctx.log(f"ERROR: Fallback button click also failed: {error}")
+                ctx.screenshot("fallback_click_fail")
+                ctx.audit("fallback_click", "FAIL", error=error)
+                return Done("click_failed", error=error)
+            ctx.open_method = "fallback_button_click"
+    else:
+        ctx.log("FALLBACK: Clicking Message button directly on profile...")
+        try:
+            message_btn.scroll_into_view_if_needed()
+            wait.pace("before_click")
+        except Exception:
+            pass
+        ok, error = click_strategies(message_btn)
+        if not ok:
+            ctx.log(f"ERROR: All click strategies failed for {ctx.name}.")
+            ctx.failure("click_fail")
+            ctx.audit("click_message_btn", "FAIL", error=error)
+            return Done("click_failed", error=error)
+        ctx.open_method = "button_click"
+
+    ctx.log(f"Chat opened via {ctx.open_method}.")
+    ctx.audit("open_message", "OK", selector=ctx.open_method)
+    return "compose"
+
+
+def message_compose(ctx):
+    wait = ctx.wait
+    # Wait for the chat overlay to mount (twice, so slow overlays get logged)
+    textarea, textarea_selector = wait.first_visible("msg_textarea_selectors", timeout_ms=6000)
+    if not textarea:
+        ctx.log("Textarea not found yet. Waiting a little longer...")
+        ctx.audit("find_textarea", "RETRY")
+        textarea, textarea_selector = wait.first_visible("msg_textarea_selectors", timeout_ms=6000)
+    if not textarea:
+        ctx.log(f"ERROR: Message compose box not found for {ctx.name}.")
+        ctx.failure("no_textarea")
+        ctx.audit("find_textarea", "FAIL")
+        return Done("no_textarea")
+
+    ss = ctx.debug_screenshot("03_chat_opened")
+    ctx.audit("find_textarea", "OK", selector=textarea_selector, screenshot_path=ss)
+    ctx.log(f"VERIFIED: Chat opened via {ctx.open_method} for {ctx.name}.")
+    ctx.textarea = textarea
+
+    if check_inmail(ctx.page):
+        ctx.log(f"INMAIL: {ctx.name} requires InMail credits. Skipping.")
+        ctx.debug_screenshot("inmail_detected")
+        ctx.audit("inmail_check", "INMAIL")
+        return Done("inmail")
+    if check_dedup(ctx.page):
+        ctx.log(f"DEDUP: Already messaged {ctx.name}. Skipping.")
+        ctx.debug_screenshot("dedup_detected")
+        ctx.audit("dedup_check", "ALREADY_SENT")
+        return Done("already_sent")
+    if ctx.dry_run:
+        ctx.log(f"DRY RUN: Would send to {ctx.name}: \"{ctx.message[:80]}...\"")
+        ss = ctx.debug_screenshot("04_dry_run")
+        ctx.audit("send_message", "DRY_RUN", screenshot_path=ss)
+        return Done("dry_run")
+    return "send"
+
+
+def message_send(ctx):
+    wait, textarea = ctx.wait, ctx.textarea
+    textarea.click()
+    wait.pace("before_typing")
+    ctx.log(f"Composing message ({len(ctx.message)} chars)...")
+    ok, how = compose_text(ctx.page, textarea, ctx.message)
+    if not ok:
+        ctx.log(f"ERROR: Compose box content did not match the message after {how}.")
+        ctx.failure("compose_mismatch")
+        ctx.audit("type_message", "FAIL", selector=how, error="Editor content mismatch")
+        return Done("compose_failed")
+    wait.pace("after_typing")
+    ss = ctx.debug_screenshot("04_message_typed")
+    ctx.audit("type_message", "OK", selector=how, screenshot_path=ss)
+
+    send_btn, _ = wait.first_visible("msg_send_selectors", timeout_ms=5000)
+    if not send_btn:
+        ctx.log(f"ERROR: Send button not found for {ctx.name}.")
+        ctx.failure("no_send_btn")
+        ctx.audit("send_message", "FAIL", error="Send button not found")
+        return Done("no_send_button")
+    send_btn.click()
+    # Sent once the compose box clears
+    if not wait.until(lambda: not textarea.inner_text(timeout=1000).strip(), timeout_ms=5000):
+        ctx.log("WARN: Compose box did not clear after Send.")
+    return Done("sent")
+
+
+MESSAGE_FLOW = Flow("message", {
+    "navigate": message_navigate,
+    "status": message_status,
+    "open_chat": message_open_chat,
+    "compose": message_compose,
+    "send": message_send,
+}, start="navigate")
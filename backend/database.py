@@ -8,9 +8,14 @@ import uuid
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_NAME = os.path.join(BASE_DIR, "..", "candidates.db")
 
-def init_db():
-    """Initialize the candidates database."""
-    conn = sqlite3.connect(DB_NAME)
+# LinkedIn account whose activity is counted against rate limits / warm-up
+DEFAULT_ACCOUNT_ID = os.environ.get("DEVICE_ID", "local")
+# Organization that owns this local database (SQLite has no per-row org; rows are tagged with it on read)
+DEFAULT_ORGANIZATION_ID = os.environ.get("ORGANIZATION_ID")
+
+def init_db(db_path=None):
+    """Initialize the candidates database (at DB_NAME unless another path is given)."""
+    conn = sqlite3.connect(db_path or DB_NAME)
     c = conn.cursor()
     c.execute('''
         CREATE TABLE IF NOT EXISTS candidates (
@@ -57,6 +62,62 @@ def init_db():
         )
     ''')
 
+    # Per-campaign counters, maintained incrementally by the triggers below so
+    # list/funnel views never have to aggregate over campaign_candidates.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS campaign_stats (
+            campaign_id TEXT PRIMARY KEY,
+            member_count INTEGER NOT NULL DEFAULT 0,
+            pending_count INTEGER NOT NULL DEFAULT 0,
+            connection_sent_count INTEGER NOT NULL DEFAULT 0,
+            accepted_count INTEGER NOT NULL DEFAULT 0,
+            message_sent_count INTEGER NOT NULL DEFAULT 0,
+            declined_count INTEGER NOT NULL DEFAULT 0,
+            replied_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # Append-only ledger of outbound LinkedIn actions, plus per-day and
+    # per-account summary rows updated on every append. Limit and warm-up
+    # checks read the summaries instead of scanning campaign_candidates.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS activity_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            day TEXT NOT NULL,
+            campaign_id TEXT,
+            candidate_id TEXT,
+            created_at TIMESTAMP
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            account_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            day TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_id, action, day)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS activity_summary (
+            account_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            active_days INTEGER NOT NULL DEFAULT 0,
+            total_count INTEGER NOT NULL DEFAULT 0,
+            first_day TEXT,
+            last_day TEXT,
+            PRIMARY KEY (account_id, action)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name TEXT PRIMARY KEY,
+            applied_at TIMESTAMP
+        )
+    ''')
+
     # Migrations for existing DBs
     migrations = [
         "ALTER TABLE campaigns ADD COLUMN send_notes INTEGER DEFAULT 0",
@@ -71,9 +132,123 @@ def init_db():
         except Exception:
             pass  # Column already exists
 
+    _create_campaign_stats_triggers(c)
+    _backfill_campaign_stats(c)
+    _backfill_activity_ledger(c)
+
     conn.commit()
     conn.close()
 
+# Statuses that get their own counter column in campaign_stats
+STATS_STATUSES = ["pending", "connection_sent", "accepted", "message_sent", "declined", "replied"]
+
+def _status_deltas(row_alias, sign):
+    """Build the `<status>_count = <status>_count +/- (ALIAS.status = '<status>')` SET clauses."""
+    return ",\n                ".join(
+        f"{s}_count = {s}_count {sign} ({row_alias}.status = '{s}')" for s in STATS_STATUSES
+    )
+
+def _create_campaign_stats_triggers(c):
+    """Keep campaign_stats in sync with every write to campaign_candidates."""
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS campaigns_stats_init AFTER INSERT ON campaigns
+        BEGIN
+            INSERT OR IGNORE INTO campaign_stats (campaign_id) VALUES (NEW.id);
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS campaign_candidates_stats_insert AFTER INSERT ON campaign_candidates
+        BEGIN
+            INSERT OR IGNORE INTO campaign_stats (campaign_id) VALUES (NEW.campaign_id);
+            UPDATE campaign_stats SET
+                member_count = member_count + 1,
+                {_status_deltas("NEW", "+")}
+            WHERE campaign_id = NEW.campaign_id;
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS campaign_candidates_stats_delete AFTER DELETE ON campaign_candidates
+        BEGIN
+            UPDATE campaign_stats SET
+                member_count = member_count - 1,
+                {_status_deltas("OLD", "-")}
+            WHERE campaign_id = OLD.campaign_id;
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS campaign_candidates_stats_update AFTER UPDATE OF status ON campaign_candidates
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            UPDATE campaign_stats SET
+                {_status_deltas("OLD", "-")}
+            WHERE campaign_id = OLD.campaign_id;
+            UPDATE campaign_stats SET
+                {_status_deltas("NEW", "+")}
+            WHERE campaign_id = NEW.campaign_id;
+        END
+    ''')
+
+def _backfill_campaign_stats(c):
+    """
+    Seed campaign_stats for campaigns created before the table existed.
+    Only campaigns without a stats row are aggregated, so this is a no-op
+    (a single indexed probe) once the table is populated.
+    """
+    c.execute('''
+        SELECT 1 FROM campaigns cp
+        WHERE NOT EXISTS (SELECT 1 FROM campaign_stats s WHERE s.campaign_id = cp.id)
+        LIMIT 1
+    ''')
+    if not c.fetchone():
+        return
+    columns = ", ".join(f"{s}_count" for s in STATS_STATUSES)
+    counters = ", ".join(f"coalesce(sum(cc.status = '{s}'), 0)" for s in STATS_STATUSES)
+    c.execute(f'''
+        INSERT INTO campaign_stats (campaign_id, member_count, {columns})
+        SELECT cp.id, count(cc.candidate_id), {counters}
+        FROM campaigns cp
+        LEFT JOIN campaign_candidates cc ON cc.campaign_id = cp.id
+        WHERE NOT EXISTS (SELECT 1 FROM campaign_stats s WHERE s.campaign_id = cp.id)
+        GROUP BY cp.id
+    ''')
+
+def _backfill_activity_ledger(c):
+    """
+    One-time import of historical connection_sent rows into the activity
+    ledger so existing accounts keep their warm-up progress. Per-day counts
+    are all that can be recovered; no individual events are fabricated.
+    """
+    c.execute("SELECT 1 FROM schema_migrations WHERE name = 'activity_ledger_backfill'")
+    if c.fetchone():
+        return
+    c.execute('''
+        SELECT substr(updated_at, 1, 10) as day, count(*)
+        FROM campaign_candidates
+        WHERE status = 'connection_sent' AND updated_at IS NOT NULL
+        GROUP BY day
+    ''')
+    for day, count in c.fetchall():
+        _bump_activity_counters(c, DEFAULT_ACCOUNT_ID, "connection_sent", day, count)
+    c.execute("INSERT INTO schema_migrations (name, applied_at) VALUES ('activity_ledger_backfill', ?)",
+              (datetime.now(),))
+
+def _bump_activity_counters(c, account_id, action, day, amount=1):
+    """Increment the daily and per-account summary rows for an action."""
+    c.execute("INSERT OR IGNORE INTO activity_daily (account_id, action, day, count) VALUES (?, ?, ?, 0)",
+              (account_id, action, day))
+    new_day = 1 if c.rowcount == 1 else 0
+    c.execute("UPDATE activity_daily SET count = count + ? WHERE account_id = ? AND action = ? AND day = ?",
+              (amount, account_id, action, day))
+    c.execute('''
+        INSERT INTO activity_summary (account_id, action, active_days, total_count, first_day, last_day)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (account_id, action) DO UPDATE SET
+            active_days = active_days + excluded.active_days,
+            total_count = total_count + excluded.total_count,
+            first_day = min(first_day, excluded.first_day),
+            last_day = max(last_day, excluded.last_day)
+    ''', (account_id, action, new_day, amount, day, day))
+
 def save_candidate(candidate):
     """Save or update a candidate in the database."""
     conn = sqlite3.connect(DB_NAME)
@@ -178,17 +353,17 @@ def create_campaign(name, send_notes=False, job_context=None):
         conn.close()
 
 def get_campaigns():
-    """Get all campaigns with member counts."""
+    """Get all campaigns with member counts and per-status breakdowns."""
     conn = sqlite3.connect(DB_NAME)
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
     try:
-        # Get campaigns with count of members
-        c.execute('''
-            SELECT c.*, count(cc.candidate_id) as member_count 
+        # Counters come from campaign_stats (trigger-maintained), so this is O(campaigns)
+        counters = ", ".join(f"coalesce(s.{s}_count, 0) as {s}_count" for s in STATS_STATUSES)
+        c.execute(f'''
+            SELECT c.*, coalesce(s.member_count, 0) as member_count, {counters}
             FROM campaigns c 
-            LEFT JOIN campaign_candidates cc ON c.id = cc.campaign_id
-            GROUP BY c.id
+            LEFT JOIN campaign_stats s ON s.campaign_id = c.id
             ORDER BY c.created_at DESC
         ''')
         return [dict(row) for row in c.fetchall()]
@@ -198,6 +373,25 @@ def get_campaigns():
     finally:
         conn.close()
 
+def get_campaign_stats(campaign_id):
+    """Get the funnel counters for a single campaign."""
+    conn = sqlite3.connect(DB_NAME)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    try:
+        c.execute("SELECT * FROM campaign_stats WHERE campaign_id = ?", (campaign_id,))
+        row = c.fetchone()
+        if row:
+            return dict(row)
+        stats = {"campaign_id": campaign_id, "member_count": 0}
+        stats.update({f"{s}_count": 0 for s in STATS_STATUSES})
+        return stats
+    except Exception as e:
+        print(f"Get Campaign Stats Error: {e}")
+        return None
+    finally:
+        conn.close()
+
 def get_campaign_by_id(campaign_id):
     """Get a single campaign by ID."""
     conn = sqlite3.connect(DB_NAME)
@@ -0,0 +1,416 @@
+"""
+fixture_replay.py — Offline replay of captured LinkedIn pages for benchmarking
+the connect/message automation without a live session.
+
+Fixtures are the DOM snapshots save_dom_snapshot() already writes
+(execution/logs/dom_*.html.gz, decompressed on import), collected in a directory with a manifest.json:
+
+    {
+      "profiles": [
+        {"name": "Jane Doe", "url": "https://www.linkedin.com/in/jane-doe/",
+         "file": "jane.html", "expected_status": "CONNECTED"}
+      ],
+      "pages": [
+        {"url_prefix": "https://www.linkedin.com/messaging/compose", "file": "compose.html"}
+      ]
+    }
+
+ReplayServer serves the fixture directory from a local HTTP server (scripts
+stripped, so the snapshot stays static) and a context.route() handler maps
+LinkedIn URLs onto it: known profiles/pages get their fixture, the feed gets a
+minimal logged-in stub, other LinkedIn documents a 404 page, and everything
+else (static assets, trackers) is aborted. Snapshots don't include LinkedIn's
+stylesheets, so CSS-driven visibility can differ from the live site.
+
+With AUTOMATION_REPLAY=<fixture dir>, connect_linkedin.py and
+send_messages.py run headless against the replay instead of LinkedIn.
+
+Usage:
+    python fixture_replay.py import "execution/logs/dom_*.html*" --fixtures execution/fixtures
+    python fixture_replay.py bench --fixtures execution/fixtures [--flow connect|message|all]
+"""
+
+import argparse
+import glob
+import gzip
+import html
+import json
+import os
+import re
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES_DIR = os.path.join(BACKEND_DIR, "execution", "fixtures")
+RESULTS_DIR = os.path.join(BACKEND_DIR, "execution", "logs")
+
+FEED_STUB_HTML = """<!DOCTYPE html><html><head><title>Feed | LinkedIn</title></head>
+<body><nav id="global-nav"><a href="/feed/">Home</a></nav><main><h1>Feed</h1></main></body></html>"""
+NOT_FOUND_HTML = """<!DOCTYPE html><html><head><title>Page not found | LinkedIn</title></head>
+<body><main><h2>This page doesn't exist</h2></main></body></html>"""
+
+SCRIPT_RE = re.compile(r"<script\b[^>]*>.*?</script\s*>", re.IGNORECASE | re.DOTALL)
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [replay] {msg}", flush=True)
+
+
+def _normalize(url):
+    parsed = urlparse(url)
+    return f"{parsed.netloc.lower()}{parsed.path.rstrip('/')}"
+
+
+def load_manifest(fixtures_dir):
+    with open(os.path.join(fixtures_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest.setdefault("profiles", [])
+    manifest.setdefault("pages", [])
+    return manifest
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    fixtures_dir = None
+
+    def do_GET(self):
+        name = os.path.basename(unquote(urlparse(self.path).path))
+        path = os.path.join(self.fixtures_dir, name)
+        if not name or not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            body = SCRIPT_RE.sub("", f.read()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ReplayServer:
+    """Local HTTP server for a fixture directory plus the context.route() handler that points LinkedIn at it."""
+
+    def __init__(self, fixtures_dir):
+        self.fixtures_dir = os.path.abspath(fixtures_dir)
+        self.manifest = load_manifest(self.fixtures_dir)
+        self.by_url = {_normalize(p["url"]): p["file"] for p in self.manifest["profiles"]}
+        self.by_url.update({_normalize(p["url"]): p["file"] for p in self.manifest["pages"] if p.get("url")})
+        self.prefixes = [(_normalize(p["url_prefix"]), p["file"]) for p in self.manifest["pages"] if p.get("url_prefix")]
+        self.served = {}
+        self._httpd = None
+        self.base_url = None
+
+    def start(self):
+        if self._httpd is not None:
+            return self
+        handler = type("FixtureHandler", (_FixtureHandler,), {"fixtures_dir": self.fixtures_dir})
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        threading.Thread(target=self._httpd.serve_forever, name="fixture-http", daemon=True).start()
+        log(f"Serving {len(self.by_url) + len(self.prefixes)} fixture(s) from {self.fixtures_dir} at {self.base_url}")
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def fixture_for(self, url):
+        key = _normalize(url)
+        if key in self.by_url:
+            return self.by_url[key]
+        for prefix, name in self.prefixes:
+            if key.startswith(prefix):
+                return name
+        return None
+
+    def attach(self, context):
+        self.start()
+        context.route("**/*", self._handle)
+
+    def _handle(self, route):
+        request = route.request
+        url = request.url
+        host = urlparse(url).hostname or ""
+        try:
+            fixture = self.fixture_for(url)
+            if fixture:
+                self.served[fixture] = self.served.get(fixture, 0) + 1
+                route.fulfill(response=route.fetch(url=f"{self.base_url}/{fixture}"))
+            elif request.resource_type == "document" and host.endswith("linkedin.com"):
+                if _normalize(url).endswith("linkedin.com/feed"):
+                    route.fulfill(status=200, content_type="text/html", body=FEED_STUB_HTML)
+                else:
+                    route.fulfill(status=404, content_type="text/html", body=NOT_FOUND_HTML)
+            else:
+                route.abort()
+        except Exception:
+            pass  # Page closed mid-request
+
+
+_env_replay = None
+
+
+def replay_from_env():
+    """The ReplayServer for AUTOMATION_REPLAY (a fixture directory), or None for live runs."""
+    global _env_replay
+    fixtures_dir = os.environ.get("AUTOMATION_REPLAY")
+    if not fixtures_dir:
+        return None
+    if _env_replay is None or _env_replay.fixtures_dir != os.path.abspath(fixtures_dir):
+        _env_replay = ReplayServer(fixtures_dir)
+    return _env_replay
+
+
+# --- Fixture import ---
+
+def _extract(pattern, text):
+    match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+    return html.unescape(match.group(1)).strip() if match else None
+
+
+def import_snapshots(paths, fixtures_dir):
+    """Copy dom_*.html(.gz) snapshots into fixtures_dir and add manifest entries (URL/name read from the page)."""
+    os.makedirs(fixtures_dir, exist_ok=True)
+    manifest_path = os.path.join(fixtures_dir, "manifest.json")
+    manifest = load_manifest(fixtures_dir) if os.path.exists(manifest_path) else {"profiles": [], "pages": []}
+    known = {p["file"] for p in manifest["profiles"]}
+    added = 0
+    for path in paths:
+        name = os.path.basename(path)
+        if name.endswith(".gz"):
+            name = name[:-3]
+        if name in known:
+            continue
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        url = (_extract(r'<link[^>]+rel="canonical"[^>]+href="([^"]+)"', text)
+               or _extract(r'<meta[^>]+property="og:url"[^>]+content="([^"]+)"', text))
+        if not url or "/in/" not in url:
+            log(f"Skipping {name}: no profile URL found in the snapshot")
+            continue
+        with open(os.path.join(fixtures_dir, name), "w", encoding="utf-8") as f:
+            f.write(text)
+        person = _extract(r"<h1[^>]*>(.*?)</h1>", text)
+        person = re.sub(r"<[^>]+>", "", person or "").strip()
+        manifest["profiles"].append({"name": person, "url": url, "file": name, "expected_status": None})
+        added += 1
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    log(f"Imported {added} snapshot(s) into {manifest_path} (fill in expected_status to score accuracy)")
+    return added
+
+
+# --- Benchmark ---
+
+def _seed_db(db_path, campaign_id, profiles, status):
+    from database import init_db
+
+    init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        now = datetime.now()
+        conn.execute("INSERT INTO campaigns (id, name, created_at) VALUES (?, ?, ?)", (campaign_id, "replay bench", now))
+        for p in profiles:
+            conn.execute("INSERT INTO candidates (id, full_name, linkedin_url, created_at) VALUES (?, ?, ?, ?)",
+                         (p["id"], p.get("name"), p["url"], now))
+            conn.execute("INSERT INTO campaign_candidates (campaign_id, candidate_id, status, updated_at) VALUES (?, ?, ?, ?)",
+                         (campaign_id, p["id"], status, now))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _status_of(db_path, campaign_id, cid):
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT status FROM campaign_candidates WHERE campaign_id = ? AND candidate_id = ?",
+                           (campaign_id, cid)).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def _last_audit(path, cid):
+    """Final audit record for a candidate: '<step>:<result>'."""
+    last = None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("candidate_id") == cid:
+                    last = f"{record['step']}:{record['result']}"
+    except (OSError, ValueError, TypeError):
+        pass
+    return last
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def classify_fixtures(replay, profiles):
+    """profile_state() on every fixture: classifier accuracy and evaluate latency."""
+    from playwright.sync_api import sync_playwright
+    from profile_state import profile_state
+
+    results = []
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        context = browser.new_context()
+        replay.attach(context)
+        page = context.new_page()
+        for prof in profiles:
+            page.goto(prof["url"], wait_until="domcontentloaded")
+            t0 = time.time()
+            state = profile_state(page, prof.get("name"))
+            results.append({
+                "file": prof["file"], "name": prof.get("name"), "expected": prof.get("expected_status"),
+                "status": state["status"], "latency_ms": int((time.time() - t0) * 1000),
+            })
+        browser.close()
+    return results
+
+
+def bench_flow(flow, replay, profiles, workdir):
+    """Run the real connect/message state machine once per fixture; outcome + per-step timing per candidate."""
+    # Automation modules bind their repository on first use; point them at a scratch DB first
+    from repository import SQLiteRepository
+    if flow == "connect":
+        from execution import connect_linkedin as script
+    else:
+        from execution import send_messages as script
+        script.DRY_RUN = True
+
+    results = []
+    for prof in profiles:
+        campaign_id = f"bench-{uuid.uuid4().hex[:8]}"
+        cid = uuid.uuid4().hex
+        db_path = os.path.join(workdir, f"{campaign_id}.db")
+        _seed_db(db_path, campaign_id, [dict(prof, id=cid)], "pending" if flow == "connect" else "accepted")
+        script.repo = SQLiteRepository(db_path)
+        if flow == "connect":
+            script.DB_PATH = db_path
+            candidate = {"id": cid, "url": prof["url"], "note": None}
+            t0 = time.time()
+            summary = script.connect_to_profiles([candidate], campaign_id) or {}
+            outcome = _status_of(db_path, campaign_id, cid)
+        else:
+            candidate = {"id": cid, "url": prof["url"], "name": prof.get("name") or "", "message": "Hi there"}
+            t0 = time.time()
+            summary = script.send_messages_to_profiles([candidate], campaign_id) or {}
+            outcome = _last_audit(script.AUDIT_LOG_PATH, cid) or _status_of(db_path, campaign_id, cid)
+        results.append({
+            "file": prof["file"], "name": prof.get("name"), "expected": prof.get("expected_status"),
+            "outcome": outcome, "wall_ms": int((time.time() - t0) * 1000),
+            "timing": (summary.get("timing") or {}).get("steps", {}),
+        })
+        log(f"{flow} {prof['file']}: {outcome}")
+    return results
+
+
+def summarize(results):
+    """Aggregate per-step latency (p50/p95 of total, wait and work ms) across candidates."""
+    steps = {}
+    for r in results:
+        for step, t in (r.get("timing") or {}).items():
+            s = steps.setdefault(step, {"total_ms": [], "wait_ms": [], "work_ms": []})
+            for key in s:
+                s[key].append(t.get(key, 0))
+    out = {}
+    for step, s in steps.items():
+        out[step] = {f"{key}_{q}": _percentile(vals, pct)
+                     for key, vals in s.items() for q, pct in (("p50", 50), ("p95", 95))}
+    outcomes = {}
+    for r in results:
+        outcome = r.get("outcome") or r.get("status")
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    walls = [r["wall_ms"] for r in results if "wall_ms" in r]
+    return {
+        "candidates": len(results),
+        "outcomes": outcomes,
+        "wall_ms_p50": _percentile(walls, 50),
+        "wall_ms_p95": _percentile(walls, 95),
+        "wall_ms_mean": int(statistics.mean(walls)) if walls else None,
+        "steps": out,
+    }
+
+
+def run_benchmark(fixtures_dir, flows=("classify", "connect", "message")):
+    # Headless, no pacing: the benchmark measures automation work, not account-safety delays
+    os.environ["AUTOMATION_REPLAY"] = os.path.abspath(fixtures_dir)
+    os.environ.setdefault("PACING_SCALE", "0")
+    replay = replay_from_env()
+    profiles = replay.manifest["profiles"]
+    report = {"fixtures_dir": replay.fixtures_dir, "started_at": datetime.now().isoformat(), "flows": {}}
+    workdir = tempfile.mkdtemp(prefix="replay_bench_")
+    try:
+        if "classify" in flows:
+            results = classify_fixtures(replay, profiles)
+            scored = [r for r in results if r["expected"]]
+            correct = sum(1 for r in scored if r["status"] == r["expected"])
+            report["flows"]["classify"] = {
+                "results": results,
+                "accuracy": round(correct / len(scored), 3) if scored else None,
+                "latency_ms_p50": _percentile([r["latency_ms"] for r in results], 50),
+                "latency_ms_p95": _percentile([r["latency_ms"] for r in results], 95),
+            }
+        for flow in ("connect", "message"):
+            if flow in flows:
+                results = bench_flow(flow, replay, profiles, workdir)
+                report["flows"][flow] = {"results": results, "summary": summarize(results)}
+    finally:
+        replay.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out_path = os.path.join(RESULTS_DIR, f"replay_bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    for flow, data in report["flows"].items():
+        if flow == "classify":
+            log(f"classify: accuracy {data['accuracy']}, p50 {data['latency_ms_p50']}ms, p95 {data['latency_ms_p95']}ms")
+        else:
+            s = data["summary"]
+            log(f"{flow}: {s['candidates']} candidate(s), wall p50 {s['wall_ms_p50']}ms / p95 {s['wall_ms_p95']}ms, "
+                f"outcomes {s['outcomes']}")
+    log(f"Report written to {out_path}")
+    return report
+
+
+if __name__ == "__main__":
+    sys.path.append(BACKEND_DIR)
+    parser = argparse.ArgumentParser(description="Replay captured LinkedIn DOM snapshots for offline benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Add dom_*.html snapshots to a fixture directory")
+    imp.add_argument("snapshots", nargs="+")
+    imp.add_argument("--fixtures", default=DEFAULT_FIXTURES_DIR)
+    bench = sub.add_parser("bench", help="Run the classifier and connect/message flows against the fixtures")
+    bench.add_argument("--fixtures", default=DEFAULT_FIXTURES_DIR)
+    bench.add_argument("--flow", choices=["classify", "connect", "message", "all"], default="all")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        paths = [p for pattern in args.snapshots for p in glob.glob(pattern)]
+        import_snapshots(paths, args.fixtures)
+    else:
+        flows = ("classify", "connect", "message") if args.flow == "all" else (args.flow,)
+        run_benchmark(args.fixtures, flows)
@@ -0,0 +1,69 @@
+"""
+fleet_dispatcher.py — Assigns queued jobs across an organization's Ghost devices.
+
+Jobs enqueued without a device_id are placed by the job_runs_assign trigger
+(see pick_device_for_job in supabase_schema.sql) on the live device with the
+least work; jobs for a logged-in LinkedIn session stay on the device holding
+that session. This loop runs rebalance_job_runs() periodically so that:
+- jobs queued while no device was online get a device once one comes up,
+- unpinned pending jobs (including ones requeued after a lease expired) move
+  off devices that went offline or stopped heartbeating.
+
+Ghost workers already run the same pass every REAP_INTERVAL_SEC while idle;
+run this when no worker may be alive to do it (or schedule the SQL with
+pg_cron: SELECT rebalance_job_runs();).
+
+Usage:
+    python fleet_dispatcher.py            # loop every FLEET_INTERVAL_SEC
+    python fleet_dispatcher.py --once
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+from supabase import create_client
+
+load_dotenv()
+
+FLEET_INTERVAL_SEC = 30
+STALE_HEARTBEAT_SEC = 90  # Three missed ghost heartbeats
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [fleet] {msg}", flush=True)
+
+
+def rebalance(supabase, stale_seconds=STALE_HEARTBEAT_SEC):
+    """One dispatcher pass. Returns the number of jobs (re)assigned."""
+    moved = supabase.rpc("rebalance_job_runs", {"p_stale_seconds": stale_seconds}).execute().data or 0
+    if moved:
+        log(f"Assigned {moved} job(s) to live devices")
+    return moved
+
+
+def run_forever(supabase, interval=FLEET_INTERVAL_SEC, stale_seconds=STALE_HEARTBEAT_SEC):
+    log(f"Fleet dispatcher started (every {interval}s, stale after {stale_seconds}s)")
+    while True:
+        try:
+            rebalance(supabase, stale_seconds)
+        except Exception as e:
+            log(f"Rebalance failed: {e}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assign pending jobs to live Ghost devices")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--interval", type=int, default=FLEET_INTERVAL_SEC)
+    parser.add_argument("--stale-seconds", type=int, default=STALE_HEARTBEAT_SEC)
+    args = parser.parse_args()
+
+    client = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_SERVICE_KEY"))
+    if args.once:
+        rebalance(client, args.stale_seconds)
+    else:
+        run_forever(client, args.interval, args.stale_seconds)
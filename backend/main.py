@@ -1,6 +1,8 @@
 import os
 import sys
-from fastapi import FastAPI, HTTPException, Depends
+import glob
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from supabase import create_client, Client
@@ -13,6 +15,8 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from execution.sourcing_orchestrator import source_and_score_candidates
 from llm_helper import generate_connection_note, generate_initial_message
+from repository import SupabaseRepository
+from analytics_export import export_all, current_snapshot, ANALYTICS_DIR, CONTACTED_STATUSES, ACCEPTED_STATUSES
 
 app = FastAPI(title="ScaleOtter AI Logic Service")
 
@@ -184,6 +188,73 @@ async def generate_messages(campaign_id: str, request: GenerateMessagesRequest):
         "already_had_messages": len(candidates) - len(to_generate)
     }
 
+# --- Analytics (DuckDB over the Parquet export; never touches Supabase) ---
+
+def _status_list(statuses):
+    return ", ".join(f"'{s}'" for s in statuses)
+
+ANALYTICS_QUERIES = {
+    "funnel": """
+        SELECT campaign_id, campaign_status AS status, count(*) AS candidates
+        FROM candidates
+        WHERE organization_id = $organization_id AND ($campaign_id IS NULL OR campaign_id = $campaign_id)
+        GROUP BY campaign_id, campaign_status
+        ORDER BY campaign_id, candidates DESC
+    """,
+    "score_distribution": """
+        SELECT campaign_id, (ai_score // 10) * 10 AS score_bucket, count(*) AS candidates
+        FROM candidates
+        WHERE organization_id = $organization_id AND ($campaign_id IS NULL OR campaign_id = $campaign_id)
+          AND ai_score IS NOT NULL
+        GROUP BY campaign_id, score_bucket
+        ORDER BY campaign_id, score_bucket
+    """,
+    "acceptance_rate": f"""
+        SELECT campaign_id,
+               count(*) FILTER (WHERE campaign_status IN ({_status_list(CONTACTED_STATUSES)})) AS contacted,
+               count(*) FILTER (WHERE campaign_status IN ({_status_list(ACCEPTED_STATUSES)})) AS accepted,
+               round(accepted / nullif(contacted, 0), 4) AS acceptance_rate
+        FROM candidates
+        WHERE organization_id = $organization_id AND ($campaign_id IS NULL OR campaign_id = $campaign_id)
+        GROUP BY campaign_id
+        ORDER BY campaign_id
+    """,
+}
+
+@app.get("/api/analytics/{report}")
+def get_analytics(report: str, organization_id: str, campaign_id: Optional[str] = None):
+    """Funnel, score-distribution and acceptance-rate reports from the latest Parquet export."""
+    if report not in ANALYTICS_QUERIES:
+        raise HTTPException(status_code=404, detail=f"Unknown report '{report}'. Available: {sorted(ANALYTICS_QUERIES)}")
+    try:
+        import duckdb
+    except ImportError:
+        raise HTTPException(status_code=503, detail="duckdb is not installed on this server.")
+
+    snapshot = current_snapshot()
+    pattern = os.path.join(snapshot or ANALYTICS_DIR, "candidates", "**", "*.parquet")
+    if not snapshot or not glob.glob(pattern, recursive=True):
+        return {"report": report, "rows": [], "message": "No analytics export yet. POST /api/analytics/export first."}
+
+    con = duckdb.connect()
+    try:
+        # Views can't take bound parameters; the path is server-side config, only quotes need escaping
+        escaped = pattern.replace("'", "''")
+        con.execute(f"CREATE VIEW candidates AS SELECT * FROM read_parquet('{escaped}', hive_partitioning = true)")
+        cursor = con.execute(ANALYTICS_QUERIES[report], {"organization_id": organization_id, "campaign_id": campaign_id})
+        columns = [d[0] for d in cursor.description]
+        return {"report": report, "rows": [dict(zip(columns, row)) for row in cursor.fetchall()]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analytics query failed: {e}")
+    finally:
+        con.close()
+
+@app.post("/api/analytics/export")
+def trigger_analytics_export(background_tasks: BackgroundTasks):
+    """Refresh the Parquet export in the background."""
+    background_tasks.add_task(export_all, SupabaseRepository(supabase))
+    return {"status": "started", "output_dir": ANALYTICS_DIR}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -0,0 +1,121 @@
+"""
+profile_state.py — One-round-trip connection status for a LinkedIn profile.
+
+Instead of a chain of locator probes (Pending? Connect? invite link? Message?
+degree badge? ...), each its own IPC round trip with its own timeout,
+PROFILE_STATE_JS collects every signal from the profile top card in a single
+page.evaluate(). classify() turns the signals into a status with the same
+disqualifier-first rules send_messages.py has always used:
+
+    PENDING        invitation already sent
+    NOT_CONNECTED  Connect CTA / invite link / 2nd-3rd degree / Follow only
+    CONNECTED      1st degree, or an unlocked Message / compose link
+    UNKNOWN        no clear signal (page still loading, new layout, ...)
+
+All checks are scoped to the top card (first <section> in <main>): the
+"More profiles for you" sidebar has Connect/Message buttons for other people.
+"""
+
+PROFILE_STATE_JS = """
+(firstName) => {
+    const visible = (el) => {
+        if (!el) return false;
+        const style = window.getComputedStyle(el);
+        if (style.visibility === 'hidden' || style.display === 'none') return false;
+        return el.getClientRects().length > 0;
+    };
+    const text = (el) => (el.innerText || el.textContent || '').trim().toLowerCase();
+    const main = document.querySelector('main');
+    const card = main ? main.querySelector('section') : null;
+    const signals = {
+        card: !!card, name: '', pending: false, connect: false, invite_link: false, named_invite: false,
+        degree: null, message: false, message_locked: false, compose: false,
+        follow: false, following: false, more: false, no_common: false,
+    };
+    if (card) {
+        const h1 = card.querySelector('h1');
+        signals.name = h1 ? (h1.innerText || '').trim() : '';
+        const ctas = Array.from(card.querySelectorAll('button, a')).filter(visible);
+        let followSeen = false;
+        for (const el of ctas) {
+            const t = text(el);
+            const aria = (el.getAttribute('aria-label') || '').toLowerCase();
+            if (el.tagName === 'BUTTON' && t.includes('pending')) signals.pending = true;
+            if (t === 'connect' || t === '+ connect') signals.connect = true;
+            if (t.includes('message')) {
+                if (el.querySelector("svg[data-test-icon='lock-small']")) signals.message_locked = true;
+                else signals.message = true;
+            }
+            if (el.tagName === 'BUTTON' && !followSeen && t.includes('follow')) {
+                followSeen = true;
+                if (t === 'follow' || t === '+ follow') signals.follow = true;
+                else if (t === 'following') signals.following = true;
+            }
+            if (el.tagName === 'BUTTON' && t.includes('following')) signals.following = true;
+            if (el.tagName === 'BUTTON' && (aria === 'more' || aria === 'more actions')) signals.more = true;
+        }
+        signals.invite_link = Array.from(card.querySelectorAll("a[href*='/preload/custom-invite/']")).some(visible);
+        signals.compose = Array.from(card.querySelectorAll("a[href*='/messaging/compose']")).some(visible);
+        const header = card.innerText || '';
+        if (header.includes('· 2nd') || header.includes('\\n2nd')) signals.degree = '2nd';
+        else if (header.includes('· 3rd') || header.includes('\\n3rd') || header.toLowerCase().includes('3rd+')) signals.degree = '3rd';
+        else if (header.includes('· 1st') || header.includes('\\n1st')) signals.degree = '1st';
+        if (!signals.degree && Array.from(card.querySelectorAll('span.dist-value')).some((s) => text(s).includes('1st'))) {
+            signals.degree = '1st';
+        }
+    }
+    if (firstName) {
+        const named = document.querySelectorAll('button[aria-label*="Invite"]');
+        signals.named_invite = Array.from(named).some(
+            (b) => visible(b) && b.getAttribute('aria-label').includes(firstName));
+    }
+    const mainText = main ? (main.innerText || '').toLowerCase() : '';
+    signals.no_common = mainText.includes('no connections found') || mainText.includes('no common connection');
+    return signals;
+}
+"""
+
+
+def classify(signals):
+    """Connection status from collected signals (disqualifiers first, then qualifiers)."""
+    connect = signals.get("connect") or signals.get("invite_link") or signals.get("named_invite")
+    degree = signals.get("degree")
+    if signals.get("pending"):
+        return "PENDING"
+    if connect:
+        return "NOT_CONNECTED"
+    if degree in ("2nd", "3rd"):
+        return "NOT_CONNECTED"
+    if degree == "1st":
+        return "CONNECTED"
+    if signals.get("message") or signals.get("compose"):
+        return "CONNECTED"
+    if signals.get("following") or signals.get("follow"):
+        return "NOT_CONNECTED"
+    if signals.get("no_common"):
+        return "NOT_CONNECTED"
+    return "UNKNOWN"
+
+
+def profile_state(page, name=None):
+    """
+    {"status", "can_message", "signals"} for the profile open in page, from one
+    page.evaluate(). Returns UNKNOWN (with an "error" key) if the script fails.
+    """
+    first_name = name.split()[0] if name else ""
+    if len(first_name) <= 2:
+        first_name = ""
+    try:
+        signals = page.evaluate(PROFILE_STATE_JS, first_name)
+    except Exception as e:
+        return {"status": "UNKNOWN", "can_message": False, "signals": {}, "error": str(e)}
+    status = classify(signals)
+    return {"status": status, "can_message": status == "CONNECTED", "signals": signals}
+
+
+def describe(state):
+    """Compact one-line signal summary for logs."""
+    s = state.get("signals") or {}
+    return (f"pend={s.get('pending')}, conn={s.get('connect') or s.get('invite_link') or s.get('named_invite')}, "
+            f"degree={s.get('degree')}, msg={s.get('message')}, compose={s.get('compose')}, "
+            f"follow={s.get('follow')}, following={s.get('following')}")
@@ -0,0 +1,359 @@
+"""
+repository.py — One storage interface over the local SQLite DB and Supabase.
+
+The local automation scripts historically used database.py (SQLite, with the
+campaign_candidates join table) while main.py and the Ghost worker talk to
+Supabase (denormalized candidates.campaign_status). Both backends here expose
+the same batched read/write semantics so automation code can run against
+either one.
+
+Candidate rows are always returned in the Supabase shape:
+    {id, campaign_id, organization_id, name, linkedin_url, campaign_status,
+     connection_note, initial_message, message_status, updated_at, data}
+
+Pick a backend with get_repository() (STORAGE_BACKEND=sqlite|supabase).
+"""
+
+import json
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+import database
+
+# Fields automation code may write back for a campaign member
+WRITABLE_FIELDS = ("campaign_status", "connection_note", "initial_message", "message_status")
+
+
+class CampaignRepository(ABC):
+    """Interface shared by every storage backend."""
+
+    @abstractmethod
+    def get_campaign_candidates(self, campaign_id, statuses=None, updated_since=None):
+        """Members of a campaign, optionally filtered by status and/or updated_at >= updated_since."""
+
+    @abstractmethod
+    def iter_candidates(self, campaign_id=None, batch_size=500):
+        """Yield pages (lists) of candidate rows, across all campaigns unless one is given."""
+
+    @abstractmethod
+    def update_candidates(self, campaign_id, updates):
+        """
+        Apply many writes in as few round trips as possible.
+        updates: list of (candidate_id, {field: value}) with fields from WRITABLE_FIELDS.
+        Returns the number of candidates written.
+        """
+
+    def update_status(self, campaign_id, candidate_id, status, **fields):
+        """Single-candidate convenience wrapper around update_candidates()."""
+        fields["campaign_status"] = status
+        return self.update_candidates(campaign_id, [(candidate_id, fields)])
+
+    @abstractmethod
+    def get_campaign_stats(self, campaign_id):
+        """Funnel counters for one campaign (see campaign_stats)."""
+
+    @abstractmethod
+    def record_activity(self, action, account_id, campaign_id=None, candidate_id=None, organization_id=None):
+        """Append an outbound action to the activity ledger."""
+
+    @abstractmethod
+    def get_daily_activity_count(self, action, account_id, day=None):
+        """Ledger count for one account/action/day (default: today)."""
+
+    @abstractmethod
+    def get_activity_summary(self, action, account_id):
+        """Lifetime ledger counters: active_days, total_count, first_day, last_day."""
+
+    @abstractmethod
+    def iter_activity_events(self, batch_size=1000):
+        """Yield pages (lists) of raw activity ledger events, oldest first."""
+
+
+def _check_fields(fields):
+    unknown = set(fields) - set(WRITABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unsupported candidate fields: {sorted(unknown)}")
+
+
+# =====================================================================
+# SQLITE
+# =====================================================================
+
+# Supabase-shaped column name -> campaign_candidates column
+_SQLITE_COLUMNS = {
+    "campaign_status": "status",
+    "connection_note": "connection_note",
+    "initial_message": "initial_message",
+    "message_status": "message_status",
+}
+
+_SQLITE_SELECT = '''
+    SELECT cand.id, cc.campaign_id, NULL as organization_id, cand.full_name as name,
+           cand.linkedin_url, cc.status as campaign_status, cc.connection_note,
+           cc.initial_message, cc.message_status, cc.updated_at, cand.raw_data
+    FROM campaign_candidates cc
+    JOIN candidates cand ON cand.id = cc.candidate_id
+'''
+
+
+class SQLiteRepository(CampaignRepository):
+    """Local backend. Also serves as a fast stand-in for tests and as an offline cache."""
+
+    def __init__(self, db_path=None, organization_id=None):
+        self.db_path = db_path or database.DB_NAME
+        self.organization_id = organization_id or database.DEFAULT_ORGANIZATION_ID
+        database.init_db(self.db_path)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _to_row(self, row):
+        cand = dict(row)
+        cand["organization_id"] = self.organization_id
+        try:
+            cand["data"] = json.loads(cand.pop("raw_data") or "{}")
+        except (TypeError, ValueError):
+            cand["data"] = {}
+        return cand
+
+    def get_campaign_candidates(self, campaign_id, statuses=None, updated_since=None):
+        sql = _SQLITE_SELECT + " WHERE cc.campaign_id = ?"
+        params = [campaign_id]
+        if statuses:
+            sql += f" AND cc.status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        if updated_since:
+            sql += " AND cc.updated_at >= ?"
+            params.append(updated_since)
+        sql += " ORDER BY cc.updated_at, cand.id"
+        conn = self._connect()
+        try:
+            return [self._to_row(r) for r in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+
+    def iter_candidates(self, campaign_id=None, batch_size=500):
+        sql = _SQLITE_SELECT
+        params = []
+        if campaign_id:
+            sql += " WHERE cc.campaign_id = ?"
+            params.append(campaign_id)
+        sql += " ORDER BY cc.campaign_id, cand.id LIMIT ? OFFSET ?"
+        offset = 0
+        while True:
+            conn = self._connect()
+            try:
+                rows = conn.execute(sql, params + [batch_size, offset]).fetchall()
+            finally:
+                conn.close()
+            if not rows:
+                return
+            yield [self._to_row(r) for r in rows]
+            if len(rows) < batch_size:
+                return
+            offset += batch_size
+
+    def update_candidates(self, campaign_id, updates):
+        if not updates:
+            return 0
+        now = datetime.now()
+        conn = self._connect()
+        try:
+            written = 0
+            for cid, fields in updates:
+                _check_fields(fields)
+                assignments = ", ".join(f"{_SQLITE_COLUMNS[k]} = ?" for k in fields)
+                cur = conn.execute(
+                    f"UPDATE campaign_candidates SET {assignments}, updated_at = ? WHERE campaign_id = ? AND candidate_id = ?",
+                    list(fields.values()) + [now, campaign_id, cid],
+                )
+                written += cur.rowcount
+            conn.commit()  # One transaction for the whole batch
+            return written
+        finally:
+            conn.close()
+
+    def get_campaign_stats(self, campaign_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM campaign_stats WHERE campaign_id = ?", (campaign_id,)).fetchone()
+        finally:
+            conn.close()
+        if row:
+            return dict(row)
+        stats = {"campaign_id": campaign_id, "member_count": 0}
+        stats.update({f"{s}_count": 0 for s in database.STATS_STATUSES})
+        return stats
+
+    def record_activity(self, action, account_id, campaign_id=None, candidate_id=None, organization_id=None):
+        now = datetime.now()
+        day = now.strftime("%Y-%m-%d")
+        conn = self._connect()
+        try:
+            c = conn.cursor()
+            c.execute('''
+                INSERT INTO activity_events (account_id, action, day, campaign_id, candidate_id, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (account_id, action, day, campaign_id, candidate_id, now))
+            database._bump_activity_counters(c, account_id, action, day)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_daily_activity_count(self, action, account_id, day=None):
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT count FROM activity_daily WHERE account_id = ? AND action = ? AND day = ?",
+                (account_id, action, day),
+            ).fetchone()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+
+    def get_activity_summary(self, action, account_id):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT * FROM activity_summary WHERE account_id = ? AND action = ?", (account_id, action)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row:
+            return dict(row)
+        return {"account_id": account_id, "action": action, "active_days": 0,
+                "total_count": 0, "first_day": None, "last_day": None}
+
+    def iter_activity_events(self, batch_size=1000):
+        last_id = 0
+        while True:
+            conn = self._connect()
+            try:
+                rows = conn.execute("SELECT * FROM activity_events WHERE id > ? ORDER BY id LIMIT ?",
+                                    (last_id, batch_size)).fetchall()
+            finally:
+                conn.close()
+            if not rows:
+                return
+            yield [dict(r, organization_id=self.organization_id) for r in rows]
+            last_id = rows[-1]["id"]
+
+
+# =====================================================================
+# SUPABASE
+# =====================================================================
+
+_SUPABASE_COLUMNS = ("id, campaign_id, organization_id, name, linkedin_url, campaign_status, "
+                     "connection_note, initial_message, message_status, updated_at, data")
+
+
+class SupabaseRepository(CampaignRepository):
+    """Supabase/PostgREST backend. Takes an already-configured supabase Client."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get_campaign_candidates(self, campaign_id, statuses=None, updated_since=None):
+        query = self.client.table("candidates").select(_SUPABASE_COLUMNS).eq("campaign_id", campaign_id)
+        if statuses:
+            query = query.in_("campaign_status", list(statuses))
+        if updated_since:
+            query = query.gte("updated_at", updated_since)
+        return query.order("updated_at").order("id").execute().data or []
+
+    def iter_candidates(self, campaign_id=None, batch_size=500):
+        offset = 0
+        while True:
+            query = self.client.table("candidates").select(_SUPABASE_COLUMNS)
+            if campaign_id:
+                query = query.eq("campaign_id", campaign_id)
+            rows = query.order("id").range(offset, offset + batch_size - 1).execute().data or []
+            if not rows:
+                return
+            yield rows
+            if len(rows) < batch_size:
+                return
+            offset += batch_size
+
+    def update_candidates(self, campaign_id, updates):
+        if not updates:
+            return 0
+        # Rows receiving identical values share one PATCH ... WHERE id IN (...).
+        # (A bulk upsert is not an option: the partial rows would violate NOT NULL columns.)
+        groups = {}
+        for cid, fields in updates:
+            _check_fields(fields)
+            key = tuple(sorted(fields.items()))
+            groups.setdefault(key, []).append(cid)
+
+        written = 0
+        for key, ids in groups.items():
+            payload = dict(key)
+            payload["updated_at"] = datetime.now(timezone.utc).isoformat()
+            self.client.table("candidates").update(payload).eq("campaign_id", campaign_id).in_("id", ids).execute()
+            written += len(ids)
+        return written
+
+    def get_campaign_stats(self, campaign_id):
+        rows = self.client.table("campaign_stats").select("*").eq("campaign_id", campaign_id).execute().data
+        if rows:
+            return rows[0]
+        stats = {"campaign_id": campaign_id, "member_count": 0}
+        stats.update({f"{s}_count": 0 for s in database.STATS_STATUSES})
+        return stats
+
+    def record_activity(self, action, account_id, campaign_id=None, candidate_id=None, organization_id=None):
+        # The activity_events trigger maintains activity_daily / activity_summary
+        self.client.table("activity_events").insert({
+            "account_id": account_id,
+            "organization_id": organization_id,
+            "action": action,
+            "campaign_id": campaign_id,
+            "candidate_id": candidate_id,
+        }).execute()
+
+    def get_daily_activity_count(self, action, account_id, day=None):
+        day = day or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        rows = self.client.table("activity_daily").select("count") \
+            .eq("account_id", account_id).eq("action", action).eq("day", day).execute().data
+        return rows[0]["count"] if rows else 0
+
+    def get_activity_summary(self, action, account_id):
+        rows = self.client.table("activity_summary").select("*") \
+            .eq("account_id", account_id).eq("action", action).execute().data
+        if rows:
+            return rows[0]
+        return {"account_id": account_id, "action": action, "active_days": 0,
+                "total_count": 0, "first_day": None, "last_day": None}
+
+    def iter_activity_events(self, batch_size=1000):
+        last_id = 0
+        while True:
+            rows = self.client.table("activity_events").select("*") \
+                .gt("id", last_id).order("id").limit(batch_size).execute().data or []
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1]["id"]
+
+
+def get_repository(backend=None, client=None, db_path=None):
+    """
+    Build the configured repository.
+    backend: 'sqlite' (default) or 'supabase'; falls back to the STORAGE_BACKEND env var.
+    client:  optional supabase Client to reuse (otherwise built from SUPABASE_URL/SUPABASE_SERVICE_KEY).
+    """
+    backend = (backend or os.environ.get("STORAGE_BACKEND", "sqlite")).lower()
+    if backend == "sqlite":
+        return SQLiteRepository(db_path)
+    if backend == "supabase":
+        if client is None:
+            from supabase import create_client
+            client = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_SERVICE_KEY"))
+        return SupabaseRepository(client)
+    raise ValueError(f"Unknown storage backend: {backend}")
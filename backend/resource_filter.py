@@ -0,0 +1,156 @@
+"""
+resource_filter.py — Request interception for Playwright automation flows.
+
+The connect/message flows only need a profile's DOM and buttons, but a plain
+page.goto() downloads every photo, banner, video, font and tracker on the
+page. ResourceFilter hooks context.route() and:
+- stubs images with a 1x1 GIF (so <img> onload still fires and layout holds),
+- aborts media, fonts and requests to third-party analytics/ad hosts,
+- lets documents, scripts, XHR/fetch and stylesheets through untouched.
+
+goto() wraps page.goto() and logs, per navigation, the load time, blocked
+requests and an estimate of the bytes saved (blocked responses are never
+downloaded, so their size is estimated per resource type). summary() returns
+the running totals for a job's result.
+
+Routing disables Playwright's HTTP cache for the context, so the filter is
+toggled per flow (RESOURCE_FILTER_FLOWS, default "connect,message"): the
+login flow keeps a normal, cached browser.
+"""
+
+import os
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+RESOURCE_FILTER_FLOWS = os.environ.get("RESOURCE_FILTER_FLOWS", "connect,message")
+
+STUB_RESOURCE_TYPES = ("image",)
+BLOCK_RESOURCE_TYPES = ("media", "font")
+BLOCK_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "bat.bing.com", "connect.facebook.net", "scorecardresearch.com", "demdex.net", "omtrdc.net",
+    "hotjar.com", "adnxs.com", "ads-twitter.com", "px.ads.linkedin.com",
+)
+# Typical transfer size of what we skip (blocked responses are never fetched, so this is an estimate)
+EST_BYTES = {"image": 40_000, "media": 500_000, "font": 60_000, "tracker": 20_000}
+
+PIXEL_GIF = bytes.fromhex("47494638396101000100800000000000ffffff21f90401000000002c00000000010001000002024401003b")
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [net] {msg}", flush=True)
+
+
+def filter_enabled(flow):
+    """True if resource filtering is switched on for this flow (connect, message, login, ...)."""
+    flows = [f.strip() for f in RESOURCE_FILTER_FLOWS.split(",") if f.strip()]
+    return flow in flows or "all" in flows
+
+
+def _blocked_host(url):
+    host = urlparse(url).hostname or ""
+    return any(host == h or host.endswith("." + h) for h in BLOCK_HOSTS)
+
+
+class ResourceFilter:
+    """context.route() handler plus per-navigation load/blocking stats."""
+
+    def __init__(self, stub_types=STUB_RESOURCE_TYPES, block_types=BLOCK_RESOURCE_TYPES, block_hosts=True):
+        self.stub_types = tuple(stub_types)
+        self.block_types = tuple(block_types)
+        self.block_hosts = block_hosts
+        self.context = None
+        self.reset()
+
+    def reset(self):
+        """Start a fresh set of totals (e.g. per job)."""
+        self.totals = {"navigations": 0, "load_ms": 0, "blocked": {}, "bytes_saved_est": 0, "bytes_loaded": 0}
+        self._nav = self._new_nav()
+
+    def _new_nav(self):
+        return {"blocked": 0, "bytes_saved_est": 0, "bytes_loaded": 0}
+
+    # --- Interception ---
+
+    @property
+    def attached(self):
+        return self.context is not None
+
+    def attach(self, context):
+        if self.context is context:
+            return
+        self.detach()
+        context.route("**/*", self._handle)
+        context.on("response", self._on_response)
+        self.context = context
+
+    def detach(self):
+        if self.context is None:
+            return
+        try:
+            self.context.unroute("**/*", self._handle)
+            self.context.remove_listener("response", self._on_response)
+        except Exception:
+            pass  # Context already closed
+        self.context = None
+
+    def _record_blocked(self, kind):
+        saved = EST_BYTES.get(kind, 0)
+        self.totals["blocked"][kind] = self.totals["blocked"].get(kind, 0) + 1
+        self.totals["bytes_saved_est"] += saved
+        self._nav["blocked"] += 1
+        self._nav["bytes_saved_est"] += saved
+
+    def _handle(self, route):
+        request = route.request
+        rtype = request.resource_type
+        try:
+            if rtype == "document":
+                route.continue_()
+            elif self.block_hosts and _blocked_host(request.url):
+                self._record_blocked("tracker")
+                route.abort("blockedbyclient")
+            elif rtype in self.stub_types:
+                self._record_blocked(rtype)
+                route.fulfill(status=200, content_type="image/gif", body=PIXEL_GIF)
+            elif rtype in self.block_types:
+                self._record_blocked(rtype)
+                route.abort("blockedbyclient")
+            else:
+                route.continue_()
+        except Exception:
+            pass  # Page navigated away / closed while the request was in flight
+
+    def _on_response(self, response):
+        try:
+            size = int(response.headers.get("content-length") or 0)
+        except (ValueError, AttributeError):
+            size = 0
+        self.totals["bytes_loaded"] += size
+        self._nav["bytes_loaded"] += size
+
+    # --- Navigation ---
+
+    def goto(self, page, url, **kwargs):
+        """page.goto() with load time and blocking stats logged for this navigation."""
+        self._nav = self._new_nav()
+        t0 = time.time()
+        response = page.goto(url, **kwargs)
+        load_ms = int((time.time() - t0) * 1000)
+        self.totals["navigations"] += 1
+        self.totals["load_ms"] += load_ms
+        if self.attached:
+            log(f"Loaded in {load_ms}ms, {self._nav['bytes_loaded'] // 1024}KB; "
+                f"blocked {self._nav['blocked']} request(s), ~{self._nav['bytes_saved_est'] // 1024}KB saved")
+        else:
+            log(f"Loaded in {load_ms}ms (unfiltered)")
+        return response
+
+    def summary(self):
+        navs = self.totals["navigations"]
+        return dict(self.totals,
+                    blocked=dict(self.totals["blocked"]),
+                    filtered=self.attached,
+                    avg_load_ms=int(self.totals["load_ms"] / navs) if navs else None)
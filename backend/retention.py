@@ -0,0 +1,421 @@
+"""
+retention.py — Bounded disk use for automation artifacts.
+
+Screenshots, DOM snapshots, per-run audit logs and automation.log used to grow
+without limit (a large --debug-screenshots run alone can fill a laptop disk).
+enforce() applies, in order:
+
+1. compress  legacy dom_*.html snapshots and finished msg_run_*.jsonl audit
+             logs (untouched for COMPRESS_AFTER_SEC) to .gz
+2. rotate    automation.log into gzip segments once it exceeds LOG_SEGMENT_MB
+3. dedup     identical screenshots (sha256) into hard links to one copy, so
+             audit records keep valid paths
+4. evict     per category: files older than max_days, then oldest-first until
+             the category is under max_mb
+
+Limits come from POLICIES, overridable per category with
+RETENTION_<CATEGORY>_DAYS / RETENTION_<CATEGORY>_MB. maybe_enforce() is the
+throttled entry point (ghost worker idle loop, end of a send_messages run).
+The last run time is kept in the index file, so the interval holds across
+processes, not just within one.
+
+Usage:
+    python retention.py report [--json]
+    python retention.py enforce [--dry-run]
+"""
+
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+EXECUTION_DIR = os.path.join(BACKEND_DIR, "execution")
+SCREENSHOTS_DIR = os.path.join(EXECUTION_DIR, "screenshots")
+LOGS_DIR = os.path.join(EXECUTION_DIR, "logs")
+AUTOMATION_LOG = os.path.join(BACKEND_DIR, "automation.log")
+INDEX_PATH = os.path.join(LOGS_DIR, ".retention_index.json")
+
+COMPRESS_AFTER_SEC = 3600  # Older than this, an audit log belongs to a finished run
+LOG_SEGMENT_MB = float(os.environ.get("RETENTION_LOG_SEGMENT_MB", "10"))
+RETENTION_INTERVAL_SEC = int(os.environ.get("RETENTION_INTERVAL_SEC", "3600"))
+
+# category: (base dir, glob patterns, default max age in days, default max size in MB)
+POLICIES = {
+    "screenshots": (SCREENSHOTS_DIR, ["**/*.png"], 14, 500),
+    "debug_screenshots": (os.path.join(BACKEND_DIR, "logs"), ["debug_*.png"], 7, 100),
+    "dom": (LOGS_DIR, ["dom_*.html", "dom_*.html.gz"], 14, 200),
+    "runs": (LOGS_DIR, ["msg_run_*.jsonl", "msg_run_*.jsonl.gz"], 90, 100),
+    "automation_log": (BACKEND_DIR, ["automation.log.*.gz"], 90, 100),
+}
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [retention] {msg}", flush=True)
+
+
+def policy(category):
+    """(max_days, max_bytes) for a category, with RETENTION_<CATEGORY>_DAYS/_MB overrides."""
+    _, _, days, mb = POLICIES[category]
+    days = float(os.environ.get(f"RETENTION_{category.upper()}_DAYS", days))
+    mb = float(os.environ.get(f"RETENTION_{category.upper()}_MB", mb))
+    return days, int(mb * 1024 * 1024)
+
+
+def category_files(category):
+    """[(path, stat)] for a category, oldest first."""
+    base, patterns, _, _ = POLICIES[category]
+    files = []
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(base, pattern), recursive=True):
+            try:
+                files.append((path, os.stat(path)))
+            except OSError:
+                continue
+    return sorted(files, key=lambda f: f[1].st_mtime)
+
+
+def disk_bytes(files):
+    """Bytes actually used: hard-linked copies (same inode) count once."""
+    seen = set()
+    total = 0
+    for _, st in files:
+        key = (st.st_dev, st.st_ino)
+        if key not in seen:
+            seen.add(key)
+            total += st.st_size
+    return total
+
+
+# =====================================================================
+# ENFORCEMENT
+# =====================================================================
+
+def _gzip_file(path, dest, dry_run):
+    if dry_run:
+        return os.path.getsize(path)
+    with open(path, "rb") as src, gzip.open(f"{dest}.tmp", "wb", compresslevel=6) as out:
+        shutil.copyfileobj(src, out)
+    os.replace(f"{dest}.tmp", dest)
+    shutil.copystat(path, dest)  # Keep the original mtime for age-based eviction
+    saved = os.path.getsize(path) - os.path.getsize(dest)
+    os.remove(path)
+    return saved
+
+
+def compress_finished(dry_run=False):
+    """gzip legacy DOM snapshots and audit logs of finished runs. Bytes saved."""
+    saved = 0
+    cutoff = time.time() - COMPRESS_AFTER_SEC
+    for pattern in ("dom_*.html", "msg_run_*.jsonl"):
+        for path in glob.glob(os.path.join(LOGS_DIR, pattern)):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    saved += _gzip_file(path, f"{path}.gz", dry_run)
+            except OSError as e:
+                log(f"Could not compress {path}: {e}")
+    return saved
+
+
+def rotate_automation_log(dry_run=False):
+    """Roll automation.log into a gzip segment once it is over LOG_SEGMENT_MB. True if rotated."""
+    try:
+        if os.path.getsize(AUTOMATION_LOG) < LOG_SEGMENT_MB * 1024 * 1024:
+            return False
+    except OSError:
+        return False
+    if dry_run:
+        return True
+    segment = f"{AUTOMATION_LOG}.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    # Writers open the log in append mode per line, so a rename is safe: the next line starts a new file
+    os.replace(AUTOMATION_LOG, segment)
+    _gzip_file(segment, f"{segment}.gz", False)
+    return True
+
+
+def _load_index():
+    """{"last_run": epoch seconds, "hashes": {path: [size, mtime, sha256]}}."""
+    try:
+        with open(INDEX_PATH, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except Exception:
+        return {"last_run": 0, "hashes": {}}
+    if "hashes" not in index:  # Older files held only the hash map
+        index = {"last_run": 0, "hashes": index}
+    return index
+
+
+def _save_index(index):
+    try:
+        os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
+        tmp = f"{INDEX_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, INDEX_PATH)
+    except Exception as e:
+        log(f"Could not save hash index: {e}")
+
+
+def dedup_screenshots(dry_run=False):
+    """Hard-link identical screenshots to the oldest copy. Bytes saved."""
+    index = _load_index()
+    hashes = index["hashes"]  # path -> [size, mtime, sha256]; only new/changed files are hashed
+    fresh = {}
+    groups = {}
+    for category in ("screenshots", "debug_screenshots"):
+        for path, st in category_files(category):
+            cached = hashes.get(path)
+            if cached and cached[0] == st.st_size and cached[1] == st.st_mtime:
+                digest = cached[2]
+            else:
+                try:
+                    with open(path, "rb") as f:
+                        digest = hashlib.sha256(f.read()).hexdigest()
+                except OSError:
+                    continue
+            fresh[path] = [st.st_size, st.st_mtime, digest]
+            groups.setdefault(digest, []).append((path, st))
+
+    saved = 0
+    for copies in groups.values():
+        keep_path, keep_st = copies[0]  # Oldest first
+        for path, st in copies[1:]:
+            if (st.st_dev, st.st_ino) == (keep_st.st_dev, keep_st.st_ino):
+                continue
+            saved += st.st_size
+            if dry_run:
+                continue
+            try:
+                tmp = f"{path}.link"
+                os.link(keep_path, tmp)
+                os.replace(tmp, path)
+                fresh[path] = [keep_st.st_size, keep_st.st_mtime, fresh[keep_path][2]]
+            except OSError as e:
+                saved -= st.st_size
+                log(f"Could not dedup {path}: {e}")
+    if not dry_run:
+        # Re-read last_run: another process may have claimed a pass meanwhile
+        _save_index({"last_run": max(index["last_run"], _load_index()["last_run"]), "hashes": fresh})
+    return saved
+
+
+def evict(category, dry_run=False):
+    """Delete a category's files past max age, then oldest-first until under max size. (files, bytes) removed."""
+    max_days, max_bytes = policy(category)
+    files = category_files(category)
+    cutoff = time.time() - max_days * 86400
+    doomed = [f for f in files if f[1].st_mtime < cutoff]
+    kept = [f for f in files if f[1].st_mtime >= cutoff]
+    # Running total; a hard-linked inode stops counting once its last kept link goes
+    links = {}
+    for _, st in kept:
+        links[(st.st_dev, st.st_ino)] = links.get((st.st_dev, st.st_ino), 0) + 1
+    total = disk_bytes(kept)
+    evicted = 0
+    while evicted < len(kept) and total > max_bytes:
+        path, st = kept[evicted]
+        evicted += 1
+        doomed.append((path, st))
+        key = (st.st_dev, st.st_ino)
+        links[key] -= 1
+        if links[key] == 0:
+            total -= st.st_size
+    freed = disk_bytes(doomed) if doomed else 0
+    if not dry_run:
+        for path, _ in doomed:
+            try:
+                os.remove(path)
+            except OSError as e:
+                log(f"Could not delete {path}: {e}")
+    return len(doomed), freed
+
+
+def _remove_empty_dirs(root):
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        if dirpath != root and not dirnames and not filenames:
+            try:
+                os.rmdir(dirpath)
+            except OSError:
+                pass
+
+
+def enforce(dry_run=False):
+    """Run compress/rotate/dedup/evict once. Summary dict of what was (or would be) reclaimed."""
+    summary = {
+        "compressed_saved": compress_finished(dry_run),
+        "log_rotated": rotate_automation_log(dry_run),
+        "dedup_saved": dedup_screenshots(dry_run),
+        "evicted": {},
+    }
+    for category in POLICIES:
+        count, freed = evict(category, dry_run)
+        if count:
+            summary["evicted"][category] = {"files": count, "bytes": freed}
+    if not dry_run:
+        _remove_empty_dirs(SCREENSHOTS_DIR)
+    total = summary["compressed_saved"] + summary["dedup_saved"] + sum(e["bytes"] for e in summary["evicted"].values())
+    summary["reclaimed_bytes"] = total
+    prefix = "Would reclaim" if dry_run else "Reclaimed"
+    log(f"{prefix} {total / 1024 / 1024:.1f}MB (compressed {summary['compressed_saved'] // 1024}KB, "
+        f"dedup {summary['dedup_saved'] // 1024}KB, evicted {summary['evicted'] or 'nothing'})")
+    return summary
+
+
+_run_lock = threading.Lock()
+
+
+def _claim_run():
+    """True (and last_run stamped in the index) if no process has run a pass within RETENTION_INTERVAL_SEC."""
+    index = _load_index()
+    if time.time() - index["last_run"] < RETENTION_INTERVAL_SEC:
+        return False
+    index["last_run"] = time.time()
+    _save_index(index)
+    return True
+
+
+def _enforce_if_due():
+    if not _run_lock.acquire(blocking=False):
+        return None
+    try:
+        if not _claim_run():
+            return None
+        return enforce()
+    except Exception as e:
+        log(f"Retention pass failed: {e}")
+        return None
+    finally:
+        _run_lock.release()
+
+
+def maybe_enforce(background=False):
+    """
+    enforce() at most once per RETENTION_INTERVAL_SEC across processes; errors are
+    logged, never raised. background=True runs the pass on a daemon thread and
+    returns at once (for loops that must not stall on disk I/O).
+    """
+    if background:
+        if not _run_lock.locked():
+            threading.Thread(target=_enforce_if_due, name="retention", daemon=True).start()
+        return None
+    return _enforce_if_due()
+
+
+# =====================================================================
+# REPORT
+# =====================================================================
+
+def _candidate_campaigns(db_path):
+    """candidate id prefix (8 and 12 chars) -> most recently updated campaign id."""
+    prefixes = {}
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute(
+                "SELECT campaign_id, candidate_id FROM campaign_candidates ORDER BY updated_at").fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        log(f"Campaign lookup unavailable ({e}); reporting per category only")
+        return prefixes
+    for campaign_id, candidate_id in rows:
+        cid = str(candidate_id)
+        prefixes[cid[:8]] = campaign_id
+        prefixes[cid[:12]] = campaign_id
+    return prefixes
+
+
+def _run_candidate(path):
+    """First candidate id recorded in an audit log (plain or gzipped)."""
+    opener = gzip.open if path.endswith(".gz") else open
+    try:
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                cid = json.loads(line).get("candidate_id")
+                if cid:
+                    return str(cid)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _owner_prefix(category, path):
+    name = os.path.basename(path)
+    if category == "screenshots":
+        return os.path.basename(os.path.dirname(path))
+    if category == "dom":
+        return name.split("_")[1] if name.count("_") >= 2 else None
+    if category == "runs":
+        cid = _run_candidate(path)
+        return cid[:12] if cid else None
+    return None
+
+
+def report(db_path=None):
+    """Disk use per category and per campaign (artifacts attributed via candidate ids)."""
+    if db_path is None:
+        sys.path.append(BACKEND_DIR)
+        from database import DB_NAME
+        db_path = DB_NAME
+    owners = _candidate_campaigns(db_path)
+    categories = {}
+    campaigns = {}
+    for category in POLICIES:
+        files = category_files(category)
+        max_days, max_bytes = policy(category)
+        categories[category] = {
+            "files": len(files),
+            "bytes": disk_bytes(files),
+            "max_bytes": max_bytes,
+            "max_days": max_days,
+            "oldest": datetime.fromtimestamp(files[0][1].st_mtime).isoformat() if files else None,
+        }
+        for path, st in files:
+            prefix = _owner_prefix(category, path)
+            campaign = owners.get(prefix) if prefix else None
+            entry = campaigns.setdefault(campaign or "unattributed", {})
+            entry[category] = entry.get(category, 0) + st.st_size
+    for entry in campaigns.values():
+        entry["total"] = sum(entry.values())
+    return {"categories": categories, "campaigns": campaigns,
+            "total_bytes": sum(c["bytes"] for c in categories.values())}
+
+
+def _mb(n):
+    return f"{n / 1024 / 1024:.1f}MB"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Disk retention for screenshots, DOM snapshots and logs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="Disk use per category and per campaign")
+    rep.add_argument("--json", action="store_true")
+    rep.add_argument("--db", default=None, help="SQLite DB used to attribute artifacts to campaigns")
+    enf = sub.add_parser("enforce", help="Compress, rotate, dedup and evict")
+    enf.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "enforce":
+        enforce(dry_run=args.dry_run)
+    else:
+        data = report(args.db)
+        if args.json:
+            print(json.dumps(data, indent=2))
+        else:
+            print(f"Total: {_mb(data['total_bytes'])}")
+            for name, c in data["categories"].items():
+                print(f"  {name:<18} {c['files']:>6} files  {_mb(c['bytes']):>9} / {_mb(c['max_bytes'])}"
+                      f"  (max {c['max_days']:g}d, oldest {c['oldest'] or '-'})")
+            print("Per campaign:")
+            for campaign, entry in sorted(data["campaigns"].items(), key=lambda kv: -kv[1]["total"]):
+                parts = ", ".join(f"{k} {_mb(v)}" for k, v in entry.items() if k != "total")
+                print(f"  {campaign:<38} {_mb(entry['total']):>9}  ({parts})")
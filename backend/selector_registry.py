@@ -0,0 +1,300 @@
+"""
+selector_registry.py — Shared LinkedIn selectors with validation, hot reload
+and per-selector hit stats.
+
+One registry serves connect_linkedin.py, send_messages.py and the Ghost
+scripts (which used to hardcode their own copy):
+- DEFAULT_SELECTORS are overridden by execution/selectors.json. Entries are
+  validated (non-empty string, or non-empty list of strings for fallback
+  chains, balanced quotes/brackets); bad entries are logged and skipped.
+- The file is re-checked (mtime) at most every RELOAD_CHECK_SEC, so a hot-fix
+  takes effect mid-run without restarting the worker.
+- Fallback chains (list values) record which selector matched and how long the
+  lookup took. Every selector tried before the match (or all of them, on a
+  miss) is charged a miss. Each selector keeps a decayed hit rate (EWMA over
+  its tries, HIT_RATE_ALPHA), and candidates() returns the chain highest-rate
+  first, so after a LinkedIn change the new winner overtakes the old one within
+  a handful of lookups. Stats persist in selector_stats.json next to
+  selectors.json across runs.
+- The same chain used from different scopes (e.g. the profile card vs the
+  whole page) can keep separate stats: pass scope= to candidates()/record().
+
+The registry is a read-only mapping: sel["key"] / sel.get("key", default) work
+as they did with the old dict. List values come back in adaptive order.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+SELECTORS_PATH = os.environ.get(
+    "SELECTORS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "execution", "selectors.json"))
+RELOAD_CHECK_SEC = 2
+STATS_SAVE_EVERY = 20  # Persist stats after this many recorded lookups
+HIT_RATE_ALPHA = 0.1   # Weight of the latest try in a selector's decayed hit rate
+
+DEFAULT_SELECTORS = {
+    "connect_btn_primary": "button:has-text('Connect'):visible",
+    "connect_btn_aria": "button[aria-label='Connect']:visible",
+    "pending_text": "Pending",
+    "message_text": "Message",
+    "more_btn_selectors": [
+        ".pv-top-card button:has(svg[id='overflow-web-ios-small'])",
+        ".pv-top-card button[aria-label='More']",
+        ".pv-top-card button[aria-label='More actions']",
+        ".pv-top-card-v2-ctas button[aria-label='More']",
+        "button:has(svg[id='overflow-web-ios-small'])"
+    ],
+    "dropdown_connect_text": "Connect",
+    "dropdown_connect_span": "span:has-text('Connect')",
+    "send_without_note_aria": "button[aria-label='Send without a note']",
+    "send_without_note_content": "Send without a note",
+    "add_note_btn": "button[aria-label='Add a note']",
+    "note_textarea": "textarea[name='message']",
+    "send_btn": "button[aria-label='Send invitation']",
+    "email_input": "input[name='email']",
+    "dismiss_modal": "button[aria-label='Dismiss']",
+    "msg_button_selectors": [
+        "a[href*='/messaging/compose']",
+        "button:has-text('Message')",
+        "a:has-text('Message')",
+        "a.message-anywhere-button",
+        "button[aria-label^='Message']"
+    ],
+    "msg_textarea_selectors": [
+        "div.msg-form__contenteditable[role='textbox']",
+        "div[role='textbox'][aria-label='Write a message…']",
+        "div[role='textbox'][contenteditable='true']",
+        "div.msg-form__contenteditable",
+        "div[aria-label='Write a message…']",
+        "div[aria-placeholder='Write a message…']",
+        ".msg-form__message-texteditor div[role='textbox']"
+    ],
+    "msg_send_selectors": [
+        "button[aria-label='Send']",
+        "button.msg-form__send-button",
+        "button[type='submit']"
+    ],
+}
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [selectors] {msg}", flush=True)
+
+
+def _balanced(selector):
+    """Cheap syntax sanity check: quotes closed, brackets/parens nested properly."""
+    closing = {")": "(", "]": "["}
+    stack = []
+    quote = None
+    for ch in selector:
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch in "([":
+            stack.append(ch)
+        elif ch in ")]":
+            if not stack or stack.pop() != closing[ch]:
+                return False
+    return quote is None and not stack
+
+
+def validate(data):
+    """(valid entries, list of error strings) for a loaded selectors.json object."""
+    if not isinstance(data, dict):
+        return {}, ["selectors.json must be a JSON object"]
+    valid, errors = {}, []
+    for key, value in data.items():
+        values = value if isinstance(value, list) else [value]
+        if not values:
+            errors.append(f"{key}: empty fallback list")
+            continue
+        bad = [v for v in values if not isinstance(v, str) or not v.strip() or not _balanced(v)]
+        if bad:
+            errors.append(f"{key}: invalid selector(s) {bad!r}")
+            continue
+        valid[key] = list(value) if isinstance(value, list) else value
+    return valid, errors
+
+
+class SelectorRegistry:
+    """Hot-reloaded selector map with adaptive fallback order."""
+
+    def __init__(self, path=SELECTORS_PATH, stats_path=None, defaults=DEFAULT_SELECTORS):
+        self.path = path
+        self.stats_path = stats_path or os.path.join(os.path.dirname(path), "selector_stats.json")
+        self.defaults = dict(defaults)
+        self._selectors = dict(defaults)
+        self._mtime = None
+        self._last_check = 0
+        self._lock = threading.RLock()
+        self._unsaved = 0
+        self.stats = self._load_stats()
+        self.reload_if_changed(force=True)
+
+    # --- Loading ---
+
+    def reload_if_changed(self, force=False):
+        now = time.time()
+        if not force and now - self._last_check < RELOAD_CHECK_SEC:
+            return False
+        self._last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if not force and mtime == self._mtime:
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+        except Exception as e:
+            # Half-written or broken file: keep serving the previous selectors
+            log(f"Warning: Could not load {os.path.basename(self.path)}: {e}")
+            self._mtime = mtime
+            return False
+        valid, errors = validate(loaded)
+        for error in errors:
+            log(f"Warning: Skipping {error}")
+        with self._lock:
+            self._selectors = dict(self.defaults, **valid)
+            self._mtime = mtime
+        log(f"Loaded {len(valid)} selectors from {os.path.basename(self.path)}")
+        return True
+
+    # --- Mapping interface ---
+
+    def __getitem__(self, key):
+        self.reload_if_changed()
+        with self._lock:
+            value = self._selectors[key]
+        return self.candidates(key) if isinstance(value, list) else value
+
+    def __contains__(self, key):
+        return key in self._selectors
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self._selectors.keys()
+
+    # --- Fallback chains ---
+
+    @staticmethod
+    def _stats_key(key, scope):
+        return f"{key}@{scope}" if scope else key
+
+    def candidates(self, key, scope=None):
+        """The fallback chain for key, highest decayed hit rate first (file order breaks ties)."""
+        self.reload_if_changed()
+        with self._lock:
+            value = self._selectors.get(key, [])
+            chain = list(value) if isinstance(value, list) else [value]
+            stats = self.stats.get(self._stats_key(key, scope), {}).get("selectors", {})
+        order = {s: i for i, s in enumerate(chain)}
+        return sorted(chain, key=lambda s: (-stats.get(s, {}).get("rate", 0), order[s]))
+
+    def record(self, key, selector, latency_ms=0, tried=(), scope=None):
+        """
+        Note the outcome of one lookup: the selector that matched (or None if none
+        did) and the selectors tried before it without a match.
+        """
+        with self._lock:
+            entry = self.stats.setdefault(self._stats_key(key, scope), {"lookups": 0, "misses": 0, "selectors": {}})
+            entry["lookups"] += 1
+            if selector is None:
+                entry["misses"] += 1
+            for missed in tried:
+                if missed != selector:
+                    s = entry["selectors"].setdefault(missed, {"hits": 0, "total_ms": 0})
+                    s["rate"] = s.get("rate", 0) * (1 - HIT_RATE_ALPHA)
+            if selector is not None:
+                s = entry["selectors"].setdefault(selector, {"hits": 0, "total_ms": 0})
+                s["hits"] += 1
+                s["total_ms"] += int(latency_ms)
+                s["rate"] = s.get("rate", 0) * (1 - HIT_RATE_ALPHA) + HIT_RATE_ALPHA
+            self._unsaved += 1
+            due = self._unsaved >= STATS_SAVE_EVERY
+        if due:
+            self.save_stats()
+
+    def first_match(self, scope, key, suffix=""):
+        """
+        Instant lookup through key's fallback chain with scope.query_selector().
+        (element handle, selector) or (None, None); the outcome is recorded.
+        """
+        t0 = time.time()
+        chain = self.candidates(key)
+        for i, selector in enumerate(chain):
+            try:
+                element = scope.query_selector(f"{selector}{suffix}")
+            except Exception:
+                continue
+            if element:
+                self.record(key, selector, (time.time() - t0) * 1000, tried=chain[:i])
+                return element, selector
+        self.record(key, None, (time.time() - t0) * 1000, tried=chain)
+        return None, None
+
+    # --- Stats ---
+
+    def _load_stats(self):
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def save_stats(self):
+        with self._lock:
+            data = json.dumps(self.stats, indent=2)
+            self._unsaved = 0
+        tmp = f"{self.stats_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.stats_path)
+        except Exception as e:
+            log(f"Warning: Could not save selector stats: {e}")
+
+    def report(self):
+        """{key: {lookups, miss_rate, selectors: {selector: {hits, hit_rate, recent_rate, avg_ms}}}} for logs/debugging."""
+        with self._lock:
+            out = {}
+            for key, entry in self.stats.items():
+                lookups = entry.get("lookups", 0) or 1
+                out[key] = {
+                    "lookups": entry.get("lookups", 0),
+                    "miss_rate": round(entry.get("misses", 0) / lookups, 3),
+                    "selectors": {
+                        s: {"hits": v["hits"], "hit_rate": round(v["hits"] / lookups, 3),
+                            "recent_rate": round(v.get("rate", 0), 3),
+                            "avg_ms": int(v["total_ms"] / v["hits"]) if v["hits"] else None}
+                        for s, v in entry.get("selectors", {}).items()
+                    },
+                }
+            return out
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Process-wide registry (stats are flushed at exit)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SelectorRegistry()
+            atexit.register(_registry.save_stats)
+        return _registry
@@ -0,0 +1,189 @@
+"""
+session_cache.py — Preflight for the LinkedIn session, so runs don't start with
+a full feed load when the session is known to be good.
+
+Every connect/message run used to open https://www.linkedin.com/feed/ just to
+see whether it got redirected to the login page. preflight() decides from
+local state first:
+
+    expired  no li_at cookie, or it has expired     -> stop without navigating
+    fresh    verified within SESSION_CACHE_TTL_SEC with the same li_at cookie
+             (fingerprint) and that cookie isn't about to expire -> skip the check
+    ok       lightweight check passed: one authenticated API request
+             (/voyager/api/me via context.request, no page render)
+    check    anything else -> caller falls back to the full feed load
+
+The cache (SESSION_CACHE_PATH, JSON) is keyed by session: the state.json path
+for the local scripts, the persistent profile directory for Ghost browsers.
+It stores only timestamps, the cookie expiry and a hash of li_at. Callers
+record_verified() after a passed feed check, and note_navigation() when a job
+ends: the page it left on LinkedIn proves the session (or its redirect to
+login invalidates it).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+SESSION_CACHE_PATH = os.environ.get(
+    "SESSION_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_cache.json"))
+SESSION_CACHE_TTL_SEC = int(os.environ.get("SESSION_CACHE_TTL_SEC", "1800"))
+EXPIRY_MARGIN_SEC = 24 * 3600  # Treat li_at as stale this long before LinkedIn's expiry
+LIGHT_CHECK_URL = "https://www.linkedin.com/voyager/api/me"
+
+_lock = threading.Lock()
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [session] {msg}", flush=True)
+
+
+def session_key(path):
+    return os.path.abspath(path)
+
+
+# --- Cookies ---
+
+def _li_at(cookies):
+    for c in cookies or []:
+        if c.get("name") == "li_at" and "linkedin.com" in c.get("domain", ""):
+            return c
+    return None
+
+
+def cookies_from_state(state_path):
+    """Cookies saved in a Playwright storage_state file ([] if unreadable)."""
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("cookies", [])
+    except Exception:
+        return []
+
+
+def cookies_from_context(context):
+    """Cookies of a live browser context for linkedin.com (local IPC, no network); None if unreadable."""
+    try:
+        return context.cookies("https://www.linkedin.com")
+    except Exception:
+        return None
+
+
+def cookie_info(cookies):
+    """{"fingerprint", "expires"} of the li_at cookie, or None. expires is -1 for a session cookie."""
+    li_at = _li_at(cookies)
+    if not li_at or not li_at.get("value"):
+        return None
+    return {
+        "fingerprint": hashlib.sha256(li_at["value"].encode("utf-8")).hexdigest()[:16],
+        "expires": li_at.get("expires", -1),
+    }
+
+
+# --- Cache file ---
+
+def _load():
+    try:
+        with open(SESSION_CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save(data):
+    tmp = f"{SESSION_CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, SESSION_CACHE_PATH)
+    except Exception as e:
+        log(f"Could not save session cache: {e}")
+
+
+def record_verified(key, cookies):
+    """Note that the session behind these cookies just completed an authenticated navigation."""
+    info = cookie_info(cookies)
+    if not info:
+        return
+    with _lock:
+        data = _load()
+        data[key] = dict(info, verified_at=time.time())
+        _save(data)
+
+
+def invalidate(key):
+    with _lock:
+        data = _load()
+        if data.pop(key, None) is not None:
+            _save(data)
+
+
+def is_authenticated_url(url):
+    """True for a LinkedIn page reached while logged in, False for a login/auth wall, None otherwise."""
+    url = (url or "").lower()
+    if "linkedin.com" not in url:
+        return None
+    if "login" in url or "checkpoint" in url or "authwall" in url or "signup" in url:
+        return False
+    return True
+
+
+def note_navigation(key, page):
+    """Record (or invalidate) the session from where page ended up, e.g. at the end of a job."""
+    verdict = is_authenticated_url(page.url)
+    if verdict is True:
+        cookies = cookies_from_context(page.context)
+        if cookies:
+            record_verified(key, cookies)
+    elif verdict is False:
+        invalidate(key)
+    return verdict
+
+
+# --- Preflight ---
+
+def _light_check(context, cookies):
+    """True if one authenticated API call succeeds (anything else is left to the full check)."""
+    jsession = next((c.get("value", "") for c in cookies if c.get("name") == "JSESSIONID"), "")
+    try:
+        response = context.request.get(
+            LIGHT_CHECK_URL,
+            headers={"csrf-token": jsession.strip('"'), "accept": "application/json"},
+            max_redirects=0,
+            timeout=10000,
+        )
+    except Exception:
+        return False
+    return response.status == 200
+
+
+def preflight(key, cookies, context=None, now=None):
+    """
+    "expired" | "fresh" | "ok" | "check" for the session (see module docstring).
+    context enables the lightweight API check; without it a stale cache means "check".
+    cookies=None (couldn't be read) always means "check".
+    """
+    if cookies is None:
+        return "check"
+    now = now or time.time()
+    info = cookie_info(cookies)
+    if not info:
+        return "expired"
+    expires = info["expires"]
+    if expires not in (None, -1) and expires <= now:
+        return "expired"
+
+    entry = _load().get(key)
+    expiring = expires not in (None, -1) and expires - now < EXPIRY_MARGIN_SEC
+    if (entry and entry.get("fingerprint") == info["fingerprint"] and not expiring
+            and now - entry.get("verified_at", 0) < SESSION_CACHE_TTL_SEC):
+        return "fresh"
+
+    # A 401/403 here can also be a CSRF quirk, so only a success is trusted
+    if context is not None and _light_check(context, cookies):
+        record_verified(key, cookies)
+        return "ok"
+    return "check"
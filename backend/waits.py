@@ -0,0 +1,185 @@
+"""
+waits.py — Readiness waits and pacing for Playwright automation loops.
+
+Two kinds of "waiting" used to be the same random_sleep() call:
+- readiness: the DOM isn't there yet (profile top card, chat overlay,
+  send confirmation). Waiter waits on the concrete condition with a bounded
+  timeout and returns as soon as it holds.
+- pacing: deliberate delays that exist for account safety (reading a profile,
+  gaps between candidates, human breaks). Pacing keeps these explicit and
+  configurable (PACING_<NAME>="min,max" seconds, PACING_SCALE multiplier).
+
+StepTimer attributes wall time per step (navigate, status, open_chat, ...)
+to readiness waits, pacing, and the remainder (work), so slow steps can be
+told apart from slow pages. Given a SelectorRegistry, first_visible() also
+accepts a registry key and records which fallback matched.
+"""
+
+import os
+import random
+import time
+from contextlib import contextmanager
+
+DEFAULT_TIMEOUT_MS = 10000
+POLL_INTERVAL_SEC = 0.1
+
+PACING_DEFAULTS = {
+    "read_profile": (1, 2),        # After scrolling a profile, before acting on it
+    "before_click": (0.5, 1),
+    "before_typing": (0.5, 1),
+    "after_typing": (1, 2),
+    "retry_backoff": (4, 6),       # Before reloading a profile that didn't load
+    "between_candidates": (5, 12),
+    "dry_run": (2, 4),             # Between candidates when nothing is sent
+    "human_break": (30, 60),       # Every PACING_HUMAN_BREAK_EVERY candidates
+}
+PACING_HUMAN_BREAK_EVERY = int(os.environ.get("PACING_HUMAN_BREAK_EVERY", "5"))
+PACING_SCALE = float(os.environ.get("PACING_SCALE", "1"))
+
+
+def pacing_range(name):
+    """(min, max) seconds for a pacing delay, from PACING_<NAME> or the defaults."""
+    override = os.environ.get(f"PACING_{name.upper()}")
+    if override:
+        try:
+            low, high = (float(v) for v in override.split(","))
+            return low, high
+        except ValueError:
+            pass
+    return PACING_DEFAULTS.get(name, (0, 0))
+
+
+class StepTimer:
+    """Wall time per step, split into readiness waits, pacing and work."""
+
+    def __init__(self):
+        self.steps = {}
+        self.current = None
+        self._started = None
+
+    def _bucket(self, name):
+        return self.steps.setdefault(name, {"count": 0, "total_ms": 0, "wait_ms": 0, "pace_ms": 0})
+
+    def begin(self, name):
+        """End the running step (if any) and start timing the next one."""
+        self.end()
+        self.current = name
+        self._started = time.time()
+
+    def end(self):
+        if self.current is None:
+            return
+        bucket = self._bucket(self.current)
+        bucket["count"] += 1
+        bucket["total_ms"] += int((time.time() - self._started) * 1000)
+        self.current = None
+        self._started = None
+
+    def add(self, kind, ms):
+        """Attribute ms of 'wait_ms' or 'pace_ms' to the running step."""
+        self._bucket(self.current or "other")[kind] += int(ms)
+
+    @contextmanager
+    def measure(self, kind):
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.add(kind, (time.time() - t0) * 1000)
+
+    def summary(self):
+        steps = {}
+        totals = {"total_ms": 0, "wait_ms": 0, "pace_ms": 0, "work_ms": 0}
+        for name, b in self.steps.items():
+            work = max(b["total_ms"] - b["wait_ms"] - b["pace_ms"], 0)
+            steps[name] = dict(b, work_ms=work)
+            for key in ("total_ms", "wait_ms", "pace_ms"):
+                totals[key] += b[key]
+            totals["work_ms"] += work
+        return {"steps": steps, "totals": totals}
+
+
+class Waiter:
+    """Condition-based waits on one page, timed into a StepTimer."""
+
+    def __init__(self, page, timer=None, registry=None):
+        self.page = page
+        self.timer = timer or StepTimer()
+        self.registry = registry
+
+    def _locator(self, target, scope=None):
+        if isinstance(target, str):
+            return (scope or self.page).locator(target).first
+        return target
+
+    def until(self, predicate, timeout_ms=DEFAULT_TIMEOUT_MS):
+        """Poll predicate() until it returns something truthy; that value, or None on timeout."""
+        deadline = time.time() + timeout_ms / 1000
+        with self.timer.measure("wait_ms"):
+            while True:
+                try:
+                    value = predicate()
+                except Exception:
+                    value = None
+                if value or time.time() >= deadline:
+                    return value or None
+                time.sleep(POLL_INTERVAL_SEC)
+
+    def visible(self, target, timeout_ms=DEFAULT_TIMEOUT_MS, scope=None):
+        """Wait for a selector/locator to become visible. True if it did."""
+        return self.state(target, "visible", timeout_ms, scope)
+
+    def hidden(self, target, timeout_ms=DEFAULT_TIMEOUT_MS, scope=None):
+        return self.state(target, "hidden", timeout_ms, scope)
+
+    def state(self, target, state, timeout_ms=DEFAULT_TIMEOUT_MS, scope=None):
+        with self.timer.measure("wait_ms"):
+            try:
+                self._locator(target, scope).wait_for(state=state, timeout=timeout_ms)
+                return True
+            except Exception:
+                return False
+
+    def first_visible(self, selectors, timeout_ms=DEFAULT_TIMEOUT_MS, scope=None, stats_scope=None):
+        """
+        Wait until any of selectors is visible; (locator, selector) for the first in
+        priority order, or (None, None) on timeout. selectors may be a registry key,
+        in which case the chain comes from the registry and the match is recorded
+        (under stats_scope, e.g. "profile_card", when scope narrows the lookup).
+        """
+        key = selectors if isinstance(selectors, str) else None
+        if key is not None:
+            selectors = self.registry.candidates(key, scope=stats_scope)
+
+        def check():
+            for sel in selectors:
+                loc = self._locator(sel, scope)
+                if loc.is_visible():
+                    return loc, sel
+            return None
+
+        t0 = time.time()
+        found = self.until(check, timeout_ms) or (None, None)
+        if key is not None:
+            tried = selectors[:selectors.index(found[1])] if found[1] else selectors
+            self.registry.record(key, found[1], (time.time() - t0) * 1000, tried=tried, scope=stats_scope)
+        return found
+
+    def profile_ready(self, timeout_ms=DEFAULT_TIMEOUT_MS):
+        """Profile top card (name heading) mounted, or we landed on a login/error page."""
+        def check():
+            url = self.page.url.lower()
+            if "login" in url or "checkpoint" in url or "/404" in url or "/error/" in url:
+                return True
+            return self.page.locator("main section h1").first.is_visible()
+
+        return bool(self.until(check, timeout_ms))
+
+    def pace(self, name):
+        """Account-safety delay from the pacing config (not a readiness wait)."""
+        low, high = pacing_range(name)
+        seconds = random.uniform(low, high) * PACING_SCALE
+        if seconds > 0:
+            with self.timer.measure("pace_ms"):
+                time.sleep(seconds)
+        return seconds
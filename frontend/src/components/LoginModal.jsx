@@ -35,7 +35,7 @@ export function LoginModal({ isOpen, onClose }) {
                         setStatus('idle');
                         setTwoFactorCode('');
                     }, 2500);
-                } else if (newStatus === 'failed') {
+                } else if (newStatus === 'failed' || newStatus === 'dead_letter') {
                     setStatus('error');
                     setMessage(payload.new.error_message || 'Login failed on the Ghost Laptop.');
                 }
@@ -53,7 +53,7 @@ export function LoginModal({ isOpen, onClose }) {
         setMessage('Queuing login job for the Ghost Laptop...');
 
         try {
-            // Find an available ghost laptop for this org
+            // Make sure the org has a ghost laptop at all; the fleet picks which one runs the job
             const { data: devices } = await supabase
                 .from('devices')
                 .select('id')
@@ -64,12 +64,10 @@ export function LoginModal({ isOpen, onClose }) {
                 throw new Error("No ghost laptops are assigned to your organization. Check Settings.");
             }
 
-            const deviceId = devices[0].id;
-
-            // Insert login job matching the ghost engine's expected workflow
+            // Insert login job matching the ghost engine's expected workflow; the fleet assigns a live
+            // device, and later connect/message jobs follow the session to whichever device logged in
             const { data: job, error } = await supabase.from('job_runs').insert({
                 organization_id: profile.organization_id,
-                device_id: deviceId,
                 job_type: 'login',
                 payload: { email, password },
                 status: 'pending' // Ghost Engine will pick this up
@@ -191,12 +191,11 @@ export function Campaigns() {
     const queueJobForGhostLaptop = async (jobType) => {
         if (!selectedCampaign || !profile?.organization_id) return;
         try {
-            // Find an available ghost laptop for this org
+            // Make sure the org has a ghost laptop at all; the fleet picks which one runs the job
             const { data: devices } = await supabase
                 .from('devices')
                 .select('id')
                 .eq('organization_id', profile.organization_id)
-                .in('status', ['idle', 'offline', 'waiting_for_2fa']) // Could be offline but we'll queue it anyway
                 .limit(1);
 
             if (!devices || devices.length === 0) {
@@ -204,19 +203,19 @@ export function Campaigns() {
                 return false;
             }
 
-            const deviceId = devices[0].id;
-
-            // Insert into job queue
-            const { error } = await supabase.from('job_runs').insert({
+            // Insert into job queue without a device_id: assigned to the live device holding the
+            // LinkedIn session (or the least busy one) by the job_runs_assign trigger
+            const { data: job, error } = await supabase.from('job_runs').insert({
                 organization_id: profile.organization_id,
-                device_id: deviceId,
                 campaign_id: selectedCampaign.id,
                 job_type: jobType,
                 status: 'pending'
-            });
+            }).select('device_id').single();
 
             if (error) throw error;
-            toast.success(`Job queued for ghost device: ${deviceId}`);
+            toast.success(job.device_id
+                ? `Job queued for ghost device: ${job.device_id}`
+                : 'Job queued. It will start when a ghost laptop comes online.');
             return true;
 
         } catch (err) {
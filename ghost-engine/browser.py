@@ -0,0 +1,281 @@
+"""
+browser.py — Long-lived Chromium for Ghost worker jobs.
+
+BrowserManager keeps one persistent context (LinkedIn profile) warm between
+jobs instead of launching and closing Chromium for every run:
+- acquire_page() hands a fresh page to a job; release_page() closes it,
+- a health probe runs before each hand-out; a crashed/disconnected browser is
+  relaunched transparently,
+- the browser is recycled after BROWSER_MAX_JOBS jobs, BROWSER_MAX_AGE_SEC, or
+  when its process tree grows past BROWSER_MAX_RSS_MB (needs psutil),
+- verify_session() skips the feed-page login check when this browser verified
+  the session within SESSION_VERIFY_TTL_SEC, or when the shared preflight
+  (backend/session_cache.py: li_at expiry + last authenticated navigation,
+  then a lightweight API check) vouches for it,
+- heavy resources (images, media, fonts, trackers) are filtered per flow via
+  backend/resource_filter.py; goto() logs load time and bytes saved.
+
+Sync Playwright objects are bound to the thread that created them, so a
+manager must only be used from one thread — the worker gives each LinkedIn
+session its own single-thread lane (see runtime.py).
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import psutil
+except ImportError:  # Memory-based recycling is skipped without psutil
+    psutil = None
+
+from resource_filter import ResourceFilter, filter_enabled
+import session_cache
+
+BROWSER_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--no-sandbox',
+    '--window-size=1280,800'
+]
+BROWSER_MAX_JOBS = 50
+BROWSER_MAX_AGE_SEC = 6 * 3600
+BROWSER_MAX_RSS_MB = int(os.environ.get("BROWSER_MAX_RSS_MB", "1500"))
+SESSION_VERIFY_TTL_SEC = 600
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [browser] {msg}", flush=True)
+
+
+class SessionExpired(Exception):
+    pass
+
+
+class BrowserManager:
+    """One warm persistent context for one LinkedIn profile directory."""
+
+    def __init__(self, user_data_dir, headless=False, args=None):
+        self.user_data_dir = user_data_dir
+        self.headless = headless
+        self.args = args or BROWSER_ARGS
+        self.context = None
+        self._playwright = None
+        self._probe = None
+        self.started_at = None
+        self.jobs_served = 0
+        self.last_verified = 0
+        self.session_key = session_cache.session_key(user_data_dir)
+        self.network = ResourceFilter()
+        self.filter_resources = False
+
+    # --- Lifecycle ---
+
+    def _start(self):
+        from playwright.sync_api import sync_playwright
+
+        t0 = time.time()
+        os.makedirs(self.user_data_dir, exist_ok=True)
+        self._playwright = sync_playwright().start()
+        self.context = self._playwright.chromium.launch_persistent_context(
+            user_data_dir=self.user_data_dir,
+            headless=self.headless,
+            args=self.args
+        )
+        # Keep the initial tab open as a health probe (and so the window never closes between jobs)
+        self._probe = self.context.pages[0] if self.context.pages else self.context.new_page()
+        self.network.context = None  # Routes died with the old context
+        if self.filter_resources:
+            self.network.attach(self.context)
+        self.started_at = time.time()
+        self.jobs_served = 0
+        self.last_verified = 0
+        log(f"Browser started for {self.user_data_dir} in {time.time() - t0:.1f}s")
+
+    def close(self):
+        if self.context is not None:
+            try:
+                self.context.close()
+            except Exception:
+                pass
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+        self.context = None
+        self._playwright = None
+        self._probe = None
+
+    def restart(self, reason):
+        log(f"Restarting browser ({reason})")
+        self.close()
+        self._start()
+
+    # --- Health ---
+
+    def is_healthy(self):
+        if self.context is None or self._probe is None:
+            return False
+        try:
+            return self._probe.evaluate("1") == 1
+        except Exception:
+            return False
+
+    def _process_tree(self):
+        """This profile's Chromium browser process and its children ([] if unknown; needs psutil)."""
+        if psutil is None:
+            return []
+        marker = f"--user-data-dir={os.path.abspath(self.user_data_dir)}"
+        try:
+            for proc in psutil.Process().children(recursive=True):
+                try:
+                    if marker in " ".join(proc.cmdline()):
+                        return [proc] + proc.children(recursive=True)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+        except Exception:
+            pass
+        return []
+
+    def memory_mb(self):
+        """RSS of this profile's Chromium process tree, or None if unknown."""
+        tree = self._process_tree()
+        if not tree:
+            return None
+        try:
+            return sum(p.memory_info().rss for p in tree) / (1024 * 1024)
+        except Exception:
+            return None
+
+    def kill(self):
+        """
+        Kill this profile's Chromium from any thread, for when close() can't run
+        because the owning thread is stuck. Returns the number of processes killed.
+        """
+        if psutil is None:
+            log(f"psutil not installed; cannot kill the browser for {self.user_data_dir}")
+            return 0
+        killed = 0
+        for proc in self._process_tree():
+            try:
+                proc.kill()
+                killed += 1
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return killed
+
+    def _recycle_reason(self):
+        if self.context is None:
+            return "not started"
+        if not self.is_healthy():
+            return "browser not responding"
+        if self.jobs_served >= BROWSER_MAX_JOBS:
+            return f"served {self.jobs_served} jobs"
+        if time.time() - self.started_at > BROWSER_MAX_AGE_SEC:
+            return "max age reached"
+        rss = self.memory_mb()
+        if rss is not None and rss > BROWSER_MAX_RSS_MB:
+            return f"memory {rss:.0f}MB > {BROWSER_MAX_RSS_MB}MB"
+        return None
+
+    # --- Pages ---
+
+    def acquire_page(self):
+        """A fresh page on a healthy, warm context (relaunching first if needed)."""
+        reason = self._recycle_reason()
+        if reason == "not started":
+            self._start()
+        elif reason:
+            self.restart(reason)
+        try:
+            return self.context.new_page()
+        except Exception as e:
+            # Died between the probe and now
+            self.restart(f"new_page failed: {e}")
+            return self.context.new_page()
+
+    def release_page(self, page):
+        self.jobs_served += 1
+        try:
+            # Where the job left the page proves (or disproves) the session for the next preflight
+            verdict = session_cache.note_navigation(self.session_key, page)
+            if verdict is True:
+                self.mark_verified()
+            elif verdict is False:
+                self.last_verified = 0
+        except Exception:
+            pass
+        try:
+            page.close()
+        except Exception:
+            pass
+
+    def set_flow(self, flow):
+        """Switch resource filtering on/off for the next job's flow and reset its network stats."""
+        self.filter_resources = filter_enabled(flow)
+        self.network.reset()
+        if self.context is None:
+            return
+        if self.filter_resources:
+            self.network.attach(self.context)
+        else:
+            self.network.detach()
+
+    def goto(self, page, url, **kwargs):
+        return self.network.goto(page, url, **kwargs)
+
+    # --- Session ---
+
+    def mark_verified(self):
+        self.last_verified = time.time()
+
+    def invalidate_session(self):
+        self.last_verified = 0
+        session_cache.invalidate(self.session_key)
+
+    def verify_session(self, page):
+        """
+        Raise SessionExpired unless the LinkedIn session is logged in. Skipped within
+        SESSION_VERIFY_TTL_SEC of this browser's last check; otherwise the preflight
+        cache decides, and only an inconclusive preflight costs a full feed load.
+        """
+        if time.time() - self.last_verified < SESSION_VERIFY_TTL_SEC:
+            return
+        verdict = session_cache.preflight(
+            self.session_key, session_cache.cookies_from_context(self.context), context=self.context)
+        if verdict == "expired":
+            self.invalidate_session()
+            raise SessionExpired("No valid li_at cookie. Please run the login job again.")
+        if verdict in ("fresh", "ok"):
+            log(f"Session preflight: {verdict}, skipping feed check")
+            self.mark_verified()
+            return
+        page.goto("https://www.linkedin.com/feed/", timeout=30000, wait_until="domcontentloaded")
+        if "login" in page.url.lower():
+            self.invalidate_session()
+            raise SessionExpired("Session expired. Please run the login job again.")
+        self.mark_verified()
+        session_cache.record_verified(self.session_key, session_cache.cookies_from_context(self.context))
+
+
+@contextmanager
+def job_browser(ctx=None, user_data_dir="./linkedin_session", flow=None):
+    """
+    (manager, page) for one job: the worker's warm BrowserManager when run under
+    the scheduler, or a throwaway browser when a script is run standalone.
+    flow (default: the job type) selects resource filtering.
+    """
+    if ctx is not None and getattr(ctx, "browser", None) is not None:
+        manager, owned = ctx.browser, False
+    else:
+        manager, owned = BrowserManager(ctx.session_dir if ctx else user_data_dir), True
+    manager.set_flow(flow or (ctx.job_type if ctx else None))
+    page = manager.acquire_page()
+    try:
+        yield manager, page
+    finally:
+        manager.release_page(page)
+        if owned:
+            manager.close()
@@ -0,0 +1,86 @@
+"""
+checkpoint.py — Resumable progress for long connect/message jobs.
+
+A JobCheckpoint lives in job_runs.result["checkpoint"]:
+    {"cursor": <last candidate id>, "outcomes": {<candidate id>: <outcome>}, "updated_at": ...}
+
+Scripts record an outcome per candidate; outcomes are saved in batches
+(every CHECKPOINT_EVERY candidates or CHECKPOINT_MAX_AGE_SEC) instead of one
+write per candidate. When the same job row runs again (lease reaped after a
+crash, requeued on shutdown, retried) the checkpoint is loaded from the
+claimed row and already-handled candidates are skipped.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+
+CHECKPOINT_EVERY = 10
+CHECKPOINT_MAX_AGE_SEC = 60
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [checkpoint] {msg}", flush=True)
+
+
+class JobCheckpoint:
+    """Cursor + per-candidate outcomes for one job, flushed through save(data)."""
+
+    def __init__(self, job, save=None):
+        previous = (job.get("result") or {}).get("checkpoint") or {}
+        self.save = save
+        self.cursor = previous.get("cursor")
+        self.outcomes = dict(previous.get("outcomes") or {})
+        self.resumed = bool(self.outcomes)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._last_save = time.time()
+
+    def done(self, candidate_id):
+        """True if a previous attempt of this job already handled the candidate."""
+        with self._lock:
+            return str(candidate_id) in self.outcomes
+
+    def remaining(self, candidates):
+        """Drop candidates handled by an earlier attempt."""
+        todo = [c for c in candidates if not self.done(c.get("id"))]
+        if len(todo) < len(candidates):
+            log(f"Resuming from checkpoint: skipping {len(candidates) - len(todo)} already handled candidate(s)")
+        return todo
+
+    def record(self, candidate_id, outcome):
+        """Note a candidate's outcome; saves when the batch is full or old enough."""
+        with self._lock:
+            self.cursor = str(candidate_id)
+            self.outcomes[str(candidate_id)] = outcome
+            self._unsaved += 1
+            due = self._unsaved >= CHECKPOINT_EVERY or time.time() - self._last_save >= CHECKPOINT_MAX_AGE_SEC
+        if due:
+            self.flush()
+
+    def to_dict(self):
+        with self._lock:
+            counts = {}
+            for outcome in self.outcomes.values():
+                counts[outcome] = counts.get(outcome, 0) + 1
+            return {
+                "cursor": self.cursor,
+                "outcomes": dict(self.outcomes),
+                "counts": counts,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            }
+
+    def flush(self):
+        """Persist unsaved outcomes. A failed save is retried with the next batch."""
+        with self._lock:
+            if not self._unsaved or not self.save:
+                return
+            pending = self._unsaved
+        try:
+            self.save(self.to_dict())
+            with self._lock:
+                self._unsaved -= pending
+                self._last_save = time.time()
+        except Exception as e:
+            log(f"Failed to save checkpoint: {e}")
@@ -0,0 +1,262 @@
+"""
+dispatch.py — Push-based job notifications for the Ghost worker.
+
+Instead of querying job_runs every few seconds, the worker subscribes to
+changes on its own job_runs rows and sleeps until one arrives:
+
+- RealtimeSubscriber: Supabase Realtime postgres_changes on job_runs,
+  filtered to device_id (default).
+- PgNotifySubscriber: plain Postgres LISTEN/NOTIFY via DATABASE_URL. Same
+  semantics, used for local/test databases without Realtime (see the
+  notify_job_runs trigger in supabase_schema.sql).
+
+Both run on a background thread and publish every change to a JobEventBus.
+The bus wakes the main loop for new pending work and lets other code (e.g.
+the 2FA handoff) wait on a specific job row. When the subscription is down,
+wait_for_work() falls back to polling with adaptive backoff.
+"""
+
+import asyncio
+import json
+import os
+import select
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+DISPATCH_MODE = os.environ.get("DISPATCH_MODE", "realtime")  # realtime | pg | poll
+
+POLL_INTERVAL_MIN_SEC = 1      # Fallback polling starts here...
+POLL_INTERVAL_MAX_SEC = 30     # ...and backs off to here while idle
+SAFETY_POLL_SEC = 60           # Even with a healthy subscription, re-check this often
+RECONNECT_DELAY_SEC = 5
+SUBSCRIBE_TIMEOUT_SEC = 15
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [dispatch] {msg}", flush=True)
+
+
+class JobWatch:
+    """Signalled on every change to one job row; .record holds the latest pushed row."""
+
+    def __init__(self, job_id):
+        self.job_id = str(job_id)
+        self.record = None
+        self._changed = threading.Event()
+
+    def __call__(self, record):
+        if str(record.get("id")) == self.job_id:
+            self.record = record
+            self._changed.set()
+
+    def wait(self, timeout):
+        """True if the row changed since the last wait (consumes the signal)."""
+        changed = self._changed.wait(timeout)
+        self._changed.clear()
+        return changed
+
+
+class JobEventBus:
+    """Fan-out of job_runs change events to the main loop and to per-job waiters."""
+
+    def __init__(self):
+        self._work = threading.Event()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.connected = False
+
+    def publish(self, record):
+        """Called by subscribers with the new job_runs row."""
+        if not record:
+            return
+        if record.get("status") == "pending":
+            self._work.set()
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(record)
+            except Exception as e:
+                log(f"Listener error: {e}")
+
+    def add_listener(self, callback):
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    @contextmanager
+    def watch_job(self, job_id):
+        """Watch one job row for the duration of a with-block (e.g. waiting for a 2FA code)."""
+        watch = JobWatch(job_id)
+        self.add_listener(watch)
+        try:
+            yield watch
+        finally:
+            self.remove_listener(watch)
+
+    def wait_for_work(self, timeout):
+        """Block until a pending job is announced or the timeout passes. Returns True if woken by an event."""
+        woke = self._work.wait(timeout)
+        self._work.clear()
+        return woke
+
+    def wake(self):
+        self._work.set()
+
+
+class RealtimeSubscriber(threading.Thread):
+    """Supabase Realtime subscription to this device's job_runs rows (async client on its own loop)."""
+
+    def __init__(self, bus, url, key, device_id):
+        super().__init__(name="job-realtime", daemon=True)
+        self.bus = bus
+        self.url = url
+        self.key = key
+        self.device_id = device_id
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                asyncio.run(self._listen())
+            except Exception as e:
+                log(f"Realtime subscription error: {e}")
+            self.bus.connected = False
+            if not self._stop.is_set():
+                self._stop.wait(RECONNECT_DELAY_SEC)
+
+    async def _listen(self):
+        from supabase import acreate_client
+
+        client = await acreate_client(self.url, self.key)
+        channel = client.channel(f"job_runs:{self.device_id}")
+
+        def on_change(payload):
+            data = payload.get("data", payload) if isinstance(payload, dict) else {}
+            self.bus.publish(data.get("record") or data.get("new"))
+
+        def on_status(status, err=None):
+            state = str(getattr(status, "value", status)).upper()
+            self.bus.connected = state == "SUBSCRIBED"
+            log(f"Realtime channel {state}" + (f": {err}" if err else ""))
+            if self.bus.connected:
+                self.bus.wake()  # Catch anything inserted while we were disconnected
+
+        channel.on_postgres_changes("*", schema="public", table="job_runs",
+                                    filter=f"device_id=eq.{self.device_id}", callback=on_change)
+        await channel.subscribe(on_status)
+        deadline = time.time() + SUBSCRIBE_TIMEOUT_SEC
+        try:
+            while not self._stop.is_set():
+                await asyncio.sleep(1)
+                if self.bus.connected:
+                    deadline = None
+                elif deadline is None or time.time() > deadline:
+                    # Channel dropped (CLOSED/TIMED_OUT/CHANNEL_ERROR) or never came up: rebuild from scratch
+                    raise ConnectionError("realtime channel not subscribed")
+        finally:
+            try:
+                await client.remove_all_channels()
+            except Exception:
+                pass
+
+
+class PgNotifySubscriber(threading.Thread):
+    """LISTEN/NOTIFY stand-in for Realtime (psycopg2, DATABASE_URL)."""
+
+    def __init__(self, bus, dsn, device_id):
+        super().__init__(name="job-listen", daemon=True)
+        self.bus = bus
+        self.dsn = dsn
+        self.channel = f"job_runs:{device_id}"
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        import psycopg2
+
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self.channel}"')
+                self.bus.connected = True
+                self.bus.wake()
+                log(f"Listening on {self.channel}")
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0)[0]:
+                        conn.poll()
+                        while conn.notifies:
+                            note = conn.notifies.pop(0)
+                            try:
+                                self.bus.publish(json.loads(note.payload))
+                            except ValueError:
+                                self.bus.wake()
+            except Exception as e:
+                log(f"LISTEN connection error: {e}")
+            finally:
+                self.bus.connected = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            if not self._stop.is_set():
+                self._stop.wait(RECONNECT_DELAY_SEC)
+
+
+class Dispatcher:
+    """Owns the subscription and decides how long the idle main loop may sleep."""
+
+    def __init__(self, device_id, supabase_url=None, supabase_key=None, mode=None):
+        self.bus = JobEventBus()
+        self.mode = mode or DISPATCH_MODE
+        self._backoff = POLL_INTERVAL_MIN_SEC
+        self._subscriber = None
+        if self.mode == "realtime":
+            self._subscriber = RealtimeSubscriber(self.bus, supabase_url, supabase_key, device_id)
+        elif self.mode == "pg":
+            self._subscriber = PgNotifySubscriber(self.bus, os.environ.get("DATABASE_URL"), device_id)
+        elif self.mode != "poll":
+            raise ValueError(f"Unknown DISPATCH_MODE: {self.mode}")
+
+    def start(self):
+        if self._subscriber:
+            self._subscriber.start()
+        log(f"Dispatch mode: {self.mode}")
+
+    def stop(self):
+        if self._subscriber:
+            self._subscriber.stop()
+
+    def job_found(self):
+        """Reset fallback polling to its fastest rate after finding work."""
+        self._backoff = POLL_INTERVAL_MIN_SEC
+
+    def wait_for_work(self, max_wait=None):
+        """
+        Sleep until new work is announced. With a live subscription that is a long
+        safety-net wait; without one, adaptive-backoff polling.
+        """
+        if self.bus.connected:
+            timeout = SAFETY_POLL_SEC
+        else:
+            timeout = self._backoff
+            self._backoff = min(self._backoff * 2, POLL_INTERVAL_MAX_SEC)
+        if max_wait is not None:
+            timeout = min(timeout, max_wait)
+        return self.bus.wait_for_work(max(timeout, 0))
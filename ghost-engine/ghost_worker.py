@@ -1,6 +1,9 @@
 import os
+import sys
 import time
 import json
+import signal
+import threading
 import traceback
 import subprocess
 from dotenv import load_dotenv
@@ -8,6 +11,16 @@ from supabase import create_client, Client
 
 load_dotenv()
 
+# Shared storage layer lives in backend/ (repo is cloned whole onto Ghost laptops)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+from repository import SupabaseRepository
+from local_cache import CampaignCache
+from dispatch import Dispatcher
+from runtime import JobScheduler, JobCancelled, SHUTDOWN_GRACE_SEC
+from heartbeat import Heartbeat
+from retry import WorkerLost, classify_error, decide, error_context, policy_for
+from retention import maybe_enforce as enforce_retention
+
 # Environment constraints
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_KEY")
@@ -18,107 +31,220 @@ if not SUPABASE_URL or not SUPABASE_KEY or not DEVICE_ID:
     exit(1)
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Scripts read/write campaign rows through a local write-through mirror
+repo = CampaignCache(SupabaseRepository(supabase))
+# Wakes the main loop on job_runs inserts instead of polling (DISPATCH_MODE=realtime|pg|poll)
+dispatcher = Dispatcher(DEVICE_ID, SUPABASE_URL, SUPABASE_KEY)
 
 POLL_INTERVAL_SEC = 5
-HEARTBEAT_INTERVAL_SEC = 30
-last_heartbeat = 0
+LEASE_SECONDS = 120          # A claimed job is ours until this expires without a heartbeat
+REAP_INTERVAL_SEC = 60
+JOB_TYPES = ["login", "connect", "message"]
+last_reap = 0
+stop_requested = threading.Event()
+
+# Job ids this process currently holds a lease on
+held_jobs = set()
+held_jobs_lock = threading.Lock()
 
 
-def update_heartbeat(status="idle"):
-    """Update the devices table so the web app knows this Ghost Laptop is online."""
-    global last_heartbeat
+def reap_expired_leases():
+    """
+    Requeue jobs abandoned by crashed workers and hand jobs stuck on offline
+    devices to live ones (throttled; any worker in the fleet may do this).
+    """
+    global last_reap
     now = time.time()
-    if now - last_heartbeat > HEARTBEAT_INTERVAL_SEC:
-        try:
-            supabase.table("devices").upsert({
-                "id": DEVICE_ID,
-                "status": status,
-                "last_heartbeat": "now()"
-            }).execute()
-            last_heartbeat = now
-            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Heartbeat sent. Status: {status}")
-        except Exception as e:
-            print(f"Failed to send heartbeat: {e}")
+    if now - last_reap < REAP_INTERVAL_SEC:
+        return
+    last_reap = now
+    try:
+        moved = supabase.rpc("rebalance_job_runs", {}).execute().data
+        if moved:
+            print(f"Reassigned {moved} job(s) from offline devices")
+    except Exception as e:
+        print(f"Failed to rebalance job runs: {e}")
+
+
+def finish_job(job_id, fields):
+    """Write the final status, only if we still hold the lease, and release it."""
+    fields = dict(fields, lease_expires_at=None)
+    try:
+        response = supabase.table("job_runs").update(fields) \
+            .eq("id", job_id) \
+            .eq("claimed_by", DEVICE_ID) \
+            .in_("status", ["pending", "running", "waiting_for_2fa"]) \
+            .execute()
+        if not response.data:
+            print(f"WARNING: Run {job_id} was cancelled or reclaimed elsewhere; dropping our {fields.get('status')} result")
+    finally:
+        with held_jobs_lock:
+            held_jobs.discard(job_id)
 
 
-def fail_job(job_id, error_message):
+def fail_job(job, error, ctx=None):
+    """Retry with backoff, fail, or dead-letter a job that raised (see retry.py)."""
+    job_id = job.get("id")
+    attempt = job.get("attempts") or 1
+    classification = classify_error(error)
+    status, not_before = decide(job.get("job_type"), attempt, classification)
+    fields = {
+        "status": status,
+        "error_message": str(error),
+        "error_context": error_context(error, job, classification,
+                                       progress=ctx.progress.snapshot() if ctx else None,
+                                       checkpoint=ctx.checkpoint.to_dict() if ctx else None)
+    }
+    if status == "pending":
+        fields.update(not_before=not_before.isoformat(), claimed_by=None, claimed_at=None)
+        print(f"Run {job_id} failed ({classification}, attempt {attempt}); retrying after {not_before:%H:%M:%S} UTC")
+    else:
+        print(f"Run {job_id} failed ({classification}, attempt {attempt}) -> {status}")
     try:
-        supabase.table("job_runs").update({
-            "status": "failed",
-            "error_message": str(error_message)
-        }).eq("id", job_id).execute()
-        update_heartbeat("idle")
+        finish_job(job_id, fields)
     except Exception as e:
-        print(f"Failed to mark run {job_id} as failed: {e}")
+        print(f"Failed to mark run {job_id} as {status}: {e}")
 
 
 def success_job(job_id, result=None):
     try:
-        supabase.table("job_runs").update({
+        finish_job(job_id, {
             "status": "completed",
             "result": result or {}
-        }).eq("id", job_id).execute()
-        update_heartbeat("idle")
+        })
     except Exception as e:
         print(f"Failed to mark run {job_id} as completed: {e}")
 
 
-def execute_job(job):
+def requeue_job(job_id, attempts=None):
+    """
+    Hand an unfinished job back to the queue (graceful shutdown, or preempted by a
+    higher-priority job). Pass the claimed row's attempts so the interruption isn't counted.
+    """
+    fields = {
+        "status": "pending",
+        "claimed_by": None,
+        "claimed_at": None
+    }
+    if attempts:
+        fields["attempts"] = attempts - 1
+    try:
+        finish_job(job_id, fields)
+        print(f"Requeued run {job_id}")
+    except Exception as e:
+        print(f"Failed to requeue run {job_id}: {e}")
+
+
+def save_checkpoint(job_id, checkpoint):
+    """Batched checkpoint write into job_runs.result, only while we still hold the job."""
+    supabase.table("job_runs").update({"result": {"checkpoint": checkpoint}}) \
+        .eq("id", job_id) \
+        .eq("claimed_by", DEVICE_ID) \
+        .execute()
+
+
+def release_job(job_id):
+    """Forget a job we no longer own (cancelled by the user or lease lost) without touching its row."""
+    with held_jobs_lock:
+        held_jobs.discard(job_id)
+
+
+def execute_job(job, ctx):
     job_id = job.get("id")
     job_type = job.get("job_type")
     payload = job.get("payload", {})
     campaign_id = job.get("campaign_id")
     org_id = job.get("organization_id")
     
-    print(f"\n--- Starting Job: {job_id} ({job_type}) ---")
-    update_heartbeat("running")
-
-    # Mark job as running
-    supabase.table("job_runs").update({"status": "running"}).eq("id", job_id).execute()
+    print(f"\n--- Starting Job: {job_id} ({job_type}, session {ctx.session}) ---")
+    ctx.checkpoint.save = lambda checkpoint: save_checkpoint(job_id, checkpoint)
+    ctx.events = dispatcher.bus
 
     try:
+        ctx.check_cancelled()
+        if (job.get("attempts") or 0) > policy_for(job_type)["max_attempts"]:
+            # Earlier attempts died with the worker (lease reaped) and never reported an error
+            raise WorkerLost(f"Exceeded {policy_for(job_type)['max_attempts']} attempts without completing")
         if job_type == "login":
             print("Executing login workflow...")
             import scripts.login
-            # Login script handles the 2FA state machine via the Supabase client
-            result = scripts.login.run(supabase, DEVICE_ID, job_id, payload)
-            success_job(job_id, result)
+            # Login script handles the 2FA state machine via the Supabase client (woken by ctx.events)
+            result = scripts.login.run(supabase, DEVICE_ID, job_id, payload, ctx=ctx)
             
         elif job_type == "connect":
             print(f"Executing connection workflow for campaign: {campaign_id}")
             import scripts.connect
-            result = scripts.connect.run(supabase, DEVICE_ID, job_id, campaign_id, org_id)
-            success_job(job_id, result)
+            result = scripts.connect.run(repo, DEVICE_ID, job_id, campaign_id, org_id, ctx=ctx)
             
         elif job_type == "message":
             print(f"Executing message workflow for campaign: {campaign_id}")
             import scripts.message
-            result = scripts.message.run(supabase, DEVICE_ID, job_id, campaign_id)
-            success_job(job_id, result)
+            result = scripts.message.run(repo, DEVICE_ID, job_id, campaign_id, org_id, ctx=ctx)
             
         else:
             raise ValueError(f"Unknown job_type: {job_type}")
 
+        if ctx.checkpoint.outcomes:
+            result = dict(result or {}, checkpoint=ctx.checkpoint.to_dict())
+        success_job(job_id, result)
+
+    except JobCancelled as e:
+        print(f"JOB STOPPED: {e}")
+        ctx.checkpoint.flush()  # A requeued/retried run resumes from here
+        if e.reason in ("shutdown", "preempted"):
+            requeue_job(job_id, job.get("attempts"))
+        else:
+            release_job(job_id)
     except Exception as e:
         print("JOB FAILED:")
         traceback.print_exc()
-        fail_job(job_id, str(e))
+        ctx.checkpoint.flush()
+        fail_job(job, e, ctx)
+    finally:
+        # Push queued status changes before reporting idle; leftovers retry from the main loop
+        repo.drain(timeout_sec=30)
         
     print(f"--- Finished Job: {job_id} ---\n")
 
 
-def check_for_jobs():
+scheduler = JobScheduler(execute_job, on_done=lambda ctx: dispatcher.bus.wake())
+
+
+def on_job_change(record):
+    """Realtime/NOTIFY listener: stop jobs that were cancelled from the web app."""
+    if record.get("status") == "cancelled":
+        scheduler.cancel(record.get("id"), "cancelled")
+
+
+def leased_jobs():
+    """Jobs to report/renew on each heartbeat: running jobs whose result is not yet written."""
+    with held_jobs_lock:
+        held = set(held_jobs)
+    return [(ctx.job_id, ctx.job_type, ctx.progress) for ctx in scheduler.active_jobs() if ctx.job_id in held]
+
+
+# Device liveness, job progress and lease renewal in one write per interval, off the job threads
+heartbeat = Heartbeat(supabase, DEVICE_ID, leased_jobs, LEASE_SECONDS,
+                      on_lease_lost=lambda job_id: scheduler.cancel(job_id, "lease_lost"))
+
+
+def check_for_jobs(job_types=None, session_floors=None):
+    """
+    Atomically claim the next pending job of the given types (status -> running, leased to this device).
+    session_floors: {session: priority} of busy sessions; their jobs are skipped unless more urgent.
+    """
     try:
-        response = supabase.table("job_runs") \
-            .select("*") \
-            .eq("device_id", DEVICE_ID) \
-            .eq("status", "pending") \
-            .order("created_at") \
-            .limit(1) \
-            .execute()
+        response = supabase.rpc("claim_job_run", {
+            "p_device_id": DEVICE_ID,
+            "p_lease_seconds": LEASE_SECONDS,
+            "p_job_types": job_types,
+            "p_session_floors": session_floors or None
+        }).execute()
             
         jobs = response.data
         if jobs and len(jobs) > 0:
+            with held_jobs_lock:
+                held_jobs.add(jobs[0]["id"])
             return jobs[0]
             
     except Exception as e:
@@ -126,29 +252,50 @@ def check_for_jobs():
     return None
 
 
+def shutdown():
+    print("\nShutting down Ghost Worker...")
+    # Heartbeats keep running (and renewing leases) while in-flight jobs finish
+    leftover = scheduler.shutdown(SHUTDOWN_GRACE_SEC)
+    for ctx in leftover:
+        # Thread did not unwind in time; make sure another worker can pick the job up
+        requeue_job(ctx.job_id)
+    heartbeat.stop()
+    dispatcher.stop()
+    repo.drain(timeout_sec=30)
+    heartbeat.beat("offline")
+
+
 def main_loop():
-    print(f"Starting ScaleOtter Ghost Worker. ID: {DEVICE_ID}", flush=True)
-    update_heartbeat("idle")
+    print(f"Starting ScaleOtter Ghost Worker. ID: {DEVICE_ID} ({scheduler.max_slots} slots)", flush=True)
+    heartbeat.start()
+    dispatcher.bus.add_listener(on_job_change)
+    dispatcher.start()
+    signal.signal(signal.SIGTERM, lambda *_: stop_requested.set() or dispatcher.bus.wake())
     
-    while True:
+    while not stop_requested.is_set():
         try:
-            job = check_for_jobs()
+            job_types = scheduler.claimable_types(JOB_TYPES)
+            job = check_for_jobs(job_types, scheduler.session_floors()) if job_types else None
             
             if job:
-                execute_job(job)
-            else:
-                update_heartbeat("idle")
+                dispatcher.job_found()
+                scheduler.submit(job)
+                continue  # Fill free slots before sleeping again
                 
-            time.sleep(POLL_INTERVAL_SEC)
+            reap_expired_leases()
+            repo.flush()  # Retry anything queued while Supabase was unreachable
+            enforce_retention(background=True)  # Bound local screenshots/snapshots/logs (at most hourly, off this loop)
+            # Sleep until a job_runs notification / finished job arrives (or the fallback poll is due)
+            dispatcher.wait_for_work(max_wait=REAP_INTERVAL_SEC)
             
         except KeyboardInterrupt:
-            print("\nShutting down Ghost Worker...")
-            update_heartbeat("offline")
             break
         except Exception as e:
             print(f"Worker loop error: {e}")
             time.sleep(POLL_INTERVAL_SEC)
 
+    shutdown()
+
 
 if __name__ == "__main__":
     main_loop()
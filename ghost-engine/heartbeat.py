@@ -0,0 +1,119 @@
+"""
+heartbeat.py — Background heartbeat with live job progress.
+
+A daemon thread reports once per interval, independent of what the jobs are
+doing. Each beat is a single report_heartbeat() RPC (see supabase_schema.sql)
+that in one round trip:
+- refreshes devices.last_heartbeat / status / active_jobs,
+- writes job_runs.progress for every running job,
+- renews the leases on those jobs.
+
+Jobs publish progress through a ProgressTracker (ctx.progress); updates are
+only kept in memory and coalesced into the next beat, so scripts can call
+update() per candidate for free.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+
+HEARTBEAT_INTERVAL_SEC = 30
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [heartbeat] {msg}", flush=True)
+
+
+class ProgressTracker:
+    """Thread-safe progress counters for one job."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.stage = None
+        self.total = None
+        self.processed = 0
+        self.last_candidate = None
+        self.updated_at = None
+
+    def update(self, processed=None, total=None, last_candidate=None, stage=None):
+        with self._lock:
+            if processed is not None:
+                self.processed = processed
+            if total is not None:
+                self.total = total
+            if last_candidate is not None:
+                self.last_candidate = last_candidate
+            if stage is not None:
+                self.stage = stage
+            self.updated_at = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.time() - self.started_at
+            rate = self.processed / (elapsed / 60) if elapsed >= 10 else 0  # Too noisy before that
+            return {
+                "stage": self.stage,
+                "processed": self.processed,
+                "total": self.total,
+                "last_candidate": self.last_candidate,
+                "rate_per_min": round(rate, 2),
+                "elapsed_sec": int(elapsed),
+                "updated_at": datetime.fromtimestamp(self.updated_at or self.started_at, timezone.utc).isoformat(),
+            }
+
+
+class Heartbeat(threading.Thread):
+    """
+    Reports device liveness + job progress every interval.
+    get_jobs() returns [(job_id, job_type, ProgressTracker)] for jobs we hold a lease on;
+    on_lease_lost(job_id) is called for jobs the server no longer lets us renew.
+    """
+
+    def __init__(self, supabase, device_id, get_jobs, lease_seconds, on_lease_lost=None,
+                 interval=HEARTBEAT_INTERVAL_SEC):
+        super().__init__(name="heartbeat", daemon=True)
+        self.supabase = supabase
+        self.device_id = device_id
+        self.get_jobs = get_jobs
+        self.lease_seconds = lease_seconds
+        self.on_lease_lost = on_lease_lost
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        while True:
+            self.beat()
+            if self._stop.wait(self.interval):
+                break
+
+    def beat(self, status=None):
+        """Send one batched heartbeat. Returns True if it reached the server."""
+        jobs = self.get_jobs()
+        payload = [{"id": job_id, "job_type": job_type, "progress": tracker.snapshot()}
+                   for job_id, job_type, tracker in jobs]
+        status = status or ("running" if jobs else "idle")
+        try:
+            response = self.supabase.rpc("report_heartbeat", {
+                "p_device_id": self.device_id,
+                "p_status": status,
+                "p_jobs": payload,
+                "p_lease_seconds": self.lease_seconds
+            }).execute()
+        except Exception as e:
+            log(f"Failed to send heartbeat: {e}")
+            return False
+
+        renewed = {str(job_id) for job_id in (response.data or [])}
+        for job in payload:
+            if str(job["id"]) not in renewed:
+                log(f"WARNING: Lost lease on job {job['id']} (cancelled, reaped or reassigned)")
+                if self.on_lease_lost:
+                    self.on_lease_lost(job["id"])
+        log(f"Status: {status}, {len(payload)} job(s)" +
+            "".join(f" | {j['job_type']} {j['progress']['processed']}/{j['progress']['total'] or '?'}" for j in payload))
+        return True
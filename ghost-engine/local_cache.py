@@ -0,0 +1,428 @@
+"""
+local_cache.py — Write-through SQLite mirror of campaign candidates on a Ghost laptop.
+
+Automation scripts read and write through CampaignCache exactly like any other
+repository (see backend/repository.py):
+- Reads are served from the local mirror, which is synced incrementally from
+  the remote store by (updated_at, id) (only rows changed since the last sync
+  are fetched). Every RECONCILE_EVERY_SEC a full pass re-reads the campaign and
+  drops rows deleted remotely.
+- Writes are applied to the mirror immediately and queued in an outbox that is
+  pushed to the remote store in batches, retrying with exponential backoff.
+  A candidate's writes are delivered in order: while an older write is backing
+  off, newer ones for the same candidate wait behind it.
+
+A slow or briefly unreachable Supabase therefore never stalls a run; queued
+changes drain on the next successful flush.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from repository import CampaignRepository, WRITABLE_FIELDS
+
+CACHE_PATH = os.environ.get("GHOST_CACHE_PATH",
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), "ghost_cache.db"))
+
+FLUSH_BATCH_SIZE = 50        # Outbox rows pushed per flush
+FLUSH_EVERY_WRITES = 10      # Opportunistic flush after this many queued writes...
+FLUSH_EVERY_SEC = 15         # ...or when the oldest queued write is this old
+RETRY_BASE_SEC = 2
+RETRY_MAX_SEC = 300
+RECONCILE_EVERY_SEC = int(os.environ.get("GHOST_CACHE_RECONCILE_SEC", "600"))  # Full re-read of a campaign
+ACTIVITY_SNAPSHOT_TTL_SEC = 300  # How long a remote daily-count snapshot is trusted
+
+_CANDIDATE_COLUMNS = ("id", "campaign_id", "organization_id", "name", "linkedin_url", "campaign_status",
+                      "connection_note", "initial_message", "message_status", "updated_at", "data")
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [cache] {msg}", flush=True)
+
+
+class CampaignCache(CampaignRepository):
+    """Repository that mirrors a remote repository locally and writes back through an outbox."""
+
+    def __init__(self, remote, db_path=None):
+        self.remote = remote
+        self.db_path = db_path or CACHE_PATH
+        self._writes_since_flush = 0
+        self._flush_lock = threading.Lock()  # Concurrent jobs share one cache; deliver each outbox row once
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS candidates (
+                id TEXT PRIMARY KEY,
+                campaign_id TEXT,
+                organization_id TEXT,
+                name TEXT,
+                linkedin_url TEXT,
+                campaign_status TEXT,
+                connection_note TEXT,
+                initial_message TEXT,
+                message_status TEXT,
+                updated_at TEXT,
+                data TEXT
+            )
+        ''')
+        c.execute("CREATE INDEX IF NOT EXISTS candidates_campaign_status_idx ON candidates (campaign_id, campaign_status)")
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                campaign_id TEXT PRIMARY KEY,
+                high_watermark TEXT,
+                high_watermark_id TEXT,
+                last_synced_at REAL,
+                last_reconciled_at REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        columns = {r["name"] for r in c.execute("PRAGMA table_info(sync_state)")}
+        if "high_watermark_id" not in columns:
+            c.execute("ALTER TABLE sync_state ADD COLUMN high_watermark_id TEXT")
+        if "last_reconciled_at" not in columns:
+            c.execute("ALTER TABLE sync_state ADD COLUMN last_reconciled_at REAL NOT NULL DEFAULT 0")
+        # kind: 'candidate' (payload = {candidate_id, fields}) or 'activity' (payload = record_activity kwargs)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                campaign_id TEXT,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS activity_counts (
+                account_id TEXT NOT NULL,
+                action TEXT NOT NULL,
+                day TEXT NOT NULL,
+                remote_count INTEGER NOT NULL DEFAULT 0,
+                local_count INTEGER NOT NULL DEFAULT 0,
+                fetched_at REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (account_id, action, day)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    # -----------------------------------------------------------------
+    # Sync (remote -> local)
+    # -----------------------------------------------------------------
+
+    def sync(self, campaign_id, full=False):
+        """
+        Pull rows changed since the last sync (updated_at >= watermark; rows at the
+        watermark already seen are skipped by id). A full sync, forced or due every
+        RECONCILE_EVERY_SEC, re-reads the whole campaign and deletes rows missing remotely.
+        Returns the number of rows refreshed, or None if offline.
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM sync_state WHERE campaign_id = ?", (campaign_id,)).fetchone()
+        finally:
+            conn.close()
+        watermark = row["high_watermark"] if row else None
+        watermark_id = (row["high_watermark_id"] if row else None) or ""
+        full = full or not row or time.time() - row["last_reconciled_at"] >= RECONCILE_EVERY_SEC
+
+        try:
+            rows = self.remote.get_campaign_candidates(campaign_id, updated_since=None if full else watermark)
+        except Exception as e:
+            log(f"Sync for campaign {campaign_id} failed, serving cached rows: {e}")
+            return None
+
+        conn = self._connect()
+        try:
+            # Rows with queued local writes keep their local state until the outbox drains
+            dirty = {json.loads(r["payload"])["candidate_id"] for r in conn.execute(
+                "SELECT payload FROM outbox WHERE kind = 'candidate' AND campaign_id = ?", (campaign_id,))}
+            refreshed = 0
+            for cand in rows:
+                if cand["id"] in dirty:
+                    continue
+                if not full and watermark and (cand.get("updated_at") or "", cand["id"]) <= (watermark, watermark_id):
+                    continue  # Boundary row already applied by the previous sync
+                values = [cand.get(k) for k in _CANDIDATE_COLUMNS]
+                values[-1] = json.dumps(cand.get("data") or {})
+                conn.execute(
+                    f"INSERT OR REPLACE INTO candidates ({', '.join(_CANDIDATE_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(_CANDIDATE_COLUMNS))})", values)
+                refreshed += 1
+            removed = 0
+            if full:
+                # Candidates deleted remotely must not stay contactable from the mirror
+                remote_ids = {c["id"] for c in rows}
+                stale = [r["id"] for r in conn.execute("SELECT id FROM candidates WHERE campaign_id = ?", (campaign_id,))
+                         if r["id"] not in remote_ids]
+                conn.executemany("DELETE FROM candidates WHERE id = ?", [(cid,) for cid in stale])
+                removed = len(stale)
+            new_watermark, new_watermark_id = max([(watermark or "", watermark_id)] +
+                                                  [(c.get("updated_at") or "", c["id"]) for c in rows])
+            now = time.time()
+            conn.execute('''
+                INSERT INTO sync_state (campaign_id, high_watermark, high_watermark_id, last_synced_at, last_reconciled_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (campaign_id) DO UPDATE SET
+                    high_watermark = excluded.high_watermark, high_watermark_id = excluded.high_watermark_id,
+                    last_synced_at = excluded.last_synced_at,
+                    last_reconciled_at = CASE WHEN ? THEN excluded.last_reconciled_at ELSE sync_state.last_reconciled_at END
+            ''', (campaign_id, new_watermark or None, new_watermark_id or None, now, now if full else 0, full))
+            conn.commit()
+        finally:
+            conn.close()
+        if refreshed or removed:
+            log(f"Synced {refreshed} changed rows for campaign {campaign_id}"
+                + (f", removed {removed} deleted remotely" if removed else "") + (" (full)" if full else ""))
+        return refreshed
+
+    # -----------------------------------------------------------------
+    # Repository interface
+    # -----------------------------------------------------------------
+
+    @staticmethod
+    def _to_row(row):
+        cand = dict(row)
+        try:
+            cand["data"] = json.loads(cand.get("data") or "{}")
+        except ValueError:
+            cand["data"] = {}
+        return cand
+
+    def get_campaign_candidates(self, campaign_id, statuses=None, updated_since=None):
+        self.sync(campaign_id)
+        sql = "SELECT * FROM candidates WHERE campaign_id = ?"
+        params = [campaign_id]
+        if statuses:
+            sql += f" AND campaign_status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        if updated_since:
+            sql += " AND updated_at >= ?"
+            params.append(updated_since)
+        sql += " ORDER BY updated_at, id"
+        conn = self._connect()
+        try:
+            return [self._to_row(r) for r in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+
+    def iter_candidates(self, campaign_id=None, batch_size=500):
+        return self.remote.iter_candidates(campaign_id, batch_size)
+
+    def update_candidates(self, campaign_id, updates):
+        if not updates:
+            return 0
+        now = time.time()
+        local_ts = datetime.now(timezone.utc).isoformat()
+        conn = self._connect()
+        try:
+            for cid, fields in updates:
+                unknown = set(fields) - set(WRITABLE_FIELDS)
+                if unknown:
+                    raise ValueError(f"Unsupported candidate fields: {sorted(unknown)}")
+                assignments = ", ".join(f"{k} = ?" for k in fields)
+                conn.execute(f"UPDATE candidates SET {assignments}, updated_at = ? WHERE id = ?",
+                             list(fields.values()) + [local_ts, cid])
+                conn.execute("INSERT INTO outbox (kind, campaign_id, payload, created_at) VALUES ('candidate', ?, ?, ?)",
+                             (campaign_id, json.dumps({"candidate_id": cid, "fields": fields}), now))
+            conn.commit()
+        finally:
+            conn.close()
+        self._writes_since_flush += len(updates)
+        self._maybe_flush()
+        return len(updates)
+
+    def get_campaign_stats(self, campaign_id):
+        return self.remote.get_campaign_stats(campaign_id)
+
+    def record_activity(self, action, account_id, campaign_id=None, candidate_id=None, organization_id=None):
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        payload = {"action": action, "account_id": account_id, "campaign_id": campaign_id,
+                   "candidate_id": candidate_id, "organization_id": organization_id}
+        conn = self._connect()
+        try:
+            conn.execute("INSERT INTO outbox (kind, campaign_id, payload, created_at) VALUES ('activity', ?, ?, ?)",
+                         (campaign_id, json.dumps(payload), time.time()))
+            conn.execute("INSERT OR IGNORE INTO activity_counts (account_id, action, day) VALUES (?, ?, ?)",
+                         (account_id, action, day))
+            conn.execute("UPDATE activity_counts SET local_count = local_count + 1 WHERE account_id = ? AND action = ? AND day = ?",
+                         (account_id, action, day))
+            conn.commit()
+        finally:
+            conn.close()
+        self._writes_since_flush += 1
+        self._maybe_flush()
+
+    def get_daily_activity_count(self, action, account_id, day=None):
+        """Remote snapshot (refreshed every few minutes) plus actions recorded locally since then."""
+        day = day or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM activity_counts WHERE account_id = ? AND action = ? AND day = ?",
+                               (account_id, action, day)).fetchone()
+        finally:
+            conn.close()
+        if row and time.time() - row["fetched_at"] < ACTIVITY_SNAPSHOT_TTL_SEC:
+            return row["remote_count"] + row["local_count"]
+
+        # Refresh the snapshot once our own queued actions have reached the remote ledger
+        self.flush()
+        if self.pending_count(kind="activity") == 0:
+            try:
+                remote_count = self.remote.get_daily_activity_count(action, account_id, day)
+                conn = self._connect()
+                try:
+                    conn.execute('''
+                        INSERT INTO activity_counts (account_id, action, day, remote_count, local_count, fetched_at)
+                        VALUES (?, ?, ?, ?, 0, ?)
+                        ON CONFLICT (account_id, action, day) DO UPDATE SET
+                            remote_count = excluded.remote_count, local_count = 0, fetched_at = excluded.fetched_at
+                    ''', (account_id, action, day, remote_count, time.time()))
+                    conn.commit()
+                finally:
+                    conn.close()
+                return remote_count
+            except Exception as e:
+                log(f"Could not refresh daily activity count, using local count: {e}")
+        return (row["remote_count"] + row["local_count"]) if row else 0
+
+    def get_activity_summary(self, action, account_id):
+        return self.remote.get_activity_summary(action, account_id)
+
+    def iter_activity_events(self, batch_size=1000):
+        return self.remote.iter_activity_events(batch_size)
+
+    # -----------------------------------------------------------------
+    # Outbox (local -> remote)
+    # -----------------------------------------------------------------
+
+    def pending_count(self, kind=None):
+        conn = self._connect()
+        try:
+            if kind:
+                return conn.execute("SELECT count(*) FROM outbox WHERE kind = ?", (kind,)).fetchone()[0]
+            return conn.execute("SELECT count(*) FROM outbox").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _maybe_flush(self):
+        if self._writes_since_flush >= FLUSH_EVERY_WRITES:
+            self.flush()
+            return
+        conn = self._connect()
+        try:
+            oldest = conn.execute("SELECT min(created_at) FROM outbox").fetchone()[0]
+        finally:
+            conn.close()
+        if oldest and time.time() - oldest >= FLUSH_EVERY_SEC:
+            self.flush()
+
+    def flush(self):
+        """
+        Push due outbox rows to the remote store. Candidate writes are coalesced
+        per candidate and sent as one batched update per campaign. Failed rows
+        are rescheduled with exponential backoff; nothing is dropped. A candidate
+        whose oldest queued write is backing off is skipped entirely, so an older
+        write can never land after (and overwrite) a newer one.
+        Returns the number of outbox rows delivered.
+        """
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        self._writes_since_flush = 0
+        now = time.time()
+        conn = self._connect()
+        try:
+            candidate_rows = conn.execute("SELECT * FROM outbox WHERE kind = 'candidate' ORDER BY id").fetchall()
+            activity_rows = conn.execute("SELECT * FROM outbox WHERE kind = 'activity' AND next_attempt_at <= ? "
+                                         "ORDER BY id LIMIT ?", (now, FLUSH_BATCH_SIZE)).fetchall()
+        finally:
+            conn.close()
+
+        # Per candidate, take rows in id order up to the first one not yet due
+        due, blocked = [], set()
+        for row in candidate_rows:
+            if len(due) >= FLUSH_BATCH_SIZE:
+                break
+            cid = json.loads(row["payload"])["candidate_id"]
+            if cid in blocked:
+                continue
+            if row["next_attempt_at"] > now:
+                blocked.add(cid)
+                continue
+            due.append(row)
+        due.extend(activity_rows)
+        if not due:
+            return 0
+
+        delivered, failed = [], []
+
+        # Candidate writes: merge fields per candidate (later writes win), one batch per campaign
+        by_campaign = {}
+        for row in due:
+            if row["kind"] != "candidate":
+                continue
+            payload = json.loads(row["payload"])
+            merged = by_campaign.setdefault(row["campaign_id"], {})
+            entry = merged.setdefault(payload["candidate_id"], {"fields": {}, "rows": []})
+            entry["fields"].update(payload["fields"])
+            entry["rows"].append(row)
+        for campaign_id, merged in by_campaign.items():
+            rows = [r for entry in merged.values() for r in entry["rows"]]
+            try:
+                self.remote.update_candidates(campaign_id, [(cid, e["fields"]) for cid, e in merged.items()])
+                delivered.extend(rows)
+            except Exception as e:
+                failed.extend((r, str(e)) for r in rows)
+
+        for row in due:
+            if row["kind"] != "activity":
+                continue
+            try:
+                self.remote.record_activity(**json.loads(row["payload"]))
+                delivered.append(row)
+            except Exception as e:
+                failed.append((row, str(e)))
+
+        conn = self._connect()
+        try:
+            conn.executemany("DELETE FROM outbox WHERE id = ?", [(r["id"],) for r in delivered])
+            for row, error in failed:
+                delay = min(RETRY_BASE_SEC * (2 ** row["attempts"]), RETRY_MAX_SEC)
+                conn.execute("UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                             (now + delay, error, row["id"]))
+            conn.commit()
+        finally:
+            conn.close()
+
+        if failed:
+            log(f"Outbox flush: {len(delivered)} delivered, {len(failed)} will retry ({failed[0][1]})")
+        return len(delivered)
+
+    def drain(self, timeout_sec=60):
+        """Flush repeatedly until the outbox is empty or the timeout passes. Returns rows still queued."""
+        deadline = time.time() + timeout_sec
+        while time.time() < deadline:
+            self.flush()
+            remaining = self.pending_count()
+            if remaining == 0:
+                return 0
+            time.sleep(min(RETRY_BASE_SEC, max(0, deadline - time.time())))
+        remaining = self.pending_count()
+        log(f"{remaining} outbox rows still queued; they will be retried on the next flush.")
+        return remaining
@@ -0,0 +1,91 @@
+"""
+retry.py — Retry policy and error classification for failed job runs.
+
+When a job raises, the worker classifies the error:
+- transient (timeouts, network/Supabase blips, browser crashes) and unknown
+  errors are retried with exponential backoff + jitter via job_runs.not_before,
+  up to the job type's max_attempts,
+- permanent errors (bad payload, expired LinkedIn session, unknown job type)
+  fail immediately — retrying can't help,
+- a job that keeps failing past max_attempts goes to 'dead_letter' with the
+  captured error context, so poison jobs are separated from flaky ones.
+"""
+
+import random
+import traceback
+from datetime import datetime, timedelta, timezone
+
+RETRY_POLICIES = {
+    # Login is interactive (the user is watching the modal): one retry at most, quickly
+    "login": {"max_attempts": 2, "base_delay_sec": 15, "max_delay_sec": 60},
+    "connect": {"max_attempts": 5, "base_delay_sec": 60, "max_delay_sec": 3600},
+    "message": {"max_attempts": 5, "base_delay_sec": 60, "max_delay_sec": 3600},
+}
+DEFAULT_POLICY = {"max_attempts": 3, "base_delay_sec": 60, "max_delay_sec": 3600}
+
+TRANSIENT_MARKERS = (
+    "timeout", "timed out", "net::err_", "connection reset", "connection refused", "connection aborted",
+    "temporarily unavailable", "target closed", "browser has been closed", "target page, context or browser",
+    "bad gateway", "service unavailable", "gateway timeout", "too many requests", "server disconnected",
+)
+PERMANENT_MARKERS = (
+    "session expired", "missing email or password", "unknown job_type", "login failed",
+)
+PERMANENT_TYPES = ("ValueError", "KeyError", "TypeError", "SessionExpired")
+
+
+class WorkerLost(Exception):
+    """A job whose earlier attempts were abandoned (worker crash / lease reaped) too many times."""
+
+
+def policy_for(job_type):
+    return RETRY_POLICIES.get(job_type, DEFAULT_POLICY)
+
+
+def classify_error(exc):
+    """'transient', 'permanent' or 'unknown' (unknown errors are retried like transient ones)."""
+    text = f"{type(exc).__name__}: {exc}".lower()
+    if any(marker in text for marker in PERMANENT_MARKERS):
+        return "permanent"
+    if type(exc).__name__ in PERMANENT_TYPES:
+        return "permanent"
+    if isinstance(exc, (ConnectionError, TimeoutError, OSError)) or type(exc).__name__ == "TimeoutError":
+        return "transient"
+    if any(marker in text for marker in TRANSIENT_MARKERS):
+        return "transient"
+    return "unknown"
+
+
+def backoff_delay(job_type, attempt):
+    """Seconds to wait before attempt+1: exponential in the attempt number, with full jitter on the upper half."""
+    policy = policy_for(job_type)
+    delay = min(policy["base_delay_sec"] * (2 ** max(attempt - 1, 0)), policy["max_delay_sec"])
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def decide(job_type, attempt, classification):
+    """
+    What to do with a failed attempt. Returns (status, not_before):
+    ('pending', <datetime>) to retry, ('failed', None) or ('dead_letter', None).
+    """
+    if classification == "permanent":
+        return "failed", None
+    if attempt >= policy_for(job_type)["max_attempts"]:
+        return "dead_letter", None
+    return "pending", datetime.now(timezone.utc) + timedelta(seconds=backoff_delay(job_type, attempt))
+
+
+def error_context(exc, job, classification, progress=None, checkpoint=None):
+    """Everything needed to debug a failure later without the worker's logs."""
+    return {
+        "error_type": type(exc).__name__,
+        "message": str(exc)[:2000],
+        "classification": classification,
+        "attempt": job.get("attempts"),
+        "job_type": job.get("job_type"),
+        "campaign_id": job.get("campaign_id"),
+        "traceback": "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))[-4000:],
+        "progress": progress,
+        "checkpoint_counts": (checkpoint or {}).get("counts"),
+        "failed_at": datetime.now(timezone.utc).isoformat(),
+    }
@@ -0,0 +1,304 @@
+"""
+runtime.py — Concurrent job execution for the Ghost worker.
+
+JobScheduler runs several claimed jobs at once inside one worker process:
+- a fixed pool of execution slots (GHOST_MAX_SLOTS),
+- per-job-type concurrency limits (JOB_TYPE_LIMITS),
+- one browser-driving job at a time per LinkedIn session. The worker only
+  claims a browser job for a session that is idle (session_floors() is passed
+  to claim_job_run), so claimed jobs never sit "running" behind another one.
+  Browser jobs run on a single-thread "lane" per session, so a session's
+  persistent profile is only ever used by one job and always from the same
+  thread (sync Playwright objects are thread-bound). Each lane keeps its
+  browser warm between jobs (BrowserManager, see browser.py),
+- priority preemption: the one exception to the idle-session rule is a
+  higher-priority job (lower job_runs.priority, e.g. an interactive login),
+  which is claimed for a busy session and asks the running lower-priority
+  job to yield; the yielded job is requeued and resumes from its checkpoint.
+  Lanes run waiting jobs in priority order (SessionLane), and a job about to
+  start yields at once if a more urgent one is already waiting,
+- cooperative cancellation through JobContext,
+- graceful shutdown: stop claiming, let in-flight jobs finish within a grace
+  period, then cancel the rest so they can be requeued.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+from browser import BrowserManager
+from checkpoint import JobCheckpoint
+from heartbeat import ProgressTracker
+
+MAX_SLOTS = int(os.environ.get("GHOST_MAX_SLOTS", "3"))
+SHUTDOWN_GRACE_SEC = 60
+
+# Max concurrently running jobs per type (unlisted types are limited only by MAX_SLOTS)
+JOB_TYPE_LIMITS = {
+    "login": 1,
+    "connect": 2,
+    "message": 2,
+}
+
+# Job types that drive a LinkedIn browser session (serialized per session)
+BROWSER_JOB_TYPES = {"login", "connect", "message"}
+
+DEFAULT_SESSION = "default"
+DEFAULT_PRIORITY = 30  # Matches the ELSE branch of job_runs_default_priority()
+
+
+def log(msg):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] [runtime] {msg}", flush=True)
+
+
+def session_key(job):
+    """LinkedIn session a job drives; jobs may target a non-default account via payload.session."""
+    return (job.get("payload") or {}).get("session") or DEFAULT_SESSION
+
+
+def session_dir(session):
+    """Persistent browser profile for a session (the default keeps the original location)."""
+    if session == DEFAULT_SESSION:
+        return "./linkedin_session"
+    return os.path.join("./linkedin_sessions", session)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been asked to stop (reason: 'cancelled', 'lease_lost', 'preempted', 'shutdown')."""
+
+    def __init__(self, reason="cancelled"):
+        super().__init__(f"Job cancelled ({reason})")
+        self.reason = reason
+
+
+class JobContext:
+    """Per-job handle passed to scripts: session info, progress, checkpoint and cooperative cancellation."""
+
+    def __init__(self, job):
+        self.job = job
+        self.job_id = job.get("id")
+        self.job_type = job.get("job_type")
+        self.priority = job.get("priority") if job.get("priority") is not None else DEFAULT_PRIORITY
+        self.session = session_key(job)
+        self.session_dir = session_dir(self.session)
+        self.progress = ProgressTracker()
+        self.checkpoint = JobCheckpoint(job)  # Worker sets checkpoint.save before running the job
+        self.browser = None                   # Session's warm BrowserManager (browser jobs only)
+        self.events = None                    # Worker's JobEventBus, for waiting on changes to the job row
+        self.cancel_reason = None
+        self._cancel = threading.Event()
+
+    def cancel(self, reason="cancelled"):
+        if not self._cancel.is_set():
+            self.cancel_reason = reason
+            self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """Call between units of work; raises JobCancelled if the job should stop."""
+        if self._cancel.is_set():
+            raise JobCancelled(self.cancel_reason)
+
+    def sleep(self, seconds):
+        """time.sleep that wakes up (and raises) as soon as the job is cancelled."""
+        if self._cancel.wait(seconds):
+            raise JobCancelled(self.cancel_reason)
+
+
+class SessionLane:
+    """
+    The single thread that owns one session's browser. Work runs one item at a
+    time in priority order (lower first, FIFO within a priority), unlike a
+    ThreadPoolExecutor, so a queued login is never stuck behind a queued connect.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self._heap = []                 # (priority, seq, future, fn, args)
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name=f"session-{session}", daemon=True)
+        self._thread.start()
+
+    def submit(self, priority, fn, *args):
+        future = Future()
+        with self._cv:
+            if self._stopped:
+                raise RuntimeError(f"Lane {self.session} is shut down")
+            heapq.heappush(self._heap, (priority, next(self._seq), future, fn, args))
+            self._cv.notify()
+        return future
+
+    def waiting_priority(self):
+        """Priority of the most urgent queued item, or None."""
+        with self._cv:
+            return self._heap[0][0] if self._heap else None
+
+    def shutdown(self):
+        """Stop after the queued items have run."""
+        with self._cv:
+            self._stopped = True
+            self._cv.notify()
+
+    def _loop(self):
+        while True:
+            with self._cv:
+                while not self._heap and not self._stopped:
+                    self._cv.wait()
+                if not self._heap:
+                    return
+                _, _, future, fn, args = heapq.heappop(self._heap)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+class JobScheduler:
+    """Slot pool + per-type limits + per-session browser lanes."""
+
+    def __init__(self, handler, max_slots=MAX_SLOTS, type_limits=None, on_done=None):
+        self.handler = handler          # handler(job, ctx)
+        self.max_slots = max_slots
+        self.type_limits = dict(JOB_TYPE_LIMITS if type_limits is None else type_limits)
+        self.on_done = on_done          # Called after each job finishes (e.g. to wake the claim loop)
+        self.accepting = True
+        self._lock = threading.Condition()
+        self._active = {}               # job_id -> JobContext
+        self._lanes = {}                # session -> SessionLane
+        self._browsers = {}             # session -> BrowserManager, only touched from its lane
+        self._lane_current = {}         # session -> JobContext currently driving the browser
+        self._pool = ThreadPoolExecutor(max_workers=max_slots, thread_name_prefix="job")
+
+    # --- Capacity ---
+
+    def active_jobs(self):
+        with self._lock:
+            return list(self._active.values())
+
+    def claimable_types(self, known_types):
+        """Job types this worker can take right now ([] when all slots are busy or shutting down)."""
+        with self._lock:
+            if not self.accepting or len(self._active) >= self.max_slots:
+                return []
+            running = {}
+            for ctx in self._active.values():
+                running[ctx.job_type] = running.get(ctx.job_type, 0) + 1
+        return [t for t in known_types if running.get(t, 0) < self.type_limits.get(t, self.max_slots)]
+
+    def session_floors(self):
+        """
+        {session: priority} for sessions with a browser job running or waiting on their lane.
+        A session's browser jobs are only claimable if strictly more urgent than its floor.
+        """
+        floors = {}
+        with self._lock:
+            for ctx in self._active.values():
+                if ctx.job_type in BROWSER_JOB_TYPES:
+                    floors[ctx.session] = min(ctx.priority, floors.get(ctx.session, ctx.priority))
+        return floors
+
+    # --- Execution ---
+
+    def submit(self, job):
+        """
+        Start a claimed job. Browser jobs run on their session's lane; a busy lane only
+        receives a job that preempts the one driving it (see session_floors()).
+        """
+        ctx = JobContext(job)
+        ctx.progress.update(stage="queued")
+        with self._lock:
+            self._active[ctx.job_id] = ctx
+            if ctx.job_type in BROWSER_JOB_TYPES:
+                lane = self._lanes.get(ctx.session)
+                if lane is None:
+                    lane = SessionLane(ctx.session)
+                    self._lanes[ctx.session] = lane
+                    self._browsers[ctx.session] = BrowserManager(ctx.session_dir)
+                ctx.browser = self._browsers[ctx.session]
+                current = self._lane_current.get(ctx.session)
+                if current is not None and ctx.priority < current.priority:
+                    log(f"Job {ctx.job_id} (priority {ctx.priority}) preempts {current.job_id} (priority {current.priority})")
+                    current.cancel("preempted")
+        if ctx.browser is not None:
+            lane.submit(ctx.priority, self._run, job, ctx)
+        else:
+            self._pool.submit(self._run, job, ctx)
+        return ctx
+
+    def _run(self, job, ctx):
+        if ctx.browser is not None:
+            with self._lock:
+                self._lane_current[ctx.session] = ctx
+            # A more urgent job queued while this one waited: yield to it right away
+            waiting = self._lanes[ctx.session].waiting_priority()
+            if waiting is not None and waiting < ctx.priority:
+                log(f"Job {ctx.job_id} (priority {ctx.priority}) yields to a waiting priority-{waiting} job")
+                ctx.cancel("preempted")
+        try:
+            # Runs even if cancelled while queued on its lane, so the handler can release the claim
+            self.handler(job, ctx)
+        except Exception as e:
+            log(f"Unhandled error in job {ctx.job_id}: {e}")
+        finally:
+            with self._lock:
+                self._active.pop(ctx.job_id, None)
+                if self._lane_current.get(ctx.session) is ctx:
+                    del self._lane_current[ctx.session]
+                self._lock.notify_all()
+            if self.on_done:
+                self.on_done(ctx)
+
+    def cancel(self, job_id, reason="cancelled"):
+        with self._lock:
+            ctx = self._active.get(job_id)
+        if ctx:
+            log(f"Cancelling job {job_id} ({reason})")
+            ctx.cancel(reason)
+        return ctx is not None
+
+    # --- Shutdown ---
+
+    def shutdown(self, grace_sec=SHUTDOWN_GRACE_SEC):
+        """
+        Stop accepting work and wait up to grace_sec for in-flight jobs; then cancel
+        the rest with reason 'shutdown' and wait briefly for them to unwind.
+        Returns the contexts of jobs that still had not exited.
+        """
+        self.accepting = False
+        deadline = time.time() + grace_sec
+        with self._lock:
+            while self._active and time.time() < deadline:
+                self._lock.wait(max(0, deadline - time.time()))
+            remaining = list(self._active.values())
+        if remaining:
+            log(f"Grace period over; cancelling {len(remaining)} in-flight job(s)")
+            for ctx in remaining:
+                ctx.cancel("shutdown")
+            deadline = time.time() + 15
+            with self._lock:
+                while self._active and time.time() < deadline:
+                    self._lock.wait(max(0, deadline - time.time()))
+                remaining = list(self._active.values())
+        self._pool.shutdown(wait=False)
+        for session, lane in self._lanes.items():
+            # Close each warm browser on its own lane thread (queued behind any job still unwinding)
+            try:
+                lane.submit(float("inf"), self._browsers[session].close).result(timeout=15)
+            except Exception as e:
+                # Lane still stuck in a job: don't leave Chromium running after the worker exits
+                killed = self._browsers[session].kill()
+                log(f"Could not close browser for session {session} ({e or 'timed out'}); killed {killed} process(es)")
+            lane.shutdown()
+        return remaining
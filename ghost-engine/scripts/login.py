@@ -1,21 +1,76 @@
 import time
-from playwright.sync_api import sync_playwright
+from contextlib import nullcontext
+from browser import job_browser
 
-def run(supabase, device_id, job_id, payload):
+TWO_FACTOR_TIMEOUT_SEC = 300   # Wait up to 5 minutes for the user to submit the code
+POLL_INTERVAL_SEC = 3          # Fallback when no realtime subscription is available
+SAFETY_POLL_SEC = 30           # Re-check now and then even when subscribed (missed events)
+
+
+def _read_code(supabase, job_id, record=None):
+    """The submitted 2FA code, or None. Uses the pushed row when it carries the payload (Realtime)."""
+    if record is None or "payload" not in record:
+        response = supabase.table("job_runs").select("payload, status").eq("id", job_id).execute()
+        if not response.data:
+            return None
+        record = response.data[0]
+    code = (record.get("payload") or {}).get("two_factor_code")
+    # The UI writes the code and flips status away from waiting_for_2fa in the same update
+    if code and record.get("status") != "waiting_for_2fa":
+        return code
+    return None
+
+
+def wait_for_2fa_code(supabase, job_id, payload, ctx=None, timeout=TWO_FACTOR_TIMEOUT_SEC):
+    """
+    Ask the Web UI for a 2FA code and block until it arrives. Wakes on the job_runs
+    change event from the worker's dispatcher (ctx.events) and falls back to polling
+    if there is no live subscription.
+    """
+    events = ctx.events if ctx else None
+    with (events.watch_job(job_id) if events else nullcontext()) as watch:
+        # Update job status to trigger the Web UI 2FA Modal (dropping any stale code from an earlier attempt)
+        fresh_payload = {k: v for k, v in (payload or {}).items() if k != "two_factor_code"}
+        supabase.table("job_runs").update({
+            "status": "waiting_for_2fa",
+            "payload": fresh_payload
+        }).eq("id", job_id).execute()
+
+        deadline = time.time() + timeout
+        record = None
+        while time.time() < deadline:
+            code = _read_code(supabase, job_id, record)
+            if code:
+                print("Received 2FA code.")
+                supabase.table("job_runs").update({"status": "running"}).eq("id", job_id).execute()
+                return code
+
+            interval = SAFETY_POLL_SEC if watch and events.connected else POLL_INTERVAL_SEC
+            print(f"Waiting for 2FA code... ({int(deadline - time.time())}s left)")
+            record = None
+            wait_until = min(deadline, time.time() + interval)
+            while time.time() < wait_until:
+                if ctx:
+                    ctx.check_cancelled()
+                if watch is None:
+                    time.sleep(min(1, max(0, wait_until - time.time())))
+                elif watch.wait(min(1, max(0, wait_until - time.time()))):
+                    record = watch.record
+                    break
+    return None
+
+
+def run(supabase, device_id, job_id, payload, ctx=None):
     email = payload.get("email")
     password = payload.get("password")
     
     if not email or not password:
         raise ValueError("Missing email or password in payload")
 
-    with sync_playwright() as p:
-        # Launch browser with persistent context to save cookies
-        browser = p.chromium.launch_persistent_context(
-            user_data_dir="./linkedin_session",
-            headless=False, # We usually want Ghost laptops headed so we can debug, or False specifically for logging in
-            args=["--disable-blink-features=AutomationControlled"]
-        )
-        page = browser.new_page()
+    # Persistent context (saved cookies), kept warm by the worker; headed so Ghost laptops can be debugged
+    with job_browser(ctx, flow="login") as (browser, page):
+        if ctx:
+            ctx.progress.update(stage="logging_in")
 
         try:
             print("Navigating to LinkedIn login...")
@@ -24,6 +79,7 @@ def run(supabase, device_id, job_id, payload):
             # Check if already logged in
             if "feed" in page.url:
                 print("Already logged in.")
+                browser.mark_verified()
                 return {"status": "success", "message": "Already logged in"}
 
             # Fill credentials
@@ -38,33 +94,10 @@ def run(supabase, device_id, job_id, payload):
             if "checkpoint/challenge" in page.url or page.locator("input[name='pin']").is_visible() or page.locator("input#input__email_verification_pin").is_visible():
                 print("2FA CHALLENGE DETECTED. Notifying Web UI...")
                 
-                # Update job status to trigger the Web UI 2FA Modal
-                supabase.table("job_runs").update({
-                    "status": "waiting_for_2fa"
-                }).eq("id", job_id).execute()
-
-                # Poll for code from the Web UI
-                two_factor_code = None
-                poll_interval = 3
-                timeout = 300 # Wait up to 5 minutes for the user to submit the code
-                waited = 0
-
-                while waited < timeout:
-                    print(f"Waiting for 2FA code... ({waited}/{timeout}s)")
-                    
-                    response = supabase.table("job_runs").select("payload, status").eq("id", job_id).execute()
-                    if response.data and len(response.data) > 0:
-                        current_status = response.data[0].get("status")
-                        current_payload = response.data[0].get("payload", {})
-                        
-                        code = current_payload.get("two_factor_code")
-                        if code and current_status != "waiting_for_2fa":
-                            two_factor_code = code
-                            print(f"Received 2FA code: {two_factor_code}")
-                            break
-                            
-                    time.sleep(poll_interval)
-                    waited += poll_interval
+                if ctx:
+                    ctx.progress.update(stage="waiting_for_2fa")
+
+                two_factor_code = wait_for_2fa_code(supabase, job_id, payload, ctx)
 
                 if not two_factor_code:
                     raise Exception("Timed out waiting for 2FA code from the Web UI.")
@@ -86,9 +119,11 @@ def run(supabase, device_id, job_id, payload):
             # Final verification
             if "feed" in page.url or "dashboard" in page.url:
                 print("Login successful.")
+                browser.mark_verified()
                 return {"status": "success", "message": "Logged in successfully"}
             else:
                 raise Exception(f"Login failed or unexpected redirect. Current URL: {page.url}")
 
-        finally:
-            browser.close()
+        except Exception:
+            browser.invalidate_session()
+            raise
@@ -1,130 +1,109 @@
-import time
-import os
-import random
-from datetime import datetime, timezone
-from playwright.sync_api import sync_playwright
+from browser import job_browser
+from selector_registry import get_registry
+from waits import StepTimer, Waiter
+from automation_steps import MESSAGE_FLOW, StepContext, SideEffects, log, close_all_overlays
 
-def log(msg):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] {msg}", flush=True)
+# Outcomes a resumed job should not retry (transient failures are retried)
+FINAL_OUTCOMES = ("sent", "already_sent", "inmail", "not_connected")
 
-def random_sleep(min_seconds=2, max_seconds=5):
-    time.sleep(random.uniform(min_seconds, max_seconds))
-
-def update_status(supabase, cid, status):
-    """Update candidate status in Supabase."""
+def update_status(repo, campaign_id, cid, status):
+    """Update candidate status through the shared repository."""
     try:
-        supabase.table("candidates").update({
-            "campaign_status": status,
-            "message_status": status if status == "replied" else "sent",
-            "updated_at": "now()"
-        }).eq("id", cid).execute()
+        repo.update_status(campaign_id, cid, status,
+                           message_status=status if status == "replied" else "sent")
         log(f"Candidate {cid} status updated to {status}")
     except Exception as e:
         log(f"Failed to update status for {cid}: {e}")
 
-def human_scroll(page):
+def record_activity(repo, device_id, org_id, campaign_id, cid, action="message_sent"):
+    """Append to the activity ledger (per-device daily counters are kept by the store)."""
     try:
-        for _ in range(random.randint(2, 5)):
-            page.mouse.wheel(0, random.randint(300, 700))
-            random_sleep(0.5, 1.5)
-    except: pass
+        repo.record_activity(action, device_id, campaign_id=campaign_id, candidate_id=cid, organization_id=org_id)
+    except Exception as e:
+        log(f"Failed to record activity for {cid}: {e}")
 
-def run(supabase, device_id, job_id, campaign_id):
+def checkpoint(ctx, cid, outcome):
+    """Record a final per-candidate outcome so a resumed job skips it (no-op when run standalone)."""
+    if ctx:
+        ctx.checkpoint.record(cid, outcome)
+
+def run(repo, device_id, job_id, campaign_id, org_id, ctx=None):
     log(f"STARTING MESSAGE AUTOMATION for campaign: {campaign_id}")
-    
+
     # Fetch accepted candidates who haven't been messaged yet
     try:
-        response = supabase.table("candidates").select("*") \
-            .eq("campaign_id", campaign_id) \
-            .eq("campaign_status", "accepted").execute()
-            # Or campaign_status='message_pending' depending on architecture.
-        candidates = response.data
+        candidates = repo.get_campaign_candidates(campaign_id, statuses=["accepted"])
+        # Or campaign_status='message_pending' depending on architecture.
     except Exception as e:
         raise Exception(f"Failed to fetch candidates: {e}")
 
+    if ctx:
+        candidates = ctx.checkpoint.remaining(candidates)
+
     if not candidates:
         log("No accepted candidates found ready for messaging.")
         return {"status": "success", "message": "No candidates to process"}
 
     log(f"Found {len(candidates)} candidates to message.")
 
+    # Shared selector registry (backend/selector_registry.py, hot-reloaded from selectors.json)
+    sel = get_registry()
+    timer = StepTimer()
+    # Status/checkpoint writes run on a background lane while the browser moves on
+    effects = SideEffects(log=log)
+
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch_persistent_context(
-                user_data_dir="./linkedin_session",
-                headless=False,
-                args=[
-                    '--disable-blink-features=AutomationControlled',
-                    '--window-size=1280,800'
-                ]
-            )
-            page = browser.new_page()
-            
-            page.goto("https://www.linkedin.com/feed/", timeout=30000, wait_until="domcontentloaded")
-            random_sleep(2, 3)
-            if "login" in page.url.lower():
-                browser.close()
-                raise Exception("Session expired. Please run the login job again.")
+        # Warm browser from the worker (or a fresh one when run standalone)
+        with job_browser(ctx, flow="message") as (browser, page):
+            if ctx:
+                ctx.progress.update(stage="messaging", total=len(candidates))
+
+            browser.verify_session(page)
+            wait = Waiter(page, timer, registry=sel)
 
             for i, cand in enumerate(candidates):
                 url = cand.get("linkedin_url")
                 cid = cand.get("id")
+                if ctx:
+                    ctx.check_cancelled()  # Stop between candidates on cancel/shutdown
+                    ctx.progress.update(processed=i, last_candidate=cid)
                 msg_text = cand.get("initial_message")
-                
+
                 if not msg_text:
                     log(f"Skipping {url}: No initial_message found.")
+                    checkpoint(ctx, cid, "no_message")
                     continue
-                 
+
                 log(f"[{i+1}/{len(candidates)}] Processing {url}...")
-                
+                close_all_overlays(page)
+
+                # navigate -> status -> open_chat -> compose -> send (backend/automation_steps.py)
+                flow_ctx = StepContext(page, sel, browser, wait=wait, log=log,
+                                       url=url, name=cand.get("name") or "", message=msg_text)
                 try:
-                    page.goto(url, timeout=60000, wait_until="domcontentloaded")
-                except: continue 
-
-                human_scroll(page)
-                random_sleep(1, 3)
-
-                # Find Message Button
-                message_btn = None
-                for sel in ["button:has-text('Message')", "a.message-anywhere-button", "button[aria-label^='Message']"]:
-                    message_btn = page.query_selector(sel)
-                    if message_btn: break
-                
-                if message_btn:
-                    log("Clicking Message button.")
-                    page.evaluate("el => el.click()", message_btn)
-                    random_sleep(1, 2)
-                    
-                    # Ensure modal opened
-                    msg_box = page.locator(".msg-form__contenteditable, p").last
-                    if msg_box.is_visible(timeout=3000):
-                        log("Typing message...")
-                        msg_box.fill("")
-                        for char in msg_text:
-                            msg_box.type(char, delay=random.randint(10, 30))
-                            
-                        random_sleep(1, 2)
-                        
-                        send_btn = page.locator("button[type='submit']").last
-                        if send_btn.is_enabled():
-                            send_btn.click()
-                            log("SUCCESS: Message sent.")
-                            update_status(supabase, cid, "message_sent")
-                        else:
-                            log("Send button not enabled.")
-                    else:
-                        log("Message composing box not found.")
-
-                else:
-                    log("Message button not found on profile.")
-                    
-                random_sleep(3, 7)
-
-            browser.close()
+                    outcome = MESSAGE_FLOW.run(flow_ctx).outcome
+                except Exception as e:
+                    log(f"Error processing {url}: {e}")
+                    continue
+
+                if outcome == "sent":
+                    log("SUCCESS: Message sent.")
+                    effects.submit(update_status, repo, campaign_id, cid, "message_sent")
+                    effects.submit(record_activity, repo, device_id, org_id, campaign_id, cid)
+                if outcome in FINAL_OUTCOMES:
+                    effects.submit(checkpoint, ctx, cid, outcome)  # After the status write it confirms
+
+                timer.begin("cleanup")
+                close_all_overlays(page)
+                wait.pace("between_candidates")
+
+            timer.end()
             log("MESSAGING COMPLETE.")
-            return {"status": "success", "processed": len(candidates)}
+            return {"status": "success", "processed": len(candidates), "network": browser.network.summary(),
+                    "timing": timer.summary()}
 
     except Exception as e:
         log(f"CRITICAL ERROR: {e}")
         raise
+    finally:
+        effects.close()
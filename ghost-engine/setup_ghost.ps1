@@ -85,7 +85,7 @@ if (-not (Test-Path (Join-Path $GhostDir "ghost-engine\venv"))) {
     if (Test-Path "requirements.txt") {
         pip install -r requirements.txt
     } else {
-        pip install supabase playwright python-dotenv
+        pip install supabase playwright python-dotenv psutil
         playwright install chromium
     }
 }
@@ -27,6 +27,7 @@ CREATE TABLE devices (
     organization_id UUID REFERENCES organizations(id) ON DELETE SET NULL,
     status TEXT NOT NULL DEFAULT 'unassigned' CHECK (status IN ('unassigned', 'idle', 'running', 'waiting_for_2fa', 'offline')),
     last_heartbeat TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    active_jobs JSONB DEFAULT '[]'::JSONB, -- [{id, job_type, progress}] from the latest heartbeat
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -54,9 +55,26 @@ CREATE TABLE candidates (
     initial_message TEXT,
     message_status TEXT DEFAULT 'draft',
     data JSONB,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+CREATE INDEX candidates_campaign_status_idx ON candidates (campaign_id, campaign_status);
+CREATE INDEX candidates_campaign_updated_idx ON candidates (campaign_id, updated_at);
+
+-- Keep updated_at current for every writer (frontend edits included); incremental syncs key off it
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER candidates_set_updated_at
+    BEFORE UPDATE ON candidates
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
 -- 6. Job Runs Table (Queue for Ghost Laptops)
 CREATE TABLE job_runs (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -64,14 +82,437 @@ CREATE TABLE job_runs (
     device_id TEXT REFERENCES devices(id) ON DELETE CASCADE,
     campaign_id UUID REFERENCES campaigns(id) ON DELETE CASCADE,
     job_type TEXT NOT NULL, -- 'login', 'connect', 'message'
-    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'failed', 'waiting_for_2fa')),
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'failed', 'waiting_for_2fa', 'cancelled', 'dead_letter')),
     error_message TEXT,
+    error_context JSONB, -- classification, traceback, progress, attempt of the last failure
     payload JSONB,
     result JSONB,
+    progress JSONB, -- live {stage, processed, total, last_candidate, rate_per_min, ...} from heartbeats
+    claimed_by TEXT, -- device holding the lease
+    claimed_at TIMESTAMP WITH TIME ZONE,
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    priority SMALLINT, -- set from job_type on insert (job_runs_priority); lower runs first
+    not_before TIMESTAMP WITH TIME ZONE, -- optional: don't start before this time
+    pinned BOOLEAN NOT NULL DEFAULT false, -- device_id chosen by the enqueuer; the fleet dispatcher won't move it
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Priority classes (lower runs first): interactive login/2FA > message > connect
+CREATE OR REPLACE FUNCTION job_runs_default_priority()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.priority IS NULL THEN
+        NEW.priority := CASE NEW.job_type
+            WHEN 'login' THEN 0
+            WHEN 'message' THEN 10
+            WHEN 'connect' THEN 20
+            ELSE 30
+        END;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER job_runs_priority
+    BEFORE INSERT ON job_runs
+    FOR EACH ROW EXECUTE FUNCTION job_runs_default_priority();
+
+-- Claim queue: head of each org/campaign queue per device, in priority order
+CREATE INDEX job_runs_device_pending_idx ON job_runs (device_id, organization_id, campaign_id, priority, created_at) WHERE status = 'pending';
+-- Fair share: when did this device last serve an org / a campaign
+CREATE INDEX job_runs_device_org_claimed_idx ON job_runs (device_id, organization_id, claimed_at);
+CREATE INDEX job_runs_device_campaign_claimed_idx ON job_runs (device_id, campaign_id, claimed_at);
+CREATE INDEX job_runs_not_before_idx ON job_runs (not_before) WHERE status = 'pending' AND not_before IS NOT NULL;
+CREATE INDEX job_runs_lease_idx ON job_runs (lease_expires_at) WHERE lease_expires_at IS NOT NULL;
+CREATE INDEX job_runs_dead_letter_idx ON job_runs (organization_id, updated_at) WHERE status = 'dead_letter';
+-- Fleet dispatcher: current load per device
+CREATE INDEX job_runs_device_active_idx ON job_runs (device_id) WHERE status IN ('pending', 'running', 'waiting_for_2fa');
+
+-- Atomically claim the next job for a device and lease it:
+--   1. only eligible rows: pending, not_before reached, no live lease (a pending row that still has a
+--      live lease, e.g. a login resumed from the 2FA modal, belongs to its holder), type in p_job_types
+--      (NULL = any; the worker passes the types it has free capacity for), and for a session listed in
+--      p_session_floors ({session: priority} of sessions the worker is already driving) only jobs more
+--      urgent than the running one, i.e. preemptors,
+--   2. considering only the oldest job of each organization/campaign/priority queue,
+--   3. ordered by priority, then fair share (least recently served organization, then campaign),
+--      then age.
+CREATE OR REPLACE FUNCTION claim_job_run(p_device_id TEXT, p_lease_seconds INTEGER DEFAULT 120, p_job_types TEXT[] DEFAULT NULL,
+                                         p_session_floors JSONB DEFAULT NULL)
+RETURNS SETOF job_runs AS $$
+DECLARE
+    v_id UUID;
+BEGIN
+    SELECT j.id INTO v_id
+    FROM job_runs j
+    WHERE j.id IN (
+        SELECT DISTINCT ON (w.organization_id, w.campaign_id, w.priority) w.id
+        FROM job_runs w
+        WHERE w.device_id = p_device_id
+          AND w.status = 'pending'
+          AND (w.not_before IS NULL OR w.not_before <= NOW())
+          AND (w.lease_expires_at IS NULL OR w.lease_expires_at < NOW())
+          AND (p_job_types IS NULL OR w.job_type = ANY(p_job_types))
+          AND (p_session_floors IS NULL
+               OR NOT p_session_floors ? COALESCE(w.payload->>'session', 'default')
+               OR w.priority < (p_session_floors->>COALESCE(w.payload->>'session', 'default'))::INT)
+        ORDER BY w.organization_id, w.campaign_id, w.priority, w.created_at
+    )
+      -- Re-checked against the locked row version if another worker got there first
+      AND j.status = 'pending'
+      AND (j.lease_expires_at IS NULL OR j.lease_expires_at < NOW())
+    ORDER BY
+        j.priority,
+        (SELECT max(o.claimed_at) FROM job_runs o
+         WHERE o.device_id = p_device_id AND o.organization_id = j.organization_id) ASC NULLS FIRST,
+        (SELECT max(c.claimed_at) FROM job_runs c
+         WHERE c.device_id = p_device_id AND c.campaign_id = j.campaign_id) ASC NULLS FIRST,
+        j.created_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED;
+
+    IF v_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    UPDATE job_runs j SET
+        status = 'running',
+        claimed_by = p_device_id,
+        claimed_at = NOW(),
+        lease_expires_at = NOW() + make_interval(secs => p_lease_seconds),
+        attempts = j.attempts + 1,
+        updated_at = NOW()
+    WHERE j.id = v_id
+    RETURNING j.*;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One call per heartbeat interval: device liveness, live progress for its running jobs and lease renewal.
+-- p_jobs: [{"id": ..., "job_type": ..., "progress": {...}}]. Returns the ids whose lease was renewed
+-- (a missing id means the job was cancelled, reaped or reassigned).
+CREATE OR REPLACE FUNCTION report_heartbeat(p_device_id TEXT, p_status TEXT, p_jobs JSONB DEFAULT '[]'::JSONB, p_lease_seconds INTEGER DEFAULT 120)
+RETURNS JSONB AS $$
+DECLARE
+    renewed JSONB;
+BEGIN
+    INSERT INTO devices (id, status, last_heartbeat, active_jobs)
+    VALUES (p_device_id, p_status, NOW(), p_jobs)
+    ON CONFLICT (id) DO UPDATE SET
+        status = EXCLUDED.status,
+        last_heartbeat = NOW(),
+        active_jobs = EXCLUDED.active_jobs;
+
+    WITH updated AS (
+        UPDATE job_runs j SET
+            progress = p.progress,
+            lease_expires_at = NOW() + make_interval(secs => p_lease_seconds),
+            updated_at = NOW()
+        FROM jsonb_to_recordset(p_jobs) AS p(id UUID, progress JSONB)
+        WHERE j.id = p.id
+          AND j.claimed_by = p_device_id
+          AND j.status IN ('pending', 'running', 'waiting_for_2fa')
+        RETURNING j.id
+    )
+    SELECT COALESCE(jsonb_agg(id), '[]'::JSONB) INTO renewed FROM updated;
+    RETURN renewed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Requeue jobs whose worker stopped renewing (crash, network loss). Safe to call from any worker or pg_cron.
+CREATE OR REPLACE FUNCTION reap_expired_job_leases()
+RETURNS INTEGER AS $$
+DECLARE
+    reaped INTEGER;
+BEGIN
+    UPDATE job_runs SET
+        status = 'pending',
+        claimed_by = NULL,
+        claimed_at = NULL,
+        lease_expires_at = NULL,
+        updated_at = NOW()
+    WHERE status IN ('pending', 'running', 'waiting_for_2fa')
+      AND lease_expires_at < NOW();
+    GET DIAGNOSTICS reaped = ROW_COUNT;
+    RETURN reaped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Manually replay a dead-lettered (or failed) job with a fresh attempt budget. Runs with the
+-- caller's rights, so RLS limits users to their own organization's jobs.
+CREATE OR REPLACE FUNCTION retry_job_run(p_job_id UUID)
+RETURNS SETOF job_runs AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE job_runs SET
+        status = 'pending',
+        attempts = 0,
+        not_before = NULL,
+        claimed_by = NULL,
+        claimed_at = NULL,
+        lease_expires_at = NULL,
+        updated_at = NOW()
+    WHERE id = p_job_id
+      AND status IN ('failed', 'dead_letter')
+    RETURNING *;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Queue functions are for Ghost workers (service key) only
+REVOKE EXECUTE ON FUNCTION claim_job_run(TEXT, INTEGER, TEXT[], JSONB) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION report_heartbeat(TEXT, TEXT, JSONB, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION reap_expired_job_leases() FROM PUBLIC, anon, authenticated;
+
+-- Push job changes to the owning Ghost worker (LISTEN "job_runs:<device_id>"); Realtime covers hosted Supabase
+CREATE OR REPLACE FUNCTION notify_job_runs()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.device_id IS NOT NULL THEN
+        PERFORM pg_notify('job_runs:' || NEW.device_id,
+                          json_build_object('id', NEW.id, 'device_id', NEW.device_id,
+                                            'job_type', NEW.job_type, 'status', NEW.status)::TEXT);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER job_runs_notify
+    AFTER INSERT OR UPDATE ON job_runs
+    FOR EACH ROW EXECUTE FUNCTION notify_job_runs();
+
+-- Which device holds each LinkedIn session's browser profile (payload.session, 'default' if unset).
+-- Written when a login job completes; session-bound jobs stay on that device.
+CREATE TABLE device_sessions (
+    organization_id UUID REFERENCES organizations(id) ON DELETE CASCADE,
+    session TEXT NOT NULL DEFAULT 'default',
+    device_id TEXT REFERENCES devices(id) ON DELETE CASCADE,
+    last_login_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (organization_id, session)
+);
+
+CREATE OR REPLACE FUNCTION bind_device_session()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO device_sessions (organization_id, session, device_id, last_login_at)
+    VALUES (NEW.organization_id, COALESCE(NEW.payload->>'session', 'default'), NEW.device_id, NOW())
+    ON CONFLICT (organization_id, session) DO UPDATE SET
+        device_id = EXCLUDED.device_id,
+        last_login_at = EXCLUDED.last_login_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER job_runs_bind_session
+    AFTER UPDATE ON job_runs
+    FOR EACH ROW
+    WHEN (NEW.job_type = 'login' AND NEW.status = 'completed' AND OLD.status <> 'completed' AND NEW.device_id IS NOT NULL)
+    EXECUTE FUNCTION bind_device_session();
+
+-- Pick a device for a job from live fleet state:
+--   1. session-bound jobs (connect/message) go to the device that logged the session in, even while it
+--      is offline — another laptop doesn't have the cookies; a login prefers that device if it is alive,
+--   2. otherwise the org's live device (status idle/running/waiting_for_2fa, heartbeat within
+--      p_stale_seconds) with the fewest pending/running jobs, freshest heartbeat first.
+-- NULL when the org has no live device; rebalance_job_runs() assigns the job once one comes up.
+CREATE OR REPLACE FUNCTION pick_device_for_job(p_organization_id UUID, p_job_type TEXT, p_session TEXT DEFAULT 'default', p_stale_seconds INTEGER DEFAULT 90)
+RETURNS TEXT AS $$
+DECLARE
+    v_device TEXT;
+BEGIN
+    SELECT s.device_id INTO v_device
+    FROM device_sessions s
+    LEFT JOIN devices d ON d.id = s.device_id
+    WHERE s.organization_id = p_organization_id
+      AND s.session = COALESCE(p_session, 'default')
+      AND (p_job_type <> 'login'
+           OR (d.status IN ('idle', 'running', 'waiting_for_2fa')
+               AND d.last_heartbeat > NOW() - make_interval(secs => p_stale_seconds)));
+    IF v_device IS NOT NULL THEN
+        RETURN v_device;
+    END IF;
+
+    SELECT d.id INTO v_device
+    FROM devices d
+    WHERE d.organization_id = p_organization_id
+      AND d.status IN ('idle', 'running', 'waiting_for_2fa')
+      AND d.last_heartbeat > NOW() - make_interval(secs => p_stale_seconds)
+    ORDER BY
+        (SELECT count(*) FROM job_runs j
+         WHERE j.device_id = d.id AND j.status IN ('pending', 'running', 'waiting_for_2fa')),
+        d.last_heartbeat DESC
+    LIMIT 1;
+    RETURN v_device;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Jobs enqueued without a device_id are assigned by the fleet; an explicit device_id pins the job
+CREATE OR REPLACE FUNCTION job_runs_assign_device()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.device_id IS NOT NULL THEN
+        NEW.pinned := true;
+    ELSE
+        NEW.device_id := pick_device_for_job(NEW.organization_id, NEW.job_type, NEW.payload->>'session');
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER job_runs_assign
+    BEFORE INSERT ON job_runs
+    FOR EACH ROW EXECUTE FUNCTION job_runs_assign_device();
+
+-- Fleet dispatcher pass (Ghost workers every REAP_INTERVAL_SEC, backend/fleet_dispatcher.py or pg_cron):
+-- requeue expired leases, then move unpinned pending jobs that have no device or sit on an offline /
+-- stale device to a live one. Session-bound jobs stay put (pick_device_for_job returns their device).
+-- Returns the number of jobs (re)assigned.
+CREATE OR REPLACE FUNCTION rebalance_job_runs(p_stale_seconds INTEGER DEFAULT 90)
+RETURNS INTEGER AS $$
+DECLARE
+    r RECORD;
+    v_device TEXT;
+    moved INTEGER := 0;
+BEGIN
+    PERFORM reap_expired_job_leases();
+
+    FOR r IN
+        SELECT j.id, j.organization_id, j.job_type, j.device_id, j.payload->>'session' AS session
+        FROM job_runs j
+        LEFT JOIN devices d ON d.id = j.device_id
+        WHERE j.status = 'pending'
+          AND NOT j.pinned
+          AND (j.lease_expires_at IS NULL OR j.lease_expires_at < NOW())
+          AND (d.id IS NULL
+               OR d.status NOT IN ('idle', 'running', 'waiting_for_2fa')
+               OR d.last_heartbeat <= NOW() - make_interval(secs => p_stale_seconds))
+        ORDER BY j.priority, j.created_at
+        FOR UPDATE OF j SKIP LOCKED
+    LOOP
+        v_device := pick_device_for_job(r.organization_id, r.job_type, r.session, p_stale_seconds);
+        IF v_device IS NOT NULL AND v_device IS DISTINCT FROM r.device_id THEN
+            UPDATE job_runs SET device_id = v_device, updated_at = NOW() WHERE id = r.id;
+            moved := moved + 1;
+        END IF;
+    END LOOP;
+    RETURN moved;
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION rebalance_job_runs(INTEGER) FROM PUBLIC, anon, authenticated;
+
+-- 7. Campaign Stats (funnel counters maintained incrementally from candidates)
+CREATE TABLE campaign_stats (
+    campaign_id UUID PRIMARY KEY REFERENCES campaigns(id) ON DELETE CASCADE,
+    member_count INTEGER NOT NULL DEFAULT 0,
+    pending_count INTEGER NOT NULL DEFAULT 0,
+    connection_sent_count INTEGER NOT NULL DEFAULT 0,
+    accepted_count INTEGER NOT NULL DEFAULT 0,
+    message_sent_count INTEGER NOT NULL DEFAULT 0,
+    declined_count INTEGER NOT NULL DEFAULT 0,
+    replied_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION apply_campaign_stats_delta(p_campaign_id UUID, p_status TEXT, p_sign INTEGER, p_member INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    IF p_campaign_id IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO campaign_stats (campaign_id) VALUES (p_campaign_id) ON CONFLICT DO NOTHING;
+    UPDATE campaign_stats SET
+        member_count = member_count + p_member,
+        pending_count = pending_count + p_sign * (p_status = 'pending')::INT,
+        connection_sent_count = connection_sent_count + p_sign * (p_status = 'connection_sent')::INT,
+        accepted_count = accepted_count + p_sign * (p_status = 'accepted')::INT,
+        message_sent_count = message_sent_count + p_sign * (p_status = 'message_sent')::INT,
+        declined_count = declined_count + p_sign * (p_status = 'declined')::INT,
+        replied_count = replied_count + p_sign * (p_status = 'replied')::INT
+    WHERE campaign_id = p_campaign_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- campaign_stats is read-only for clients (RLS SELECT only); only the trigger below writes it
+REVOKE EXECUTE ON FUNCTION apply_campaign_stats_delta(UUID, TEXT, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+
+CREATE OR REPLACE FUNCTION candidates_campaign_stats_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_campaign_stats_delta(OLD.campaign_id, OLD.campaign_status, -1, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_campaign_stats_delta(NEW.campaign_id, NEW.campaign_status, 1, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE TRIGGER candidates_campaign_stats
+    AFTER INSERT OR DELETE OR UPDATE OF campaign_id, campaign_status ON candidates
+    FOR EACH ROW EXECUTE FUNCTION candidates_campaign_stats_trigger();
+
+-- 8. Activity Ledger (append-only outbound actions per device/account, per day)
+CREATE TABLE activity_events (
+    id BIGSERIAL PRIMARY KEY,
+    account_id TEXT NOT NULL,
+    organization_id UUID REFERENCES organizations(id) ON DELETE CASCADE,
+    action TEXT NOT NULL, -- 'connection_sent', 'message_sent'
+    day DATE NOT NULL DEFAULT CURRENT_DATE,
+    campaign_id UUID REFERENCES campaigns(id) ON DELETE SET NULL,
+    candidate_id TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE activity_daily (
+    account_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    day DATE NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (account_id, action, day)
+);
+
+CREATE TABLE activity_summary (
+    account_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    active_days INTEGER NOT NULL DEFAULT 0,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    first_day DATE,
+    last_day DATE,
+    PRIMARY KEY (account_id, action)
+);
+
+CREATE OR REPLACE FUNCTION activity_events_summary_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    new_day INTEGER := 0;
+BEGIN
+    INSERT INTO activity_daily (account_id, action, day, count)
+    VALUES (NEW.account_id, NEW.action, NEW.day, 0)
+    ON CONFLICT DO NOTHING;
+    IF FOUND THEN
+        new_day := 1;
+    END IF;
+
+    UPDATE activity_daily SET count = count + 1
+    WHERE account_id = NEW.account_id AND action = NEW.action AND day = NEW.day;
+
+    INSERT INTO activity_summary (account_id, action, active_days, total_count, first_day, last_day)
+    VALUES (NEW.account_id, NEW.action, new_day, 1, NEW.day, NEW.day)
+    ON CONFLICT (account_id, action) DO UPDATE SET
+        active_days = activity_summary.active_days + EXCLUDED.active_days,
+        total_count = activity_summary.total_count + 1,
+        first_day = LEAST(activity_summary.first_day, EXCLUDED.first_day),
+        last_day = GREATEST(activity_summary.last_day, EXCLUDED.last_day);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER activity_events_summary
+    AFTER INSERT ON activity_events
+    FOR EACH ROW EXECUTE FUNCTION activity_events_summary_trigger();
+
 -- --- ROW LEVEL SECURITY (RLS) ---
 
 -- Enable RLS on all tables
@@ -81,6 +522,11 @@ ALTER TABLE devices ENABLE ROW LEVEL SECURITY;
 ALTER TABLE campaigns ENABLE ROW LEVEL SECURITY;
 ALTER TABLE candidates ENABLE ROW LEVEL SECURITY;
 ALTER TABLE job_runs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE campaign_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE activity_events ENABLE ROW LEVEL SECURITY;
+ALTER TABLE activity_daily ENABLE ROW LEVEL SECURITY;
+ALTER TABLE activity_summary ENABLE ROW LEVEL SECURITY;
+ALTER TABLE device_sessions ENABLE ROW LEVEL SECURITY;
 
 -- 1. Profiles Policies
 -- Users can view profiles in their own organization
@@ -168,6 +614,25 @@ CREATE POLICY "Users can update org job runs" ON job_runs
         organization_id = (SELECT organization_id FROM profiles WHERE id = auth.uid())
     );
 
+CREATE POLICY "Users can view org device sessions" ON device_sessions
+    FOR SELECT USING (
+        organization_id = (SELECT organization_id FROM profiles WHERE id = auth.uid())
+    );
+
+-- 7. Campaign Stats Policies
+CREATE POLICY "Users can view org campaign stats" ON campaign_stats
+    FOR SELECT USING (
+        campaign_id IN (SELECT id FROM campaigns WHERE organization_id = (SELECT organization_id FROM profiles WHERE id = auth.uid()))
+        OR (SELECT role FROM profiles WHERE id = auth.uid()) = 'admin'
+    );
+
+-- 8. Activity Ledger Policies (written by Ghost workers with the service key)
+CREATE POLICY "Users can view org activity" ON activity_events
+    FOR SELECT USING (
+        organization_id = (SELECT organization_id FROM profiles WHERE id = auth.uid())
+        OR (SELECT role FROM profiles WHERE id = auth.uid()) = 'admin'
+    );
+
 -- Set up Realtime for `job_runs` and `devices` and `campaigns`
 alter publication supabase_realtime add table job_runs;
 alter publication supabase_realtime add table devices;